@@ -0,0 +1,220 @@
+#####################################
+# bql_aggregate:
+#   Class file for aggregate functions and grouping of selected records.
+# authors:
+#   @Froilan Luna-Lopez
+#       University of Nevada, Reno
+#####################################
+
+# Libraries
+import operator
+
+functionNames = frozenset(["count",
+        "sum",
+        "min",
+        "max",
+        "avg"]) # Aggregate functions, written 'name(' by the tokenizer
+numberTypes = (int, float) # Types of values added by sum and avg
+
+#####################################
+# hasAggregates():
+#   Test whether tokens of a select clause call aggregate functions.
+# args:
+#   @selectTokens: List with tokens passed to select command.
+# return:
+#   True: If a token is an aggregate function.
+#   False: Otherwise.
+#####################################
+def hasAggregates(selectTokens):
+    return any([token[-1:] == "(" and token[:-1] in functionNames for token in selectTokens])
+
+#####################################
+# parseSelection():
+#   Resolve the attributes of a select clause with aggregate functions or a
+#   group by clause. Attributes selected outside of functions must be grouped.
+# args:
+#   @selectTokens: List with tokens passed to select command.
+#   @groupTokens: List with tokens passed to group by clause, or None.
+#   @table: Table with attributes of selected records.
+# return:
+#   Tuple with list of (function, attribute position) pairs of selected items,
+#   function being None for grouped attributes and attribute position None for
+#   'count(*)', list with positions of grouped attributes, and None.
+#   (None, None, string with error) if selection is not valid.
+#####################################
+def parseSelection(selectTokens, groupTokens, table):
+    # Variables
+    items = []
+    groupColnums = []
+
+    # Find grouped attributes
+    for token in groupTokens or []:
+        colnum = table.findAttr(token)
+        if colnum == -1:
+            return None, None, "attribute " + token + " does not exist"
+        groupColnums.append(colnum)
+
+    # Find selected items
+    pos = 0
+    while pos < len(selectTokens):
+        token = selectTokens[pos]
+        pos += 1
+        # Plain attributes must be grouped
+        if token[-1:] != "(" or token[:-1] not in functionNames:
+            colnum = table.findAttr(token)
+            if colnum == -1:
+                return None, None, "attribute " + token + " does not exist"
+            if colnum not in groupColnums:
+                return None, None, "attribute " + token + " is not grouped"
+            items.append((None, colnum))
+            continue
+        # Functions take one attribute, or '*' for count
+        function = token[:-1]
+        if pos == len(selectTokens):
+            return None, None, function + " has no attribute"
+        argument = selectTokens[pos]
+        pos += 1
+        if argument == "*" and function == "count":
+            items.append((function, None))
+            continue
+        colnum = table.findAttr(argument)
+        if colnum == -1:
+            return None, None, "attribute " + argument + " does not exist"
+        if (function == "sum" or function == "avg") and not table.isNumeric(colnum):
+            return None, None, function + " needs a numeric attribute"
+        items.append((function, colnum))
+
+    return items, groupColnums, None
+
+#####################################
+# HashAggregator:
+#   Streaming hash aggregation of records. Records are given in chunks of
+#   columns, and only one accumulator per function and group is kept, so memory
+#   grows with the number of groups instead of the number of records. Groups are
+#   returned in the order they were first seen.
+#####################################
+class HashAggregator:
+    #####################################
+    # Constructor
+    #
+    # args:
+    #   @items: List with (function, attribute position) pairs of selected items,
+    #           built by parseSelection().
+    #   @groupColnums: List with positions of grouped attributes.
+    #####################################
+    def __init__(self, items, groupColnums):
+        self.items = items
+        self.groupColnums = groupColnums
+        self.functions = [item for item in items if item[0] is not None] # (function, attribute position) pairs
+        self.colnums = sorted(set(groupColnums + [item[1] for item in self.functions if item[1] is not None])) # Positions of attributes read
+        self.groups = {} # Grouped values-group number pairs
+        self.states = [[] for _ in self.functions] # Accumulator of each group, for each function
+
+    #####################################
+    # addChunk():
+    #   Add records to their groups.
+    # args:
+    #   @count: Number of records.
+    #   @columns: List with values of records, one list for each position in self.colnums.
+    # return:
+    #   None.
+    #####################################
+    def addChunk(self, count, columns):
+        # Variables
+        values = dict(zip(self.colnums, columns)) # Attribute position-values pairs
+        groups = self.groups
+        numbers = [] # Group number of each record
+
+        # Find group of each record, starting new groups
+        if self.groupColnums:
+            keys = zip(*[values[colnum] for colnum in self.groupColnums])
+        else:
+            keys = [()] * count
+        for key in keys:
+            number = groups.get(key)
+            if number is None:
+                number = len(groups)
+                groups[key] = number
+                for (function, colnum), state in zip(self.functions, self.states):
+                    state.append(0 if function == "count" else None)
+            numbers.append(number)
+
+        # Update accumulators of each function
+        for (function, colnum), state in zip(self.functions, self.states):
+            if colnum is None:
+                for number in numbers:
+                    state[number] += 1
+            elif function == "count":
+                for number, value in zip(numbers, values[colnum]):
+                    if value is not None:
+                        state[number] += 1
+            elif function == "sum":
+                for number, value in zip(numbers, values[colnum]):
+                    if isinstance(value, numberTypes):
+                        state[number] = value if state[number] is None else state[number] + value
+            elif function == "avg":
+                for number, value in zip(numbers, values[colnum]):
+                    if isinstance(value, numberTypes):
+                        if state[number] is None:
+                            state[number] = [value, 1]
+                        else:
+                            state[number][0] += value
+                            state[number][1] += 1
+            else:
+                self.addExtremes(state, numbers, values[colnum], operator.lt if function == "min" else operator.gt)
+
+    #####################################
+    # addExtremes():
+    #   Update accumulators of min or max. Values that cannot be compared with
+    #   the accumulator of their group are skipped.
+    # args:
+    #   @state: List with accumulator of each group.
+    #   @numbers: List with group number of each record.
+    #   @column: List with values of records.
+    #   @better: Function taking a value and an accumulator and returning whether value replaces it.
+    # return:
+    #   None.
+    #####################################
+    def addExtremes(self, state, numbers, column, better):
+        for number, value in zip(numbers, column):
+            if value is None:
+                continue
+            current = state[number]
+            try:
+                if current is None or better(value, current):
+                    state[number] = value
+            except TypeError:
+                pass
+
+    #####################################
+    # results():
+    #   Get selected items of each group.
+    # args:
+    #   None.
+    # return:
+    #   Generator with lists of values, in select order. Without grouped
+    #   attributes, a single list is returned even if no record was added.
+    #####################################
+    def results(self):
+        # Aggregates over no records
+        if not self.groups and not self.groupColnums:
+            yield [0 if function == "count" else None for function, colnum in self.items]
+            return
+
+        for key, number in self.groups.items():
+            # Variables
+            groupValues = dict(zip(self.groupColnums, key))
+            values = []
+            functionNum = 0
+
+            # Finish accumulators
+            for function, colnum in self.items:
+                if function is None:
+                    values.append(groupValues[colnum])
+                    continue
+                value = self.states[functionNum][number]
+                functionNum += 1
+                if function == "avg" and value is not None:
+                    value = value[0] / value[1]
+                values.append(value)
+            yield values
@@ -0,0 +1,86 @@
+#####################################
+# bql_bench:
+#   Micro-benchmark of BQL command tokenizing on large scripts.
+# authors:
+#   @Froilan Luna-Lopez
+#       University of Nevada, Reno
+#####################################
+
+# Libraries
+import sys
+import timeit
+import bql_main as bm
+
+#####################################
+# buildInsertScript():
+#   Build a single insert command of about a given size.
+# args:
+#   @size: Number of bytes of command.
+# return:
+#   String with insert command.
+#####################################
+def buildInsertScript(size):
+    # Variables
+    records = []
+    length = 0
+    recnum = 0
+
+    # Add records until command is large enough
+    while length < size:
+        record = "(" + str(recnum) + ", 'name " + str(recnum) + "', " + str(recnum * 1.5) + ")"
+        records.append(record)
+        length += len(record) + 2
+        recnum += 1
+
+    return "insert into product values " + ", ".join(records) + ";"
+
+#####################################
+# buildSelectScript():
+#   Build a script of select commands of about a given size.
+# args:
+#   @size: Number of bytes of script.
+# return:
+#   String with select commands.
+#####################################
+def buildSelectScript(size):
+    command = "select e.name, s.id from employee e inner join sales s on e.id = s.employeeid where e.id > 5; "
+    return command * (size // len(command) + 1)
+
+#####################################
+# benchmark():
+#   Time tokenizing of a script and print its throughput.
+# args:
+#   @name: String with name of script.
+#   @script: String with script.
+#   @repeat: Number of timed runs, the fastest one being reported.
+# return:
+#   Float with megabytes tokenized per second.
+#####################################
+def benchmark(name, script, repeat):
+    # Variables
+    program = bm.BQLBase()
+    megabytes = len(script) / (1024 * 1024)
+
+    # Keep fastest run
+    seconds = min(timeit.repeat(lambda: program.tokenize(script), number = 1, repeat = repeat))
+    print(name + ": " + format(megabytes, ".1f") + " MB in " + format(seconds, ".3f") + " s, " + format(megabytes / seconds, ".1f") + " MB/s")
+    return megabytes / seconds
+
+#####################################
+# main():
+#   Runs tokenizing benchmarks on generated scripts.
+# args:
+#   None.
+# return:
+#   None.
+#####################################
+def main():
+    # Size of scripts in megabytes, given as first argument
+    size = int(float(sys.argv[1]) * 1024 * 1024) if len(sys.argv) > 1 else 4 * 1024 * 1024
+
+    benchmark("insert", buildInsertScript(size), 3)
+    benchmark("select", buildSelectScript(size), 3)
+
+
+if __name__ == '__main__':
+    main()
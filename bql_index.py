@@ -0,0 +1,195 @@
+#####################################
+# bql_index:
+#   Class file for secondary index functionality.
+# authors:
+#   @Froilan Luna-Lopez
+#       University of Nevada, Reno
+#####################################
+
+# Libraries
+import bisect
+import heapq
+import operator
+import os
+
+#####################################
+# Index:
+#   Node to store a sorted secondary index on one attribute of a table.
+#   Entries pair an attribute value with the location of its record: its byte
+#   offset in text table files, or its position in binary table files. The
+#   index file holds the attribute name followed by one "value,offset" line
+#   per entry: sorted when the index is built, with entries of inserted
+#   records appended afterwards and sorted again when loaded.
+#####################################
+class Index:
+    #####################################
+    # Constructor
+    #
+    # args:
+    #   @ipath: Path of index file.
+    #   @colnum: Position of indexed attribute in table.
+    #   @parse: Function converting a text value into the attribute datatype.
+    #   @numeric: Whether the attribute datatype is a number.
+    #####################################
+    def __init__(self, ipath, colnum, parse, numeric):
+        self.ipath = ipath
+        self.colnum = colnum
+        self.parse = parse
+        self.numeric = numeric
+        self.attrName = ""
+        self.keys = [] # Sorted attribute values
+        self.offsets = [] # Record location of each attribute value
+
+    #####################################
+    # isValidKey():
+    #   Test whether a value can be stored in the index.
+    # args:
+    #   @key: Typed value.
+    # return:
+    #   True: If value is not empty and matches the attribute kind.
+    #   False: Otherwise.
+    #####################################
+    def isValidKey(self, key):
+        if key is None:
+            return False
+        if self.numeric:
+            return isinstance(key, (int, float))
+        return isinstance(key, str)
+
+    #####################################
+    # load():
+    #   Read index entries from index file.
+    # args:
+    #   None.
+    # return:
+    #   None.
+    #####################################
+    def load(self):
+        # Variables
+        entries = []
+
+        # Read entries
+        with open(self.ipath, "r") as df:
+            self.attrName = df.readline().strip()
+            for line in df:
+                key, offset = line.rstrip("\n").rsplit(",", 1)
+                entries.append((self.parse(key), int(offset)))
+
+        # Sort entries appended after the index was built
+        entries.sort()
+        self.keys = [entry[0] for entry in entries]
+        self.offsets = [entry[1] for entry in entries]
+
+    #####################################
+    # save():
+    #   Write sorted index entries into index file.
+    # args:
+    #   None.
+    # return:
+    #   None.
+    #####################################
+    def save(self):
+        with open(self.ipath, "w") as df:
+            df.write(self.attrName + "\n")
+            df.write("".join([str(key) + "," + str(offset) + "\n" for key, offset in zip(self.keys, self.offsets)]))
+
+    #####################################
+    # build():
+    #   Build index entries from the records of a table.
+    # args:
+    #   @attrName: Name of indexed attribute.
+    #   @entries: Iterable with tuples of typed value and record location.
+    # return:
+    #   None.
+    #####################################
+    def build(self, attrName, entries):
+        # Keep valid entries
+        self.attrName = attrName
+        entries = [entry for entry in entries if self.isValidKey(entry[0])]
+
+        # Sort entries and save them
+        entries.sort()
+        self.keys = [entry[0] for entry in entries]
+        self.offsets = [entry[1] for entry in entries]
+        self.save()
+
+    #####################################
+    # addEntries():
+    #   Add entries of appended records to index and index file.
+    # args:
+    #   @entries: List with tuples of typed value and record location.
+    # return:
+    #   None.
+    #####################################
+    def addEntries(self, entries):
+        # Variables
+        entries = [entry for entry in entries if self.isValidKey(entry[0])]
+        lines = [str(key) + "," + str(offset) + "\n" for key, offset in entries]
+
+        # Merge sorted entries with index in one pass, after existing entries with equal keys
+        if entries:
+            entries.sort(key = operator.itemgetter(0))
+            merged = list(heapq.merge(zip(self.keys, self.offsets), entries, key = operator.itemgetter(0)))
+            self.keys = [entry[0] for entry in merged]
+            self.offsets = [entry[1] for entry in merged]
+
+        # Append entries to index file
+        if lines:
+            with open(self.ipath, "a") as df:
+                df.write("".join(lines))
+
+    #####################################
+    # lookup():
+    #   Get locations of records whose attribute value passes a test.
+    # args:
+    #   @condOp: Either '=', '<' or '>'.
+    #   @value: Typed constant on the right side of the operator.
+    # return:
+    #   Sorted list with record locations, or None if the test cannot use the index.
+    #####################################
+    def lookup(self, condOp, value):
+        if not self.isValidKey(value):
+            return None
+        if condOp == "=":
+            offsets = self.offsets[bisect.bisect_left(self.keys, value):bisect.bisect_right(self.keys, value)]
+        elif condOp == "<":
+            offsets = self.offsets[:bisect.bisect_left(self.keys, value)]
+        elif condOp == ">":
+            offsets = self.offsets[bisect.bisect_right(self.keys, value):]
+        else:
+            return None
+        offsets.sort()
+        return offsets
+
+#####################################
+# getIndexPath():
+#   Get path of index file of a table.
+# args:
+#   @tpath: String with path to table.
+#   @iname: Name of index.
+# return:
+#   String with path to index file.
+#####################################
+def getIndexPath(tpath, iname):
+    return tpath[:-len(".bql")] + "." + iname + ".idx"
+
+#####################################
+# listIndexPaths():
+#   Get paths of index files of a table.
+# args:
+#   @tpath: String with path to table.
+# return:
+#   List with paths to index files.
+#####################################
+def listIndexPaths(tpath):
+    # Variables
+    dirName, fileName = os.path.split(tpath)
+    prefix = fileName[:-len(".bql")] + "."
+    indexPaths = []
+
+    # Find index files starting with table name
+    for entry in sorted(os.listdir(dirName or ".")):
+        if entry.startswith(prefix) and entry.endswith(".idx") and entry.count(".") == 2:
+            indexPaths.append(os.path.join(dirName, entry))
+
+    return indexPaths
@@ -0,0 +1,133 @@
+#####################################
+# bql_lock:
+#   Class file for table locks shared between BQL sessions.
+# authors:
+#   @Froilan Luna-Lopez
+#       University of Nevada, Reno
+#####################################
+
+# Libraries
+import fcntl
+import os
+import uuid
+
+#####################################
+# LockManager:
+#   Advisory locks of one session, each backed by a lock file. Locks are held
+#   through fcntl.flock on an open lock file, so they are seen by every process
+#   and dropped by the system if the session exits without releasing them.
+#   Locks held by the session are kept in a dictionary, so testing them never
+#   touches the disk.
+#####################################
+class LockManager:
+    #####################################
+    # Constructor
+    #
+    # args:
+    #   None.
+    #####################################
+    def __init__(self):
+        self.sessionId = uuid.uuid4().hex # Unique id of session
+        self.files = {} # Lock path-open lock file pairs
+        self.held = {} # Lock path-mode pairs of locks held by session
+
+    #####################################
+    # getFile():
+    #   Get open lock file of a lock, creating it if needed.
+    # args:
+    #   @lpath: String with path to lock file.
+    # return:
+    #   File object of lock file.
+    #####################################
+    def getFile(self, lpath):
+        if lpath not in self.files:
+            os.makedirs(os.path.dirname(lpath) or ".", exist_ok = True)
+            self.files[lpath] = open(lpath, "a")
+        return self.files[lpath]
+
+    #####################################
+    # acquire():
+    #   Take a lock in shared or exclusive mode. Taking a lock already held
+    #   changes its mode.
+    # args:
+    #   @lpath: String with path to lock file.
+    #   @exclusive: Whether no other session may hold the lock.
+    #   @wait: Whether to wait for other sessions to release the lock (default = False).
+    # return:
+    #   True: If lock was taken.
+    #   False: If another session holds the lock.
+    #####################################
+    def acquire(self, lpath, exclusive, wait = False):
+        # Variables
+        mode = fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+        if self.held.get(lpath) == fcntl.LOCK_EX:
+            return True
+
+        # Take lock
+        try:
+            fcntl.flock(self.getFile(lpath).fileno(), mode if wait else mode | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        self.held[lpath] = mode
+        return True
+
+    #####################################
+    # release():
+    #   Release a lock held by the session.
+    # args:
+    #   @lpath: String with path to lock file.
+    # return:
+    #   True: If lock was held.
+    #   False: Otherwise.
+    #####################################
+    def release(self, lpath):
+        if self.held.pop(lpath, None) is None:
+            return False
+        fcntl.flock(self.files[lpath].fileno(), fcntl.LOCK_UN)
+        return True
+
+    #####################################
+    # isHeld():
+    #   Test whether the session holds a lock in exclusive mode.
+    # args:
+    #   @lpath: String with path to lock file.
+    # return:
+    #   True: If session holds lock in exclusive mode.
+    #   False: Otherwise.
+    #####################################
+    def isHeld(self, lpath):
+        return self.held.get(lpath) == fcntl.LOCK_EX
+
+    #####################################
+    # isHeldByOther():
+    #   Test whether another session holds a lock in exclusive mode.
+    # args:
+    #   @lpath: String with path to lock file.
+    # return:
+    #   True: If another session holds lock in exclusive mode.
+    #   False: Otherwise.
+    #####################################
+    def isHeldByOther(self, lpath):
+        # Locks held by session exclude other sessions
+        if lpath in self.held:
+            return False
+        if not os.path.isfile(lpath):
+            return False
+
+        # Test lock with a shared lock released right away
+        if not self.acquire(lpath, False):
+            return True
+        self.release(lpath)
+        return False
+
+    #####################################
+    # heldPaths():
+    #   Get locks held by the session in exclusive mode.
+    # args:
+    #   None.
+    # return:
+    #   List with paths to lock files.
+    #####################################
+    def heldPaths(self):
+        held = self.held.copy() # Checkpointer of session releases locks from another thread
+        return [lpath for lpath, mode in held.items() if mode == fcntl.LOCK_EX]
@@ -7,8 +7,12 @@
 #####################################
 
 # Libraries
+import collections
+import re
+import sys
+import time
+import bql_aggregate as ba
 import bql_database as bdb
-import bql_table as bt
 
 #####################################
 # BQLBase:
@@ -37,11 +41,38 @@ class BQLBase:
             "inner",
             "commit",
             "begin",
-            "transaction"] # BQL keywords
+            "transaction",
+            "index",
+            "load",
+            "group",
+            "order",
+            "by"] # BQL keywords
     decorator_keywords = ["left",
             "outer",
             "join",
             "inner"]
+    keyword_set = frozenset(valid_keywords) # BQL keywords, for constant time lookups
+    aggregate_set = ba.functionNames # Aggregate functions, tokenized with their opening parenthesis
+    word_pattern = r"""[^ ,();\t'"]*(?:(?:'[^']*'|"[^"]*"|['"])[^ ,();\t'"]*)*""" # Characters between delimiters, keeping quoted strings whole
+    token_pattern = re.compile("(" + word_pattern + r")([ ,();\t]*)") # Token, possibly empty, and the delimiters after it
+    record_pattern = re.compile(r"(?=[^ ,();\t])" + word_pattern + r"(?=[ ,();\t])|\)") # Token followed by a delimiter, or end of inserted record
+    literal_pattern = re.compile(r"""((?=['"\d])(?:'[^']*'|"[^"]*"|(?<![\w.])\d+(?:\.\d+)?(?![\w.])))""") # Quoted strings and numbers
+    placeholder_pattern = re.compile("\x00(\\d+)\x00") # Position of a literal taken out of a command
+    space_pattern = re.compile("[ \t]+") # Runs of spaces, which tokenize like one space
+    load_pattern = re.compile(r"""load\s+data\s+('[^']*'|"[^"]*")""", re.IGNORECASE) # File path of a load command, kept in its case
+    plan_cache = collections.OrderedDict() # (database, normalized command)-[command structure, literal slots, plan] pairs, least recently used first
+    plan_cache_size = 256 # Number of commands kept in the plan cache
+    plan_text_limit = 4096 # Length of commands above which they are not cached
+    script_group_size = 10000 # Number of consecutive inserts into a table run together in scripts
+    schema_commands = ["create table",
+            "drop table",
+            "alter table"] # Commands changing the tables plans are resolved against
+    table_commands = ["create table",
+            "drop table",
+            "alter table",
+            "insert into",
+            "update",
+            "delete from"] # Commands reading or changing only the table named first
 
     #####################################
     # runCommand():
@@ -49,12 +80,15 @@ class BQLBase:
     # args:
     #   @database: BQL DatabaseHandler object to store database info.
     #   @tokens: List with words passed as input to program.
+    #   @commandStruct: Command structure already built from tokens (default = None).
+    #   @plan: Dictionary caching how a select command is resolved (default = None).
     # return:
     #   None.
     #####################################
-    def runCommand(self, database, tokens):
+    def runCommand(self, database, tokens, commandStruct = None, plan = None):
         # Variables
-        commandStruct = self.buildCommandStruct(tokens)
+        if commandStruct is None:
+            commandStruct = self.buildCommandStruct(tokens)
         firstCommand = list(commandStruct.keys())[0]
         argTokens = commandStruct[firstCommand]
         #argsIndex = 0
@@ -72,16 +106,19 @@ class BQLBase:
 
         # Run appropriate command
         #argTokens = tokens[argsIndex:]
+        database.tableHandler.syncLog(self.getTableNames(firstCommand, commandStruct))
         if firstCommand == "create table":
             database.tableHandler.createTableCommand(argTokens)
         elif firstCommand == "drop table":
             database.tableHandler.dropTableCommand(argTokens[0])
+        elif firstCommand == "create index":
+            database.tableHandler.createIndexCommand(commandStruct)
         elif firstCommand == "create database":
             database.createDatabaseCommand(argTokens[0])
         elif firstCommand == "drop database":
             database.dropTableCommand(argTokens[0])
         elif firstCommand == "select":
-            database.tableHandler.selectCommand(commandStruct)
+            database.tableHandler.selectCommand(commandStruct, plan)
         elif firstCommand == "use":
             database.tableHandler.useCommand(argTokens[0])
         elif firstCommand == "alter table":
@@ -92,6 +129,8 @@ class BQLBase:
             database.tableHandler.updateCommand(commandStruct)
         elif firstCommand == "delete from":
             database.tableHandler.deleteCommand(commandStruct)
+        elif firstCommand == "load":
+            database.tableHandler.loadCommand(commandStruct)
         elif firstCommand == "commit":
             database.tableHandler.commitCommand()
         elif firstCommand == "begin transaction":
@@ -99,11 +138,294 @@ class BQLBase:
         else:
             print("!Failed to run query because '" + firstCommand + "' is not a valid command.")
             return 0
+
+        # Plans reading a changed table are resolved again
+        if firstCommand in self.schema_commands:
+            self.forgetPlans(database.tableHandler.db_in_use, argTokens[0])
+        elif firstCommand == "drop database":
+            self.plan_cache.clear()
         return 1
 
+    #####################################
+    # runStatement():
+    #   Runs a user BQL command given as text, reusing the parsing and plan of
+    #   earlier commands differing only in literals.
+    # args:
+    #   @database: BQL DatabaseHandler object to store database info.
+    #   @command: String with command.
+    # return:
+    #   1: If command was run.
+    #   0: Otherwise.
+    #####################################
+    def runStatement(self, database, command):
+        commandStruct, plan = self.parseStatement(command, database.tableHandler.db_in_use)
+        if not commandStruct:
+            return 0
+        return self.runCommand(database, None, commandStruct, plan)
+
+    #####################################
+    # splitStatements():
+    #   Split a script into commands the way they are read interactively: lines
+    #   are trimmed and joined until one holds a ';', and comment lines before a
+    #   command are skipped.
+    # args:
+    #   @script: String with whole script.
+    # return:
+    #   List with strings of commands.
+    #####################################
+    def splitStatements(self, script):
+        # Variables
+        statements = []
+        lines = []
+
+        # Loop through lines
+        for line in script.splitlines():
+            line = line.strip()
+            if not lines and (line[:2] == "--" or line == ""): # Comment or empty line
+                continue
+            if not lines and line.lower() == ".exit": # End of script
+                break
+            lines.append(line)
+            if ";" in line: # Complete command
+                statements.append(self.lowerCommand(" ".join(lines)))
+                lines = []
+
+        return statements
+
+    #####################################
+    # lowerCommand():
+    #   Convert a command to lowercase, except the file path of a load command.
+    # args:
+    #   @command: String with command.
+    # return:
+    #   String with command in lowercase.
+    #####################################
+    def lowerCommand(self, command):
+        # Variables
+        lowered = command.lower()
+        if "load" not in lowered:
+            return lowered
+
+        # Keep case of file path
+        match = self.load_pattern.search(command)
+        if match is None:
+            return lowered
+        return command[:match.start(1)].lower() + match.group(1) + command[match.end(1):].lower()
+
+    #####################################
+    # runScript():
+    #   Runs the commands of a script. Consecutive inserts into the same table
+    #   are validated one by one but appended together, with a single write.
+    # args:
+    #   @database: BQL DatabaseHandler object to store database info.
+    #   @script: String with whole script.
+    # return:
+    #   Dictionary with command-[number of commands, seconds] pairs.
+    #####################################
+    def runScript(self, database, script):
+        # Variables
+        timings = collections.OrderedDict()
+        inserts = [] # Consecutive inserts into one table not run yet
+
+        # Run commands in order
+        for statement in self.splitStatements(script):
+            start = time.perf_counter()
+            commandStruct, plan = self.parseStatement(statement, database.tableHandler.db_in_use)
+            if not commandStruct:
+                continue
+            firstCommand = next(iter(commandStruct))
+            seconds = time.perf_counter() - start
+
+            # Keep inserts into the same table to run them together
+            if firstCommand == "insert into" and commandStruct["insert into"] and commandStruct.get("values"):
+                if inserts and (inserts[0]["insert into"][0] != commandStruct["insert into"][0] or len(inserts) == self.script_group_size):
+                    self.runInserts(database, inserts, timings)
+                    inserts = []
+                inserts.append(commandStruct)
+                self.addTiming(timings, firstCommand, 1, seconds)
+                continue
+
+            # Other commands run after pending inserts
+            if inserts:
+                self.runInserts(database, inserts, timings)
+                inserts = []
+            start = time.perf_counter()
+            self.runCommand(database, None, commandStruct, plan)
+            self.addTiming(timings, firstCommand, 1, seconds + time.perf_counter() - start)
+
+        # Run trailing inserts
+        if inserts:
+            self.runInserts(database, inserts, timings)
+
+        return timings
+
+    #####################################
+    # runInserts():
+    #   Runs consecutive inserts into the same table together.
+    # args:
+    #   @database: BQL DatabaseHandler object to store database info.
+    #   @commandStructs: List with command structures of inserts.
+    #   @timings: Dictionary with command-[number of commands, seconds] pairs.
+    # return:
+    #   None.
+    #####################################
+    def runInserts(self, database, commandStructs, timings):
+        start = time.perf_counter()
+        database.tableHandler.syncLog([commandStructs[0]["insert into"][0]])
+        database.tableHandler.insertCommand(*commandStructs)
+        self.addTiming(timings, "insert into", 0, time.perf_counter() - start)
+
+    #####################################
+    # addTiming():
+    #   Add run commands and their time to script timings.
+    # args:
+    #   @timings: Dictionary with command-[number of commands, seconds] pairs.
+    #   @command: String with command.
+    #   @count: Number of commands run.
+    #   @seconds: Time taken by commands.
+    # return:
+    #   None.
+    #####################################
+    def addTiming(self, timings, command, count, seconds):
+        timing = timings.setdefault(command, [0, 0.0])
+        timing[0] += count
+        timing[1] += seconds
+
+    #####################################
+    # parseStatement():
+    #   Build the command structure of a command through the plan cache. Quoted
+    #   strings and numbers are taken out of the command before it is looked up,
+    #   and put back into a copy of the cached command structure.
+    # args:
+    #   @command: String with command.
+    #   @dbPath: String with path of database in use.
+    # return:
+    #   Tuple with command structure and plan dictionary, None if not cached.
+    #####################################
+    def parseStatement(self, command, dbPath):
+        # Long commands, like large inserts, are rarely repeated
+        if len(command) > self.plan_text_limit or "\x00" in command:
+            return self.buildCommandStruct(self.tokenize(command)), None
+
+        # Take literals out of command
+        parts = self.literal_pattern.split(command)
+        literals = parts[1::2]
+        text = "\x00".join(parts[0::2])
+        if "  " in text or "\t" in text:
+            text = self.space_pattern.sub(" ", text)
+        key = (dbPath, text)
+
+        # Parse command once per database
+        entry = self.plan_cache.get(key)
+        if entry is None:
+            entry = self.buildPlanEntry(command)
+            self.plan_cache[key] = entry
+            if len(self.plan_cache) > self.plan_cache_size:
+                self.plan_cache.popitem(last = False)
+        else:
+            self.plan_cache.move_to_end(key)
+
+        return self.fillLiterals(entry[0], entry[1], literals), entry[2]
+
+    #####################################
+    # buildPlanEntry():
+    #   Parse a command with its literals replaced by their position.
+    # args:
+    #   @command: String with command.
+    # return:
+    #   List with command structure, literal slots and an empty plan. Each slot
+    #   holds the command and positions of a token made of literals, and the token
+    #   split into text and literal positions.
+    #####################################
+    def buildPlanEntry(self, command):
+        # Variables
+        parts = self.literal_pattern.split(command)
+        slots = []
+
+        # Parse command with numbered literals
+        for pos in range(1, len(parts), 2):
+            parts[pos] = "\x00" + str(pos // 2) + "\x00"
+        text = "".join(parts)
+        commStruct = self.buildCommandStruct(self.tokenize(text))
+
+        # Find tokens holding literals
+        for key, value in commStruct.items():
+            if not isinstance(value, list):
+                continue
+            for pos, part in enumerate(value):
+                tokens = part if isinstance(part, list) else [part]
+                for subpos, token in enumerate(tokens):
+                    if "\x00" in token:
+                        pieces = self.placeholder_pattern.split(token)
+                        pieces[1::2] = [int(piece) for piece in pieces[1::2]]
+                        slots.append((key, pos, subpos if isinstance(part, list) else None, pieces))
+
+        return [commStruct, slots, {}]
+
+    #####################################
+    # fillLiterals():
+    #   Copy a cached command structure, putting literals back in place.
+    # args:
+    #   @commStruct: Cached command structure.
+    #   @slots: List with literal slots of command structure.
+    #   @literals: List with literals taken out of command.
+    # return:
+    #   Command structure with literals.
+    #####################################
+    def fillLiterals(self, commStruct, slots, literals):
+        # Copy lists of structure
+        filled = {}
+        for key, value in commStruct.items():
+            if isinstance(value, list):
+                value = [part[:] if isinstance(part, list) else part for part in value]
+            filled[key] = value
+
+        # Put literals in their tokens
+        for key, pos, subpos, pieces in slots:
+            token = "".join([literals[piece] if isinstance(piece, int) else piece for piece in pieces])
+            if subpos is None:
+                filled[key][pos] = token
+            else:
+                filled[key][pos][subpos] = token
+
+        return filled
+
+    #####################################
+    # forgetPlans():
+    #   Remove plans of commands reading a table from the plan cache.
+    # args:
+    #   @dbPath: String with path of database of table.
+    #   @tname: String with name of table.
+    # return:
+    #   None.
+    #####################################
+    def forgetPlans(self, dbPath, tname):
+        for key, entry in list(self.plan_cache.items()):
+            if key[0] == dbPath and tname in entry[2].get("aliasStruct", {}).values():
+                entry[2].clear()
+
+    #####################################
+    # getTableNames():
+    #   Get names of the tables a command reads or changes.
+    # args:
+    #   @firstCommand: String with command.
+    #   @commandStruct: Command structure of command.
+    # return:
+    #   List with strings of names of tables, None if command may touch any table.
+    #####################################
+    def getTableNames(self, firstCommand, commandStruct):
+        argTokens = commandStruct[firstCommand]
+        if firstCommand == "select":
+            return [token.split(" ")[0] for token in commandStruct.get("from", [])]
+        if firstCommand in self.table_commands and argTokens:
+            return argTokens[:1]
+        return None
+
     #####################################
     # buildCommandStruct():
-    #   Create command structure for BQL processing.
+    #   Create command structure for BQL processing. Joined tables are added to
+    #   the tables of the from clause, and each join is kept under "joins" as a
+    #   list with its join mode, its table and the tokens of its on clause.
     # args:
     #   @tokens: List with tokens for BQL command.
     # return:
@@ -118,14 +440,9 @@ class BQLBase:
         # Loop through tokens
         for token in tokens:
             # Key word found
-            if token in self.valid_keywords:
-                if commandArgs and "join" not in command: # Add new command if not join
-                    commStruct[command[:-1]] = commandArgs
-                    command = ""
-                    commandArgs = []
-                elif commandArgs:
-                    commStruct[command[:-1]] = ""
-                    commStruct[list(commStruct.keys())[-2]] += commandArgs
+            if token in self.keyword_set:
+                if commandArgs: # Add command once its arguments end
+                    self.addClause(commStruct, command[:-1], commandArgs)
                     command = ""
                     commandArgs = []
                 command += token + " " # Build command
@@ -135,68 +452,186 @@ class BQLBase:
 
         # Add trailing command
         if command:
-            commStruct[command[:-1]] = commandArgs
+            self.addClause(commStruct, command[:-1], commandArgs)
+
+        # Group inserted values into records
+        if "values" in commStruct:
+            commStruct["values"] = self.splitValueRecords(commStruct["values"])
 
         return commStruct
 
+    #####################################
+    # addClause():
+    #   Add a command and its arguments to a command structure.
+    # args:
+    #   @commStruct: Command structure being built.
+    #   @command: String with command.
+    #   @commandArgs: List with arguments of command.
+    # return:
+    #   None.
+    #####################################
+    def addClause(self, commStruct, command, commandArgs):
+        joins = commStruct.get("joins")
+
+        # Joined tables are read along with tables of from clause
+        if "join" in command:
+            commStruct.setdefault("from", []).extend(commandArgs)
+            commStruct.setdefault("joins", []).append([command] + commandArgs[:1])
+        # On clause of a join holds its conditions
+        elif command == "on" and joins and len(joins[-1]) == 2:
+            joins[-1].extend(commandArgs)
+        else:
+            commStruct[command] = commandArgs
+
+    #####################################
+    # splitValueRecords():
+    #   Group tokens passed to values command into records.
+    # args:
+    #   @tokens: List with value tokens, each record ending with a ')' token.
+    # return:
+    #   List with records as lists of values.
+    #####################################
+    def splitValueRecords(self, tokens):
+        # Variables
+        records = []
+        record = []
+
+        # Loop through tokens
+        for token in tokens:
+            if token == ")": # End of record found
+                if record:
+                    records.append(record)
+                record = []
+            else:
+                record.append(token)
+
+        # Add trailing record
+        if record:
+            records.append(record)
+
+        return records
+
     #####################################
     # tokenize():
-    #   Converts a command string into a list of arguments.
+    #   Converts a command string into a list of arguments. The command is split
+    #   into tokens by a compiled pattern in a single pass, keeping quoted strings
+    #   whole even if they contain delimiters.
     # args:
     #   @command: String with words to tokenize.
     # return:
-    #   None.
+    #   List with tokens.
     #####################################
     def tokenize(self, command):
         # Variables
-        delimiters = [' ', ',', '(', ')', ';', '\t']
-        alias_delimit = [',', ';']
+        alias_delimit = (',', ';')
+        keyword_set = self.keyword_set
         tokens = []
-        token_in_progress = ''
         alias_in_progress = []
         allowVars = False
+        valuesMode = False
+        selectMode = False
 
-        # Build tokens and token list
-        for char in command:
-            if char in delimiters: # Delimiter found
-                if token_in_progress != '': # Empty token edge case
-                    if allowVars:   # Alias delimitting mode
-                        if char in alias_delimit:   # Alias delimitter found
-                            alias_in_progress.append(token_in_progress)
-                            tokens.append(" ".join(alias_in_progress))
-                            token_in_progress = ''
-                            alias_in_progress = []
-                            continue
-                        elif token_in_progress in self.valid_keywords: # New command started
-                            allowVars = False
-                            tokens.append(" ".join(alias_in_progress))
-                            alias_in_progress = []
-                        else:   # Add token to alias buffer
-                            alias_in_progress.append(token_in_progress)
-                            token_in_progress = ''
-                            continue
-                    if token_in_progress == "from": # Alias enabled zone
-                        allowVars = True
-                    if token_in_progress == "join":
-                        allowVars = True
-                    tokens.append(token_in_progress)
-                    token_in_progress = ''
-            else: # Build token
-                token_in_progress += char
-            if token_in_progress == '--': # Ignore commends
+        # Build token list from tokens and the delimiters after them
+        for match in self.token_pattern.finditer(command):
+            token, delimiters = match.groups()
+            if token == '': # Empty token edge case
+                if valuesMode: # End of inserted records
+                    tokens.extend(')' * delimiters.count(')'))
+                continue
+            if token[:2] == '--': # Ignore comments
                 return tokens
- 
+            if delimiters == '': # Tokens not followed by a delimiter are incomplete
+                break
+            if allowVars:   # Alias delimitting mode
+                if delimiters[0] in alias_delimit:   # Alias delimitter found
+                    alias_in_progress.append(token)
+                    tokens.append(" ".join(alias_in_progress))
+                    alias_in_progress = []
+                    if valuesMode:
+                        tokens.extend(')' * delimiters.count(')'))
+                    continue
+                elif token in keyword_set: # New command started
+                    allowVars = False
+                    tokens.append(" ".join(alias_in_progress))
+                    alias_in_progress = []
+                else:   # Add token to alias buffer
+                    alias_in_progress.append(token)
+                    if valuesMode: # First delimiter ended the alias, not a record
+                        tokens.extend(')' * (delimiters.count(')') - (delimiters[0] == ')')))
+                    continue
+            if token == "select" or token == "by": # Selected items or sort keys zone
+                selectMode = True
+            elif token in keyword_set:
+                selectMode = False
+            elif selectMode and token in self.aggregate_set and "(" in delimiters: # Aggregate function call
+                token += "("
+            if token == "from" or token == "join": # Alias enabled zone
+                allowVars = True
+            elif token == "values": # Record delimitting zone
+                valuesMode = True
+            tokens.append(token)
+            if valuesMode:
+                tokens.extend(')' * delimiters.count(')'))
+                # Inserted records hold no aliases, so their tokens are found at once
+                if token == "values" and not allowVars:
+                    rest = command[match.end():]
+                    if "--" not in rest:
+                        recordTokens = self.record_pattern.findall(rest)
+                        if "from" not in recordTokens and "join" not in recordTokens:
+                            tokens.extend(recordTokens)
+                            return tokens
+
         return tokens
 
+#####################################
+# runBatch():
+#   Runs a script file in batch mode and prints a timing summary.
+# args:
+#   @path: String with path to script.
+# return:
+#   1: If script was run.
+#   0: Otherwise.
+#####################################
+def runBatch(path):
+    # Variables
+    program = BQLBase()
+    database = bdb.DatabaseHandler()
+
+    # Read whole script
+    try:
+        with open(path, "r") as df:
+            script = df.read()
+    except OSError:
+        print("!Failed to run script " + path + " because it could not be read.")
+        return 0
+
+    # Run script and wait for committed changes to be applied
+    start = time.perf_counter()
+    timings = program.runScript(database, script)
+    database.tableHandler.syncLog()
+    seconds = time.perf_counter() - start
+
+    # Print timing summary apart from command output
+    total = sum([timing[0] for timing in timings.values()])
+    sys.stderr.write("-- " + str(total) + " commands in " + format(seconds, ".3f") + " s (" + format(total / max(seconds, 1e-9), ".1f") + " commands/s)\n")
+    for command, timing in timings.items():
+        sys.stderr.write("--   " + command + ": " + str(timing[0]) + " commands in " + format(timing[1], ".3f") + " s\n")
+    return 1
+
 #####################################
 # main():
-#   Starts command-line query using BQL.
+#   Starts command-line query using BQL, or runs the script given as argument.
 # args:
 #   None.
 # return:
 #   None.
 #####################################
 def main():
+    # Run script in batch mode
+    if len(sys.argv) > 1:
+        runBatch(sys.argv[1])
+        return
+
     #Initialize program
     program = BQLBase()
     command = ""
@@ -212,7 +647,7 @@ def main():
 
         # Test for input through users and redirects
         try:
-            userInput = input().lower()
+            userInput = input()
             command += userInput.strip()
         except:
             break
@@ -223,7 +658,7 @@ def main():
             continue
 
         # Test for special commands
-        if command == ".exit":
+        if command.lower() == ".exit":
             command = ""
             break
         elif command.strip() == "":
@@ -235,9 +670,7 @@ def main():
         #if command[-1] == ';':
         if ";" in command:
             command_made = True
-            query_tokens = program.tokenize(command)
-            if query_tokens != []: # Run complete command
-                program.runCommand(database, query_tokens)
+            program.runStatement(database, program.lowerCommand(command)) # Run complete command
             command = ""
         else: # If not complete, append to current command
             command += " "
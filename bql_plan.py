@@ -0,0 +1,352 @@
+#####################################
+# bql_plan:
+#   Class file for planning select commands as trees of table operators.
+# authors:
+#   @Froilan Luna-Lopez
+#       University of Nevada, Reno
+#####################################
+
+# Libraries
+import functools
+import operator
+
+selectivities = {"=": 0.1,
+        "!=": 0.9,
+        "<": 1 / 3,
+        ">": 1 / 3} # Operator-estimated fraction of records passing a condition
+flippedOps = {"=": "=",
+        "!=": "!=",
+        "<": ">",
+        ">": "<"} # Operator-operator pairs with swapped operands
+joinOpRanks = {"=": 0,
+        "<": 1,
+        ">": 1} # Operator-preference pairs of join conditions, hash joins first
+
+#####################################
+# PlanNode:
+#   Node of a select plan. Scan nodes read the table of an alias and keep the
+#   records passing their conditions, pushed down from the where and on clauses.
+#   Join nodes pair records of their two children on their first condition and
+#   keep the pairs passing the others. Filter nodes keep the records of their
+#   child passing their conditions.
+#   Conditions are tuples (alias, name, operator, alias, operand): the second
+#   alias is None when the operand is a constant, otherwise the condition
+#   compares two attributes. The first attribute of join conditions is in the
+#   first child of the join.
+#####################################
+class PlanNode:
+    #####################################
+    # Constructor
+    #
+    # args:
+    #   @kind: Either "scan", "join" or "filter".
+    #   @children: List with child PlanNodes (default = none).
+    #   @alias: String with alias of scanned table (default = "").
+    #####################################
+    def __init__(self, kind, children = None, alias = ""):
+        self.kind = kind
+        self.children = children or []
+        self.alias = alias
+        self.aliases = [alias] if alias else [name for child in self.children for name in child.aliases] # Aliases of tables below node
+        self.conds = []
+        self.joinMode = "inner join"
+        self.rows = 0.0 # Estimated number of records
+
+    #####################################
+    # scans():
+    #   Get scan nodes below node, in from order.
+    # args:
+    #   None.
+    # return:
+    #   List with PlanNodes.
+    #####################################
+    def scans(self):
+        if self.kind == "scan":
+            return [self]
+        return [scan for child in self.children for scan in child.scans()]
+
+#####################################
+# splitConditions():
+#   Split tokens of a where or on clause into conditions joined by 'and'.
+# args:
+#   @tokens: List with tokens of clause, or None.
+# return:
+#   List with [operand, operator, operand] lists, or None if tokens are not conditions.
+#####################################
+def splitConditions(tokens):
+    # Variables
+    conds = []
+    if not tokens:
+        return conds
+    if len(tokens) % 4 != 3:
+        return None
+
+    # Loop through conditions
+    for start in range(0, len(tokens), 4):
+        if start > 0 and tokens[start - 1] != "and":
+            return None
+        conds.append(tokens[start:start + 3])
+
+    return conds
+
+#####################################
+# resolveAttr():
+#   Find table alias of an attribute given as "name" or "alias.name". Attributes
+#   without alias belong to the first table having them.
+# args:
+#   @token: String with attribute reference.
+#   @aliases: List with aliases of tables, in from order.
+#   @schemas: Dictionary with alias-attribute names pairs.
+# return:
+#   Tuple with alias and attribute name, or None if attribute does not exist.
+#####################################
+def resolveAttr(token, aliases, schemas):
+    alias, dot, name = token.rpartition(".")
+    if dot:
+        if alias in schemas and name in schemas[alias]:
+            return alias, name
+        return None
+    for alias in aliases:
+        if token in schemas[alias]:
+            return alias, token
+    return None
+
+#####################################
+# parseConditions():
+#   Build conditions of a where or on clause. Operands on the right side are
+#   attributes when given with the alias of a table, and constants otherwise.
+# args:
+#   @tokens: List with tokens of clause, or None.
+#   @aliases: List with aliases of tables, in from order.
+#   @schemas: Dictionary with alias-attribute names pairs.
+# return:
+#   Tuple with list of conditions and None, or None and a string with the error.
+#####################################
+def parseConditions(tokens, aliases, schemas):
+    # Variables
+    conds = []
+    triples = splitConditions(tokens)
+    if triples is None:
+        return None, "condition '" + " ".join(tokens) + "' is not valid"
+
+    # Loop through conditions
+    for operand_1, condOp, operand_2 in triples:
+        attr_1 = resolveAttr(operand_1, aliases, schemas)
+        if attr_1 is None:
+            return None, "attribute " + operand_1 + " does not exist"
+        if operand_2.rpartition(".")[0] in schemas:
+            attr_2 = resolveAttr(operand_2, aliases, schemas)
+            if attr_2 is None:
+                return None, "attribute " + operand_2 + " does not exist"
+            conds.append(attr_1 + (condOp,) + attr_2)
+        else:
+            conds.append(attr_1 + (condOp, None, operand_2.replace('"', "'")))
+
+    return conds, None
+
+#####################################
+# flipCondition():
+#   Swap the attributes of a condition between two attributes.
+# args:
+#   @cond: Condition tuple.
+# return:
+#   Condition tuple.
+#####################################
+def flipCondition(cond):
+    return (cond[3], cond[4], flippedOps.get(cond[2], cond[2]), cond[0], cond[1])
+
+#####################################
+# buildPlan():
+#   Build a left-deep tree joining tables in from order. Conditions on a single
+#   table are pushed down to its scan, except where conditions on the table
+#   emptied by a left outer join, which are tested after the join. Conditions
+#   between tables are tested by the first join having both tables.
+# args:
+#   @aliases: List with aliases of tables, in from order.
+#   @joinModes: Dictionary with alias-join mode pairs of joined tables.
+#   @onConds: Dictionary with alias-conditions pairs of the on clause of each joined table.
+#   @whereConds: List with conditions of where clause.
+# return:
+#   Tuple with root PlanNode and None, or None and a string with the error.
+#####################################
+def buildPlan(aliases, joinModes, onConds, whereConds):
+    # Variables
+    scans = dict([(alias, PlanNode("scan", alias = alias)) for alias in aliases])
+    outerAliases = [alias for alias in aliases if joinModes.get(alias) == "left outer join"] # Tables emptied by outer joins
+    joinConds = [] # Conditions between tables of inner joins
+    topConds = [] # Conditions tested after every join
+
+    # Push where conditions on a single table down to scans
+    for cond in whereConds:
+        if cond[3] is None or cond[3] == cond[0]:
+            if cond[0] in outerAliases:
+                topConds.append(cond)
+            else:
+                scans[cond[0]].conds.append(cond)
+        elif cond[0] in outerAliases or cond[3] in outerAliases:
+            topConds.append(cond)
+        else:
+            joinConds.append(cond)
+
+    # Push on conditions on a single table down to scans
+    outerConds = {} # Alias-conditions between tables pairs of outer joins
+    for alias, conds in onConds.items():
+        for cond in conds:
+            if cond[3] is None or cond[3] == cond[0]:
+                if joinModes.get(alias) == "left outer join" and cond[0] != alias:
+                    return None, "on conditions of outer joins may only test the joined table alone"
+                scans[cond[0]].conds.append(cond)
+            elif joinModes.get(alias) == "left outer join":
+                outerConds.setdefault(alias, []).append(cond)
+            else:
+                joinConds.append(cond)
+
+    # Join tables in from order
+    root = scans[aliases[0]]
+    for alias in aliases[1:]:
+        node = PlanNode("join", [root, scans[alias]])
+        node.joinMode = joinModes.get(alias, "inner join")
+        if node.joinMode == "left outer join":
+            conds = outerConds.get(alias, [])
+            if len(conds) > 1:
+                return None, "outer joins may only have one condition between tables"
+        else:
+            conds = [cond for cond in joinConds if (cond[0] == alias and cond[3] in root.aliases) or (cond[3] == alias and cond[0] in root.aliases)]
+            joinConds = [cond for cond in joinConds if cond not in conds]
+        node.conds = [flipCondition(cond) if cond[0] == alias else cond for cond in conds]
+        node.conds.sort(key = lambda cond: joinOpRanks.get(cond[2], 2))
+        root = node
+
+    # Test remaining conditions last
+    if topConds or joinConds:
+        node = PlanNode("filter", [root])
+        node.conds = topConds + joinConds
+        root = node
+
+    # Test most selective conditions of each scan first
+    for scan in scans.values():
+        scan.conds.sort(key = lambda cond: selectivities.get(cond[2], 1.0))
+
+    return root, None
+
+#####################################
+# joinRows():
+#   Estimate number of records of a join. Joins on equality keep about one
+#   pair per record of the larger side.
+# args:
+#   @rows_1: Estimated number of records of first child.
+#   @rows_2: Estimated number of records of second child.
+#   @conds: List with conditions of join, the join condition first.
+# return:
+#   Float with estimated number of records.
+#####################################
+def joinRows(rows_1, rows_2, conds):
+    passing = functools.reduce(operator.mul, [selectivities.get(cond[2], 1.0) for cond in conds], 1.0)
+    if conds and conds[0][2] == "=":
+        return max(rows_1, rows_2) * passing / selectivities["="]
+    return rows_1 * rows_2 * passing
+
+#####################################
+# estimateRows():
+#   Estimate number of records produced by each node of a plan.
+# args:
+#   @node: Root PlanNode.
+#   @cardinalities: Dictionary with alias-number of records pairs of scans,
+#                   counted after the conditions of the scans.
+# return:
+#   Float with estimated number of records of root.
+#####################################
+def estimateRows(node, cardinalities):
+    # Scans are counted
+    if node.kind == "scan":
+        node.rows = float(cardinalities[node.alias])
+        return node.rows
+
+    # Filters keep passing records of their input
+    if node.kind == "filter":
+        passing = functools.reduce(operator.mul, [selectivities.get(cond[2], 1.0) for cond in node.conds], 1.0)
+        node.rows = estimateRows(node.children[0], cardinalities) * passing
+        return node.rows
+
+    # Outer joins keep every record of their first child
+    rows_1 = estimateRows(node.children[0], cardinalities)
+    node.rows = joinRows(rows_1, estimateRows(node.children[1], cardinalities), node.conds)
+    if node.joinMode == "left outer join":
+        node.rows = max(node.rows, rows_1)
+    return node.rows
+
+#####################################
+# connects():
+#   Test whether a condition is between a table and tables already joined.
+# args:
+#   @cond: Condition tuple.
+#   @aliases: List with aliases of joined tables.
+#   @alias: String with alias of table.
+# return:
+#   True: If condition compares an attribute of table with one of joined tables.
+#   False: Otherwise.
+#####################################
+def connects(cond, aliases, alias):
+    return (cond[0] == alias and cond[3] in aliases) or (cond[3] == alias and cond[0] in aliases)
+
+#####################################
+# orderJoins():
+#   Reorder a plan made of inner joins only. The first table in from order
+#   leads the pipeline, and the table joined next is always the one giving the
+#   fewest estimated records. Conditions between tables move to the first join
+#   having both tables. Plans with outer joins keep from order. Joined records
+#   are therefore ordered by the records of the first table in from order, and
+#   the records joined to each of them by the order of the tables joined after.
+#   Equality joins hash the smaller of their sides without changing this
+#   order, see joinChunks().
+# args:
+#   @root: Root PlanNode built by buildPlan().
+#   @cardinalities: Dictionary with alias-number of records pairs of scans,
+#                   counted after the conditions of the scans.
+# return:
+#   Root PlanNode, with estimated number of records of every node.
+#####################################
+def orderJoins(root, cardinalities):
+    # Variables
+    top = root if root.kind == "filter" else None
+    node = root.children[0] if top else root
+    joins = []
+    while node.kind == "join":
+        joins.append(node)
+        node = node.children[0]
+
+    # Keep plans with outer joins
+    if len(joins) < 2 or any([join.joinMode != "inner join" for join in joins]):
+        estimateRows(root, cardinalities)
+        return root
+
+    # Variables
+    remaining = [join.children[1] for join in reversed(joins)] # Scans in from order
+    conds = [cond for join in joins for cond in join.conds]
+    node.rows = float(cardinalities[node.alias])
+    for scan in remaining:
+        scan.rows = float(cardinalities[scan.alias])
+
+    # Join table giving the fewest records until every table is joined
+    while remaining:
+        best = None
+        for scan in remaining:
+            scanConds = [flipCondition(cond) if cond[0] == scan.alias else cond for cond in conds if connects(cond, node.aliases, scan.alias)]
+            scanConds.sort(key = lambda cond: joinOpRanks.get(cond[2], 2))
+            rows = joinRows(node.rows, scan.rows, scanConds)
+            if best is None or rows < best[0]:
+                best = (rows, scan, scanConds)
+        rows, scan, scanConds = best
+        conds = [cond for cond in conds if not connects(cond, node.aliases, scan.alias)]
+        remaining.remove(scan)
+        node = PlanNode("join", [node, scan])
+        node.conds = scanConds
+        node.rows = rows
+
+    # Test remaining conditions last
+    if top is not None:
+        top.children = [node]
+        top.aliases = node.aliases
+        node = top
+    estimateRows(node, cardinalities)
+    return node
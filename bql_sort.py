@@ -0,0 +1,112 @@
+#####################################
+# bql_sort:
+#   Class file for sorting selected records, in memory or through sorted runs
+#   spilled to disk.
+# authors:
+#   @Froilan Luna-Lopez
+#       University of Nevada, Reno
+#####################################
+
+# Libraries
+import functools
+import heapq
+import sys
+import bql_spill as bsp
+
+#####################################
+# rankValue():
+#   Get a sort key of a typed value. Empty values come before numbers, and
+#   numbers before text, so attributes holding values of several kinds still sort.
+# args:
+#   @value: Typed value.
+# return:
+#   Tuple with rank of kind of value and value.
+#####################################
+def rankValue(value):
+    if value is None:
+        return (0, 0)
+    if isinstance(value, (int, float)):
+        return (1, value)
+    return (2, value)
+
+#####################################
+# compareRecords():
+#   Compare two records on sort keys.
+# args:
+#   @keys: List with (position in records, descending) pairs, most significant first.
+#   @record_1: First record.
+#   @record_2: Second record.
+# return:
+#   Negative integer if first record comes first, positive if second record
+#   comes first, 0 if keys are equal.
+#####################################
+def compareRecords(keys, record_1, record_2):
+    for pos, descending in keys:
+        rank_1 = rankValue(record_1[pos])
+        rank_2 = rankValue(record_2[pos])
+        if rank_1 != rank_2:
+            first = rank_1 < rank_2
+            return -1 if first != descending else 1
+    return 0
+
+#####################################
+# sortRun():
+#   Sort records in memory, keeping the order of records with equal keys.
+# args:
+#   @records: List with records.
+#   @keys: List with (position in records, descending) pairs, most significant first.
+# return:
+#   None.
+#####################################
+def sortRun(records, keys):
+    # Stable sorts on the least significant key first
+    for pos, descending in reversed(keys):
+        records.sort(key = lambda record: rankValue(record[pos]), reverse = descending)
+
+#####################################
+# sortRecords():
+#   Sort records on keys with bounded memory. Records are gathered into runs
+#   until a run goes over the memory budget, then the run is sorted and spilled
+#   to a temporary file. Spilled runs and the last run are merged through a heap.
+#   Records with equal keys keep their order.
+# args:
+#   @records: Iterable with records as lists or tuples of typed values.
+#   @keys: List with (position in records, descending) pairs, most significant first.
+#   @budget: Bytes of memory a run may use.
+#   @directory: String with path to directory of spilled runs.
+# return:
+#   Generator with sorted records.
+#####################################
+def sortRecords(records, keys, budget, directory):
+    # Variables
+    spillFiles = [] # Sorted runs on disk, in record order
+    run = []
+    size = 0
+
+    try:
+        # Spill runs over budget
+        for record in records:
+            run.append(record)
+            size += sys.getsizeof(record) + sum(map(sys.getsizeof, record))
+            if size > budget:
+                sortRun(run, keys)
+                spillFiles.append(bsp.SpillFile(directory))
+                spillFiles[-1].write(run)
+                run = []
+                size = 0
+        sortRun(run, keys)
+
+        # Records fitting in memory need no merge
+        if not spillFiles:
+            yield from run
+            return
+
+        # Merge runs, earlier runs first among equal keys
+        runs = [spillFile.records() for spillFile in spillFiles] + [iter(run)]
+        if len(set([descending for pos, descending in keys])) == 1: # Keys sorted the same way compare as lists
+            yield from heapq.merge(*runs, key = lambda record: [rankValue(record[pos]) for pos, descending in keys], reverse = keys[0][1])
+        else:
+            yield from heapq.merge(*runs, key = functools.cmp_to_key(functools.partial(compareRecords, keys)))
+    finally:
+        for spillFile in spillFiles:
+            spillFile.remove()
@@ -0,0 +1,70 @@
+#####################################
+# bql_spill:
+#   Class file for temporary files holding intermediate records of commands
+#   that do not fit in memory.
+# authors:
+#   @Froilan Luna-Lopez
+#       University of Nevada, Reno
+#####################################
+
+# Libraries
+import json
+import os
+import tempfile
+
+#####################################
+# SpillFile:
+#   Temporary file in a database directory, holding records written in batches
+#   and read back in the same order. Records are lists of numbers, strings and
+#   empty values, stored one JSON list per line.
+#####################################
+class SpillFile:
+    #####################################
+    # Constructor
+    #
+    # args:
+    #   @directory: String with path to directory of file.
+    #####################################
+    def __init__(self, directory):
+        descriptor, self.spath = tempfile.mkstemp(prefix = "_spill_", suffix = ".tmp", dir = directory or ".")
+        self.file = os.fdopen(descriptor, "w")
+        self.count = 0 # Number of records written
+
+    #####################################
+    # write():
+    #   Append records to file.
+    # args:
+    #   @records: List with records as lists.
+    # return:
+    #   None.
+    #####################################
+    def write(self, records):
+        self.file.write("".join([json.dumps(record) + "\n" for record in records]))
+        self.count += len(records)
+
+    #####################################
+    # records():
+    #   Lazily read records of file, in the order they were written.
+    # args:
+    #   None.
+    # return:
+    #   Generator with records as lists.
+    #####################################
+    def records(self):
+        self.file.flush()
+        with open(self.spath, "r") as df:
+            for line in df:
+                yield json.loads(line)
+
+    #####################################
+    # remove():
+    #   Close and delete file.
+    # args:
+    #   None.
+    # return:
+    #   None.
+    #####################################
+    def remove(self):
+        self.file.close()
+        if os.path.isfile(self.spath):
+            os.remove(self.spath)
@@ -0,0 +1,590 @@
+#####################################
+# bql_storage:
+#   Class file for the binary table storage format.
+# authors:
+#   @Froilan Luna-Lopez
+#       University of Nevada, Reno
+#####################################
+
+# Libraries
+import array
+import bisect
+import itertools
+import mmap
+import os
+import struct
+import sys
+
+#####################################
+# Binary table format:
+#   A binary table file is a sequence of fixed-size pages. Page 0 holds the
+#   header: magic bytes, format version, page size, number of data pages,
+#   number of records and the schema ("types\nnames"). Every other page holds
+#   a run of records stored by column:
+#       u32 number of records n
+#       per attribute:
+#           null bitmap of (n + 7) // 8 bytes
+#           int/float: n fixed-width 8-byte values
+#           others: (n + 1) u32 offsets followed by the utf-8 bytes of all values
+#   The record count at the start of each page forms the page directory, read
+#   through a memory map without decoding any records.
+#####################################
+PAGE_SIZE = 16384 # Bytes per page
+MAGIC = b"BQLB" # First bytes of binary table files
+VERSION = 1 # Format version
+HEADER = struct.Struct("<4sHHIIQI") # Magic, version, reserved, page size, page count, record count, schema length
+COUNT = struct.Struct("<I") # Records in a page
+FIXED_CODES = {"int": "q", "float": "d"} # Datatype-array typecode pairs of fixed-width attributes
+PATCH_MAGIC = b"BQLP" # First bytes of page patch files
+PATCH_PAGE = struct.Struct("<I") # Number of page written by each entry of a page patch
+formatCache = {} # Table path-((mtime, size), whether file is binary) pairs
+
+#####################################
+# isBinaryTable():
+#   Test whether a table file uses the binary format. The answer is kept until
+#   the file changes.
+# args:
+#   @tpath: String with path to table.
+# return:
+#   True: If file starts with the binary magic bytes.
+#   False: Otherwise.
+#####################################
+def isBinaryTable(tpath):
+    # Variables
+    stat = os.stat(tpath)
+    version = (stat.st_mtime_ns, stat.st_size)
+    cached = formatCache.get(tpath)
+
+    # Read magic bytes if file changed since it was tested
+    if cached is None or cached[0] != version:
+        with open(tpath, "rb") as df:
+            cached = (version, df.read(len(MAGIC)) == MAGIC)
+        formatCache[tpath] = cached
+    return cached[1]
+
+#####################################
+# encodeHeader():
+#   Build the header page of a binary table.
+# args:
+#   @types: List with datatype of each attribute.
+#   @names: List with name of each attribute.
+#   @pageCount: Number of data pages.
+#   @recordCount: Number of records.
+# return:
+#   Bytes with header page.
+#####################################
+def encodeHeader(types, names, pageCount, recordCount):
+    schema = (",".join(types) + "\n" + ",".join(names)).encode()
+    header = HEADER.pack(MAGIC, VERSION, 0, PAGE_SIZE, pageCount, recordCount, len(schema)) + schema
+    if len(header) > PAGE_SIZE:
+        raise ValueError("schema does not fit in header page")
+    return header + bytes(PAGE_SIZE - len(header))
+
+#####################################
+# encodeValue():
+#   Convert a variable-width value into bytes.
+# args:
+#   @value: Value to convert.
+# return:
+#   Bytes with utf-8 text of value, empty if value is None.
+#####################################
+def encodeValue(value):
+    if value is None:
+        return b""
+    return str(value).encode()
+
+#####################################
+# pageBytes():
+#   Get bytes used by a page.
+# args:
+#   @types: List with datatype of each attribute.
+#   @count: Number of records in page.
+#   @varBytes: Bytes of variable-width values in page.
+# return:
+#   Integer with number of bytes.
+#####################################
+def pageBytes(types, count, varBytes):
+    size = COUNT.size + varBytes
+    for dtype in types:
+        size += (count + 7) // 8
+        if dtype in FIXED_CODES:
+            size += 8 * count
+        else:
+            size += 4 * (count + 1)
+    return size
+
+#####################################
+# pageRanges():
+#   Split records stored by column into runs that fit in a page.
+# args:
+#   @types: List with datatype of each attribute.
+#   @columns: List with values of each attribute.
+# return:
+#   Generator with (start, end) record positions of each page.
+#####################################
+def pageRanges(types, columns):
+    # Variables
+    total = len(columns[0]) if columns else 0
+    varColumns = [column for dtype, column in zip(types, columns) if dtype not in FIXED_CODES]
+    start = 0
+    varBytes = 0
+
+    # Add records until the page is full
+    for pos in range(total):
+        recordBytes = sum([len(encodeValue(column[pos])) for column in varColumns])
+        if pageBytes(types, pos + 1 - start, varBytes + recordBytes) > PAGE_SIZE:
+            if pos == start:
+                raise ValueError("record does not fit in a page")
+            yield start, pos
+            start = pos
+            varBytes = 0
+            if pageBytes(types, 1, recordBytes) > PAGE_SIZE:
+                raise ValueError("record does not fit in a page")
+        varBytes += recordBytes
+
+    # Add trailing page
+    if start < total:
+        yield start, total
+
+#####################################
+# encodePage():
+#   Build a data page from a run of records stored by column.
+# args:
+#   @types: List with datatype of each attribute.
+#   @columns: List with values of each attribute.
+# return:
+#   Bytes with data page.
+#####################################
+def encodePage(types, columns):
+    # Variables
+    count = len(columns[0]) if columns else 0
+    parts = [COUNT.pack(count)]
+
+    # Encode attributes one after the other
+    for dtype, column in zip(types, columns):
+        # Mark empty values
+        bitmap = bytearray((count + 7) // 8)
+        if not isinstance(column, array.array):
+            for pos in range(count):
+                if column[pos] is None:
+                    bitmap[pos >> 3] |= 1 << (pos & 7)
+        parts.append(bytes(bitmap))
+
+        # Fixed-width values
+        code = FIXED_CODES.get(dtype)
+        if code:
+            try:
+                values = array.array(code, [0 if value is None else value for value in column])
+            except TypeError:
+                raise ValueError("attribute of type " + dtype + " has a value of another datatype")
+            if sys.byteorder == "big":
+                values.byteswap()
+            parts.append(values.tobytes())
+        # Variable-width values
+        else:
+            encoded = [encodeValue(value) for value in column]
+            offsets = array.array("I", [0])
+            total = 0
+            for data in encoded:
+                total += len(data)
+                offsets.append(total)
+            if sys.byteorder == "big":
+                offsets.byteswap()
+            parts.append(offsets.tobytes())
+            parts.append(b"".join(encoded))
+
+    # Pad page
+    page = b"".join(parts)
+    return page + bytes(PAGE_SIZE - len(page))
+
+#####################################
+# writeBinaryTable():
+#   Write a whole table in the binary format.
+# args:
+#   @path: String with path to file.
+#   @types: List with datatype of each attribute.
+#   @names: List with name of each attribute.
+#   @columns: List with values of each attribute.
+# return:
+#   None.
+#####################################
+def writeBinaryTable(path, types, names, columns):
+    # Variables
+    recordCount = len(columns[0]) if columns else 0
+    pages = [encodePage(types, [column[start:end] for column in columns]) for start, end in pageRanges(types, columns)]
+    header = encodeHeader(types, names, len(pages), recordCount)
+
+    # Write header and pages
+    with open(path, "wb") as df:
+        df.write(header)
+        for page in pages:
+            df.write(page)
+
+#####################################
+# writePatch():
+#   Write pages to be copied into a binary table later, forced to disk. Each
+#   entry holds the number of a page, 0 being the header, and its bytes.
+# args:
+#   @path: String with path to patch file.
+#   @pages: Dictionary with page number-bytes of page pairs.
+# return:
+#   None.
+#####################################
+def writePatch(path, pages):
+    with open(path, "wb") as df:
+        df.write(PATCH_MAGIC)
+        for pageNum in sorted(pages):
+            df.write(PATCH_PAGE.pack(pageNum) + pages[pageNum])
+        df.flush()
+        os.fsync(df.fileno())
+
+#####################################
+# isPatch():
+#   Test whether a file is a page patch written by writePatch().
+# args:
+#   @path: String with path to file.
+# return:
+#   True: If file exists and starts with the patch magic bytes.
+#   False: Otherwise.
+#####################################
+def isPatch(path):
+    try:
+        with open(path, "rb") as df:
+            return df.read(len(PATCH_MAGIC)) == PATCH_MAGIC
+    except OSError:
+        return False
+
+#####################################
+# applyPatch():
+#   Copy the pages of a patch into a binary table in place, forced to disk.
+#   Copying them again gives the same file, so a patch cut short is applied
+#   again from the start. The modification time of the table always moves,
+#   so copies cached after it are refreshed.
+# args:
+#   @tpath: String with path to table.
+#   @path: String with path to patch file.
+# return:
+#   None.
+#####################################
+def applyPatch(tpath, path):
+    # Variables
+    stat = os.stat(tpath)
+
+    # Copy pages one at a time
+    with open(path, "rb") as pf, open(tpath, "r+b") as df:
+        pf.seek(len(PATCH_MAGIC))
+        entry = pf.read(PATCH_PAGE.size + PAGE_SIZE)
+        while len(entry) == PATCH_PAGE.size + PAGE_SIZE:
+            df.seek(PATCH_PAGE.unpack_from(entry)[0] * PAGE_SIZE)
+            df.write(entry[PATCH_PAGE.size:])
+            entry = pf.read(PATCH_PAGE.size + PAGE_SIZE)
+        df.flush()
+        os.fsync(df.fileno())
+
+    # Move modification time past the one before the patch
+    if os.stat(tpath).st_mtime_ns <= stat.st_mtime_ns:
+        os.utime(tpath, ns = (stat.st_atime_ns, stat.st_mtime_ns + 1))
+
+#####################################
+# BinaryTable:
+#   Reader and appender of a binary table file.
+#####################################
+class BinaryTable:
+    #####################################
+    # Constructor
+    #
+    # args:
+    #   @tpath: String with path to table.
+    #####################################
+    def __init__(self, tpath):
+        self.tpath = tpath
+        with open(tpath, "rb") as df:
+            magic, version, _, self.pageSize, self.pageCount, self.recordCount, schemaLen = HEADER.unpack(df.read(HEADER.size))
+            schema = df.read(schemaLen).decode().split("\n")
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(tpath + " is not a binary table")
+        self.types = schema[0].split(",")
+        self.names = schema[1].split(",")
+        self.pageStarts = None # Page directory with position of first record of each page
+
+    #####################################
+    # openMap():
+    #   Map table file into memory.
+    # args:
+    #   @df: Open binary file of table.
+    # return:
+    #   Read-only mmap object, or None if table has no data pages.
+    #####################################
+    def openMap(self, df):
+        if self.pageCount == 0:
+            return None
+        mm = mmap.mmap(df.fileno(), 0, access = mmap.ACCESS_READ)
+        if self.pageStarts is None:
+            self.pageStarts = []
+            start = 0
+            for pageNum in range(self.pageCount):
+                self.pageStarts.append(start)
+                start += COUNT.unpack_from(mm, (pageNum + 1) * self.pageSize)[0]
+        return mm
+
+    #####################################
+    # decodePage():
+    #   Read the records of a data page. Attributes not read are skipped
+    #   without decoding them.
+    # args:
+    #   @mm: Memory map of table file.
+    #   @pageNum: Number of data page, starting at 0.
+    #   @colnums: List with positions of attributes to read (default = all attributes).
+    # return:
+    #   List with values of each read attribute, in order of colnums: arrays
+    #   for fixed-width int attributes without empty values, lists otherwise.
+    #####################################
+    def decodePage(self, mm, pageNum, colnums = None):
+        # Variables
+        offset = (pageNum + 1) * self.pageSize
+        count = COUNT.unpack_from(mm, offset)[0]
+        offset += COUNT.size
+        wanted = range(len(self.types)) if colnums is None else set(colnums)
+        decoded = {} # Attribute position-values pairs
+
+        # Decode attributes one after the other
+        for colnum, dtype in enumerate(self.types):
+            bitmapLen = (count + 7) // 8
+            code = FIXED_CODES.get(dtype)
+            # Skip attributes not read
+            if colnum not in wanted:
+                offset += bitmapLen
+                if code:
+                    offset += 8 * count
+                else:
+                    offset += 4 * (count + 1) + COUNT.unpack_from(mm, offset + 4 * count)[0]
+                continue
+            bitmap = mm[offset:offset + bitmapLen]
+            offset += bitmapLen
+            # Fixed-width values are copied as a whole
+            if code:
+                values = array.array(code)
+                values.frombytes(mm[offset:offset + 8 * count])
+                offset += 8 * count
+                if sys.byteorder == "big":
+                    values.byteswap()
+                if code != "q":
+                    values = values.tolist()
+            # Variable-width values are cut from their data bytes
+            else:
+                offsets = array.array("I")
+                offsets.frombytes(mm[offset:offset + 4 * (count + 1)])
+                offset += 4 * (count + 1)
+                if sys.byteorder == "big":
+                    offsets.byteswap()
+                data = mm[offset:offset + offsets[count]]
+                offset += offsets[count]
+                values = [data[offsets[pos]:offsets[pos + 1]].decode() for pos in range(count)]
+            # Restore empty values
+            if any(bitmap):
+                values = list(values)
+                for pos in range(count):
+                    if bitmap[pos >> 3] & (1 << (pos & 7)):
+                        values[pos] = None
+            decoded[colnum] = values
+
+        return [decoded[colnum] for colnum in (range(len(self.types)) if colnums is None else colnums)]
+
+    #####################################
+    # readColumns():
+    #   Read all records of table.
+    # args:
+    #   @colnums: List with positions of attributes to read (default = all attributes).
+    # return:
+    #   List with values of each read attribute, in order of colnums.
+    #####################################
+    def readColumns(self, colnums = None):
+        # Variables
+        if colnums is None:
+            colnums = list(range(len(self.types)))
+        columns = [array.array("q") if self.types[colnum] == "int" else [] for colnum in colnums]
+
+        # Append columns of each page
+        with open(self.tpath, "rb") as df:
+            mm = self.openMap(df)
+            if mm is None:
+                return columns
+            with mm:
+                for pageNum in range(self.pageCount):
+                    for pos, values in enumerate(self.decodePage(mm, pageNum, colnums)):
+                        if isinstance(columns[pos], array.array) and not isinstance(values, array.array):
+                            columns[pos] = list(columns[pos])
+                        columns[pos].extend(values)
+
+        return columns
+
+    #####################################
+    # readColumnsAt():
+    #   Read some attributes of records at some positions, decoding only the
+    #   pages holding them.
+    # args:
+    #   @colnums: List with positions of attributes to read.
+    #   @positions: List with record positions, in increasing order.
+    # return:
+    #   List with values of each read attribute, in order of colnums.
+    #####################################
+    def readColumnsAt(self, colnums, positions):
+        # Variables
+        columns = [[] for _ in colnums]
+
+        # Read passing records of each page holding some
+        with open(self.tpath, "rb") as df:
+            mm = self.openMap(df)
+            if mm is None:
+                return columns
+            with mm:
+                for pageNum, pagePositions in itertools.groupby(positions, lambda pos: bisect.bisect_right(self.pageStarts, pos) - 1):
+                    slots = [pos - self.pageStarts[pageNum] for pos in pagePositions]
+                    for column, values in zip(columns, self.decodePage(mm, pageNum, colnums)):
+                        column.extend([values[slot] for slot in slots])
+
+        return columns
+
+    #####################################
+    # scanRecords():
+    #   Lazily read records of table one page at a time.
+    # args:
+    #   @colnums: List with positions of attributes to read (default = all attributes).
+    # return:
+    #   Generator with records as tuples of values of read attributes.
+    #####################################
+    def scanRecords(self, colnums = None):
+        with open(self.tpath, "rb") as df:
+            mm = self.openMap(df)
+            if mm is None:
+                return
+            with mm:
+                for pageNum in range(self.pageCount):
+                    for record in zip(*self.decodePage(mm, pageNum, colnums)):
+                        yield record
+
+    #####################################
+    # readRecordsAt():
+    #   Read records at some positions, decoding only the pages holding them.
+    # args:
+    #   @positions: List with record positions.
+    # return:
+    #   List with records as tuples of values, in order of positions.
+    #####################################
+    def readRecordsAt(self, positions):
+        # Variables
+        records = []
+        pages = {} # Page number-decoded columns pairs
+
+        # Find page of each record through page directory
+        with open(self.tpath, "rb") as df:
+            mm = self.openMap(df)
+            if mm is None:
+                return records
+            with mm:
+                for pos in positions:
+                    pageNum = bisect.bisect_right(self.pageStarts, pos) - 1
+                    if pageNum not in pages:
+                        pages[pageNum] = self.decodePage(mm, pageNum)
+                    slot = pos - self.pageStarts[pageNum]
+                    records.append(tuple([values[slot] for values in pages[pageNum]]))
+
+        return records
+
+    #####################################
+    # appendRecords():
+    #   Append records to table, rewriting only its last page and header.
+    # args:
+    #   @records: List with records as lists of typed values.
+    # return:
+    #   List with positions of appended records.
+    #####################################
+    def appendRecords(self, records):
+        # Variables
+        firstPage = max(self.pageCount - 1, 0)
+        firstPos = self.recordCount
+
+        # Start from records of last page
+        with open(self.tpath, "r+b") as df:
+            mm = self.openMap(df)
+            if mm is None:
+                columns = [[] for _ in self.types]
+            else:
+                with mm:
+                    columns = [list(values) for values in self.decodePage(mm, firstPage)]
+            for record in records:
+                for colnum in range(len(columns)):
+                    columns[colnum].append(record[colnum])
+
+            # Write pages from last page onwards
+            pageNum = firstPage
+            df.seek((firstPage + 1) * self.pageSize)
+            for start, end in pageRanges(self.types, columns):
+                df.write(encodePage(self.types, [column[start:end] for column in columns]))
+                pageNum += 1
+
+            # Update header
+            self.pageCount = pageNum
+            self.recordCount += len(records)
+            self.pageStarts = None
+            df.seek(0)
+            df.write(encodeHeader(self.types, self.names, self.pageCount, self.recordCount))
+
+        return list(range(firstPos, self.recordCount))
+
+    #####################################
+    # changePages():
+    #   Build the pages of table changed by updates and appended records,
+    #   without writing them. Appended records go after the records of the
+    #   last page, which is split into as many pages as they need.
+    # args:
+    #   @updates: List with (attribute position, typed value, record positions)
+    #             tuples, in order.
+    #   @records: List with appended records as lists of typed values.
+    # return:
+    #   Dictionary with page number-bytes of page pairs, 0 being the header, or
+    #   None if an updated page other than the last no longer fits in a page.
+    #####################################
+    def changePages(self, updates, records):
+        # Variables
+        lastPage = max(self.pageCount - 1, 0)
+        pages = {} # Data page number-values of each attribute pairs
+        pageCount = self.pageCount
+
+        # Decode pages holding appended or updated records
+        with open(self.tpath, "rb") as df:
+            mm = self.openMap(df)
+            pageStarts = self.pageStarts or [0]
+            pageNums = set([lastPage]) if records else set()
+            for _, _, positions in updates:
+                pageNums.update([min(bisect.bisect_right(pageStarts, pos) - 1, lastPage) for pos in positions])
+            for pageNum in pageNums:
+                if mm is None:
+                    pages[pageNum] = [[] for _ in self.types]
+                else:
+                    pages[pageNum] = [list(values) for values in self.decodePage(mm, pageNum)]
+            if mm is not None:
+                mm.close()
+
+        # Append records to last page, then update records, as updates never move records
+        for record in records:
+            for colnum, column in enumerate(pages[lastPage]):
+                column.append(record[colnum])
+        for colnum, value, positions in updates:
+            for pos in positions:
+                pageNum = min(bisect.bisect_right(pageStarts, pos) - 1, lastPage)
+                pages[pageNum][colnum][pos - pageStarts[pageNum]] = value
+
+        # Encode changed pages
+        changed = {}
+        for pageNum, columns in pages.items():
+            ranges = list(pageRanges(self.types, columns))
+            if pageNum != lastPage and len(ranges) != 1:
+                return None
+            for num, (start, end) in enumerate(ranges):
+                changed[pageNum + num + 1] = encodePage(self.types, [column[start:end] for column in columns])
+            if pageNum == lastPage:
+                pageCount = lastPage + len(ranges)
+        changed[0] = encodeHeader(self.types, self.names, pageCount, self.recordCount + len(records))
+
+        return changed
@@ -7,20 +7,35 @@
 #####################################
 
 # Libraries
+import array
+import bisect
+import collections
+import csv
+import functools
+import heapq
+import itertools
+import multiprocessing
+import operator
 import os
-import random
+import sys
+import threading
+import bql_aggregate as ba
+import bql_index as bi
+import bql_lock as bl
+import bql_plan as bp
+import bql_sort as bso
+import bql_spill as bsp
+import bql_storage as bs
+import bql_wal as bw
 
 #####################################
 # Table:
-#   Node to store table contents.
+#   Node to store table contents. Records are stored by column: int
+#   attributes in arrays of 64-bit integers, float attributes as floats and
+#   every other attribute as strings. Empty values are stored as None. Table
+#   files are either text ("csv") or paged binary ("binary") files.
 #####################################
 class Table:
-    # Class variables
-    #tpath = ""
-    #metadata = []
-    #attributes = []
-    #content = []
-
     #####################################
     # Constructor
     #
@@ -28,20 +43,358 @@ class Table:
     #   @tname: Name of table to create instance of.
     #####################################
     def __init__(self, *args):
+        self.types = [] # Datatype of each attribute
+        self.names = [] # Name of each attribute
+        self.aliases = [] # Table alias of each attribute, if known
+        self.columns = [] # Values of each attribute
+        self.sharedColumns = set() # Positions of columns shared with another table, copied before they change
+        self.storage = "csv" # Format of table file
         if len(args) > 0:
             self.tpath = args[0]
             self.lpath = args[0] + "_"
+            # Binary tables are read through a memory map
+            if bs.isBinaryTable(self.tpath):
+                binaryTable = bs.BinaryTable(self.tpath)
+                self.storage = "binary"
+                self.types = binaryTable.types
+                self.names = binaryTable.names
+                self.columns = binaryTable.readColumns()
+                return
             with open(self.tpath, "r") as df:
-                df_lines = df.readlines()
-                self.metadata = df_lines[0]
-                self.attributes = df_lines[1]
-                self.content = [line.replace("\n","") for line in df_lines[2:]]
+                df_lines = df.read().split("\n")
+            if df_lines[-1] == "":
+                df_lines.pop()
+            self.types = df_lines[0].split(",")
+            self.names = df_lines[1].split(",")
+            self.loadColumns([line.split(",") for line in df_lines[2:]])
         else:
             self.tpath = ""
             self.lpath = ""
-            self.metadata = []
-            self.attributes = []
-            self.content = []
+
+    #####################################
+    # setSchema():
+    #   Set attributes of an empty table.
+    # args:
+    #   @types: List with datatype of each attribute.
+    #   @names: List with name of each attribute.
+    # return:
+    #   None.
+    #####################################
+    def setSchema(self, types, names):
+        self.types = list(types)
+        self.names = list(names)
+        self.columns = [self.makeColumn(colnum, []) for colnum in range(len(types))]
+
+    #####################################
+    # loadColumns():
+    #   Convert records split into text values into typed columns.
+    # args:
+    #   @records: List with records as lists of strings.
+    # return:
+    #   None.
+    #####################################
+    def loadColumns(self, records):
+        # Variables
+        width = len(self.types)
+
+        # Pad or cut records that do not match the table attributes
+        for pos in range(len(records)):
+            if len(records[pos]) != width:
+                records[pos] = (records[pos] + [""] * width)[:width]
+
+        # Transpose records into columns
+        if records:
+            textColumns = list(zip(*records))
+        else:
+            textColumns = [() for colnum in range(width)]
+        self.columns = []
+        for colnum in range(width):
+            dtype = self.types[colnum]
+            try: # Fast path for fully valid numeric columns
+                if dtype == "int":
+                    self.columns.append(array.array("q", map(int, textColumns[colnum])))
+                    continue
+                elif dtype == "float":
+                    self.columns.append(list(map(float, textColumns[colnum])))
+                    continue
+            except (ValueError, OverflowError):
+                pass
+            values = [self.parseValue(colnum, text) for text in textColumns[colnum]]
+            self.columns.append(self.makeColumn(colnum, values))
+
+    #####################################
+    # parseValue():
+    #   Convert text into the datatype of an attribute.
+    # args:
+    #   @colnum: Position of attribute.
+    #   @text: String with value.
+    # return:
+    #   None if text is empty, typed value if text matches attribute datatype, text otherwise.
+    #####################################
+    def parseValue(self, colnum, text):
+        if text == "":
+            return None
+        try:
+            if self.types[colnum] == "int":
+                return int(text)
+        except ValueError:
+            pass
+        try:
+            if self.isNumeric(colnum):
+                return float(text)
+        except ValueError:
+            pass
+        return text
+
+    #####################################
+    # isNumeric():
+    #   Test whether an attribute is stored as numbers.
+    # args:
+    #   @colnum: Position of attribute.
+    # return:
+    #   True: If attribute datatype is int or float.
+    #   False: Otherwise.
+    #####################################
+    def isNumeric(self, colnum):
+        return self.types[colnum] == "int" or self.types[colnum] == "float"
+
+    #####################################
+    # formatValue():
+    #   Convert a stored value back into text.
+    # args:
+    #   @value: Stored value.
+    # return:
+    #   String with value.
+    #####################################
+    def formatValue(self, value):
+        if value is None:
+            return ""
+        return str(value)
+
+    #####################################
+    # makeColumn():
+    #   Build the storage for the values of an attribute.
+    # args:
+    #   @colnum: Position of attribute.
+    #   @values: List with typed values.
+    # return:
+    #   Integer array for int attributes without empty values, list otherwise.
+    #####################################
+    def makeColumn(self, colnum, values):
+        if self.types[colnum] == "int":
+            try:
+                return array.array("q", values)
+            except (TypeError, OverflowError):
+                pass
+        return list(values)
+
+    #####################################
+    # numRecords():
+    #   Get number of records in table.
+    # args:
+    #   None.
+    # return:
+    #   Integer with number of records.
+    #####################################
+    def numRecords(self):
+        if not self.columns:
+            return 0
+        return len(self.columns[0])
+
+    #####################################
+    # records():
+    #   Iterate through records of table.
+    # args:
+    #   None.
+    # return:
+    #   Iterator with records as tuples of values.
+    #####################################
+    def records(self):
+        return zip(*self.columns)
+
+    #####################################
+    # formatRecord():
+    #   Convert a record into a line of the table file.
+    # args:
+    #   @record: Tuple with values of record.
+    # return:
+    #   String with comma-separated values.
+    #####################################
+    def formatRecord(self, record):
+        return ",".join([self.formatValue(value) for value in record])
+
+    #####################################
+    # setValue():
+    #   Replace the value of an attribute in a record.
+    # args:
+    #   @colnum: Position of attribute.
+    #   @pos: Position of record.
+    #   @value: New typed value.
+    # return:
+    #   None.
+    #####################################
+    def setValue(self, colnum, pos, value):
+        self.getColumnFor(colnum, value)[pos] = value
+
+    #####################################
+    # getColumnFor():
+    #   Get storage of an attribute able to hold a value, copying it if it is shared
+    #   and turning an integer array into a list if the value is not an integer.
+    # args:
+    #   @colnum: Position of attribute.
+    #   @value: Typed value to store.
+    # return:
+    #   Storage of attribute.
+    #####################################
+    def getColumnFor(self, colnum, value):
+        column = self.columns[colnum]
+        if colnum in self.sharedColumns:
+            column = column[:]
+            self.columns[colnum] = column
+            self.sharedColumns.discard(colnum)
+        if isinstance(column, array.array) and not isinstance(value, int):
+            column = list(column)
+            self.columns[colnum] = column
+        return column
+
+    #####################################
+    # appendRecords():
+    #   Append records to the columns of the table.
+    # args:
+    #   @records: List with records as lists of strings.
+    # return:
+    #   None.
+    #####################################
+    def appendRecords(self, records):
+        for record in records:
+            for colnum in range(len(self.columns)):
+                value = self.parseValue(colnum, record[colnum]) if colnum < len(record) else None
+                self.getColumnFor(colnum, value).append(value)
+
+    #####################################
+    # copy():
+    #   Build a table with copies of the columns of this table, safe to modify.
+    # args:
+    #   None.
+    # return:
+    #   New Table.
+    #####################################
+    def copy(self):
+        newTable = Table()
+        newTable.tpath = self.tpath
+        newTable.lpath = self.lpath
+        newTable.storage = self.storage
+        newTable.types = list(self.types)
+        newTable.names = list(self.names)
+        newTable.columns = [column[:] for column in self.columns]
+        return newTable
+
+    #####################################
+    # shareColumns():
+    #   Build a table sharing the columns of this table, each copied the first
+    #   time it changes.
+    # args:
+    #   None.
+    # return:
+    #   New Table.
+    #####################################
+    def shareColumns(self):
+        newTable = Table()
+        newTable.tpath = self.tpath
+        newTable.lpath = self.lpath
+        newTable.storage = self.storage
+        newTable.types = list(self.types)
+        newTable.names = list(self.names)
+        newTable.columns = list(self.columns)
+        newTable.sharedColumns = set(range(len(self.columns)))
+        return newTable
+
+    #####################################
+    # memorySize():
+    #   Estimate bytes of memory used by the table records.
+    # args:
+    #   None.
+    # return:
+    #   Integer with number of bytes.
+    #####################################
+    def memorySize(self):
+        size = 0
+        for column in self.columns:
+            if isinstance(column, array.array):
+                size += column.itemsize * len(column)
+            else:
+                size += sys.getsizeof(column) + sum(map(sys.getsizeof, column))
+        return size
+
+    #####################################
+    # getAliases():
+    #   Get table alias of each attribute.
+    # args:
+    #   None.
+    # return:
+    #   List with alias of each attribute, empty strings if unknown.
+    #####################################
+    def getAliases(self):
+        if len(self.aliases) != len(self.names):
+            return [""] * len(self.names)
+        return self.aliases
+
+    #####################################
+    # findAttr():
+    #   Get position of an attribute given as "name" or "alias.name".
+    # args:
+    #   @token: String with attribute reference.
+    # return:
+    #   -1: If not found.
+    #   Position of first matching attribute otherwise.
+    #####################################
+    def findAttr(self, token):
+        alias, dot, name = token.rpartition(".")
+        aliases = self.getAliases()
+        for colnum in range(len(self.names)):
+            if self.names[colnum] == name and (not dot or aliases[colnum] == alias):
+                return colnum
+        return -1
+
+    #####################################
+    # view():
+    #   Build a table with some attributes of this table, sharing their columns.
+    # args:
+    #   @colnums: List with positions of attributes to keep.
+    #   @alias: String with table alias of attributes (default = "").
+    # return:
+    #   New Table.
+    #####################################
+    def view(self, colnums, alias = ""):
+        newTable = Table()
+        newTable.tpath = self.tpath
+        newTable.lpath = self.lpath
+        newTable.storage = self.storage
+        newTable.types = [self.types[colnum] for colnum in colnums]
+        newTable.names = [self.names[colnum] for colnum in colnums]
+        newTable.aliases = [alias] * len(colnums)
+        newTable.columns = [self.columns[colnum] for colnum in colnums]
+        return newTable
+
+    #####################################
+    # selectRecords():
+    #   Build a table with some records of this table.
+    # args:
+    #   @positions: List with positions of records to keep, in wanted order.
+    # return:
+    #   New Table.
+    #####################################
+    def selectRecords(self, positions):
+        newTable = Table()
+        newTable.tpath = self.tpath
+        newTable.lpath = self.lpath
+        newTable.storage = self.storage
+        newTable.types = self.types
+        newTable.names = self.names
+        newTable.aliases = self.aliases
+        for colnum, column in enumerate(self.columns):
+            newTable.columns.append(self.makeColumn(colnum, [column[pos] for pos in positions]))
+        return newTable
 
     #####################################
     # addAttributes:
@@ -53,53 +406,73 @@ class Table:
     #   None.
     #####################################
     def addAttribute(self, attr_name, attr_type):
-        self.metadata = self.metadata.replace("\n", "") + "," + attr_type + "\n"
-        self.attributes = self.attributes.replace("\n", "") + "," + attr_name + "\n"
+        self.types.append(attr_type)
+        self.names.append(attr_name)
+        self.columns.append([None] * self.numRecords())
 
     #####################################
-    # saveContent:
-    #   Save table content in disk.
+    # writeTable():
+    #   Write table header and content into a file.
     # args:
-    #   None.
+    #   @path: String with path to file.
     # return:
     #   None.
     #####################################
-    def saveContent(self):
-        with open(self.tpath, "w") as df:
-            df.write(self.metadata)
-            df.write(self.attributes)
-            for line in self.content:
-                line = line + "\n"
-                df.write(line)
+    def writeTable(self, path):
+        if self.storage == "binary":
+            bs.writeBinaryTable(path, self.types, self.names, self.columns)
+            return
+        with open(path, "w") as df:
+            df.write(",".join(self.types) + "\n")
+            df.write(",".join(self.names) + "\n")
+            for record in self.records():
+                df.write(self.formatRecord(record) + "\n")
 
     #####################################
-    # tempToOG():
-    #   Save contents within intermediate table to original table.
+    # saveContent:
+    #   Save table content in disk.
     # args:
-    #   NA.
+    #   None.
     # return:
-    #   NA.
+    #   None.
     #####################################
-    def tempToOG(self):
-        with open(self.tpath, "w") as df:
-            with open(self.lpath, "r") as df2:
-                for line in df2.readlines():
-                    df.write(line)
+    def saveContent(self):
+        self.writeTable(self.tpath)
 
     #####################################
     # saveTemp():
-    #   Save table content in disk in a temporary table.
+    #   Save table content in disk in a temporary table, forced to disk.
     # args:
     #   None.
     # return:
     #   None.
     #####################################
     def saveTemp(self):
-        with open(self.lpath, "w") as df:
-            df.write(self.metadata)
-            df.write(self.attributes)
-            for line in self.content:
-                df.write(line + "\n")
+        self.writeTable(self.lpath)
+        with open(self.lpath, "rb") as df:
+            os.fsync(df.fileno())
+
+    #####################################
+    # applyChanges():
+    #   Apply changes read from a write-ahead log to the table.
+    # args:
+    #   @changes: List with changes of the table, in commit order.
+    # return:
+    #   Table with changes applied.
+    #####################################
+    def applyChanges(self, changes):
+        table = self
+        for change in changes:
+            if change[0] == "update":
+                colnum, value, positions = change[2:]
+                for pos in positions:
+                    table.setValue(colnum, pos, value)
+            elif change[0] == "delete":
+                deletedPositions = set(change[2])
+                table = table.selectRecords([pos for pos in range(table.numRecords()) if pos not in deletedPositions])
+            elif change[0] == "insert":
+                table.appendRecords(change[2])
+        return table
 
 #####################################
 # TableHandler:
@@ -109,7 +482,38 @@ class TableHandler:
     # Class variables
     valid_datatypes = ["int", "varchar"]
     db_in_use = './'
-    lockKey = random.randint(0, 1000)
+    lockManager = bl.LockManager() # Locks of current user
+    lockKey = lockManager.sessionId # Unique id of current user
+    schemaCache = {} # Table path-((mtime, size), (datatypes, attributes)) pairs
+    indexCache = {} # Index path-(index file mtime, Index) pairs
+    indexPathCache = {} # Table path-(database mtime, index paths) pairs
+    tableCache = collections.OrderedDict() # Table path-[(mtime, size), Table, memory size] pairs, least recently used first
+    cacheBudget = 256 * 1024 * 1024 # Bytes of memory the table cache may use
+    streamThreshold = 16 * 1024 * 1024 # Bytes of uncached table files above which single table selects are streamed
+    scanWorkers = os.cpu_count() or 1 # Number of worker processes of parallel scans and joins, 1 to always run serially
+    parallelThreshold = 16 * 1024 * 1024 # Bytes of text table files above which scans are split across workers
+    joinMemoryBudget = 256 * 1024 * 1024 # Bytes of memory the records of an equality join of two tables may use before they are partitioned on disk
+    joinFanout = 16 # Most partition files records of an equality join are split into at once
+    sortMemoryBudget = 256 * 1024 * 1024 # Bytes of memory sorted records may use before runs are spilled to disk
+    parallelJoinRows = None # Estimated number of joined records above which equality joins are split across workers, None to always join serially
+    outputChunk = 4096 # Number of result records written to output at once
+    joinChunk = 4096 # Number of first table records flowing through joins at once
+    loadChunk = 65536 # Number of loaded records validated and appended at once
+    loadErrorLimit = 10 # Number of rejected lines reported by a load
+    writeLog = None # Write-ahead log of database in use
+    pendingTables = {} # Table path-Table pairs with uncommitted changes of current user
+    pendingChanges = [] # Uncommitted changes of current user, written to the log at commit
+    committedTables = {} # Table path-((mtime, size), Table) pairs applied by the checkpointer
+    checkpointThread = None # Thread applying committed changes to table files
+    checkpointTables = set() # Names of tables whose locks are released by the checkpointer
+    reversedOps = {"=": operator.eq,
+            "!=": operator.ne,
+            "<": operator.gt,
+            ">": operator.lt} # Operator-function pairs, taking the constant first
+    flippedOps = {"=": "=",
+            "!=": "!=",
+            "<": ">",
+            ">": "<"} # Operator-operator pairs with swapped operands
     
     #####################################
     # useCommand():
@@ -122,32 +526,42 @@ class TableHandler:
     def useCommand(self, db_name):
         if os.path.isdir(db_name):
             self.db_in_use = self.db_in_use + db_name + "/"
+            # Apply changes committed before the last exit
+            self.writeLog = bw.WriteAheadLog(self.db_in_use)
+            if not self.writeLog.isEmpty():
+                self.checkpointLog()
             print("Using database " + db_name + ".")
             return 1
         else:
             print("!Failed to use database " + db_name + " because it does not exist.")
             return 0
 
+    #####################################
+    # getLockPath():
+    #   Get path of a lock file of a table in current database.
+    # args:
+    #   @tname: String with name of table.
+    #   @kind: Either "table", held by transactions changing the table, or
+    #          "data", held while the table file is read or appended (default = "table").
+    # return:
+    #   String with path to lock file.
+    #####################################
+    def getLockPath(self, tname, kind = "table"):
+        return self.db_in_use + "_locks/" + tname + "." + kind
+
     #####################################
     # lockTable():
     #   Add lock to a table in current database.
     # args:
     #   tname: String with name of table.
     # return:
-    #   NA.
+    #   1: If table was locked for current user.
+    #   0: If table is locked by another user.
     #####################################
     def lockTable(self, tname):
-        # Variables
-        databaseLockFName = self.db_in_use + "_locks.tmp"
-        writeMode = "a"
-
-        # Test if lock file exists
-        if not os.path.isfile(databaseLockFName):
-            writeMode = "w"
-
-        # Open file with locks
-        with open(databaseLockFName, writeMode) as df:
-            df.write(str(self.lockKey) + "," + tname + "\n")
+        if self.lockManager.acquire(self.getLockPath(tname), True):
+            return 1
+        return 0
 
     #####################################
     # isTableLocked():
@@ -155,543 +569,2563 @@ class TableHandler:
     # args:
     #   tname: String with name to table.
     # return:
-    #   1: If table is locked.
-    #   0: otherwise.
+    #   True: If table is locked by another user.
+    #   None: If table is locked by current user.
+    #   False: otherwise.
     #####################################
     def isTableLocked(self, tname):
+        lpath = self.getLockPath(tname)
+        if self.lockManager.isHeld(lpath):
+            return None
+        return self.lockManager.isHeldByOther(lpath)
+
+    #####################################
+    # removeLock():
+    #   Removes locks of current user from all tables.
+    # args:
+    #   NA.
+    # return:
+    #   True: If a lock was removed.
+    #   False: Otherwise.
+    #####################################
+    def removeLock(self):
+        lockFound = False
+        for lpath in self.lockManager.heldPaths():
+            lockFound = self.lockManager.release(lpath) or lockFound
+        return lockFound
+
+    #####################################
+    # getLockedFiles():
+    #   Get names of tables locked by current user in current database.
+    # args:
+    #   NA.
+    # return:
+    #   List with strings of names of tables.
+    #####################################
+    def getLockedFiles(self):
+        # Variables
+        prefix = self.db_in_use + "_locks/"
+        suffix = ".table"
+        lockedFiles = []
+
+        # Keep table locks of current database
+        for lpath in self.lockManager.heldPaths():
+            if lpath.startswith(prefix) and lpath.endswith(suffix):
+                lockedFiles.append(lpath[len(prefix):-len(suffix)])
+
+        return lockedFiles
+
+    #####################################
+    # transationCommand():
+    #   Start transaction for current user.
+    # args:
+    #   NA.
+    # return:
+    #   NA.
+    #####################################
+    def transactionCommand(self):
+        print("Transaction starts.")
+
+    #####################################
+    # commitCommand():
+    #   Make changes of current user durable in the write-ahead log, and apply
+    #   them to the original tables in the background.
+    # args:
+    #   NA.
+    # return:
+    #   NA.
+    #####################################
+    def commitCommand(self):
+        # Wait for checkpointer of previous commit, which still holds its tables
+        self.syncLog()
+
+        # Take uncommitted changes
+        lockedFiles = self.getLockedFiles()
+        tables = dict(self.pendingTables)
+        changes = list(self.pendingChanges)
+        self.pendingTables.clear()
+        del self.pendingChanges[:]
+
+        # No locks means there is nothing to commit
+        if not lockedFiles:
+            print("Transaction abort.")
+            return
+
+        # Write changes and commit record with a single sync
+        if changes:
+            df = self.writeLog.lock()
+            try:
+                self.writeLog.commit(df, str(self.lockKey), changes)
+            finally:
+                self.writeLog.unlock(df)
+
+        # Apply changes to tables, keeping locks until they are applied
+        self.committedTables = {}
+        self.checkpointTables = set(lockedFiles)
+        lockPaths = [self.getLockPath(tname) for tname in lockedFiles]
+        self.checkpointThread = threading.Thread(target = self.checkpointLog, args = (tables, lockPaths))
+        self.checkpointThread.start()
+        print("Transaction commited.")
+
+    #####################################
+    # checkpointLog():
+    #   Apply committed changes in the write-ahead log to the original tables and
+    #   empty the log. Changed tables are written to their temporary tables first,
+    #   then moved over the originals, so applying the log again after a crash
+    #   never applies a change twice. Binary tables only updated or inserted into
+    #   get a patch with their changed pages instead, copied in place. Text tables
+    #   and binary tables with deleted records are rewritten whole.
+    # args:
+    #   @tables: Table path-Table pairs with changes already applied (default = none).
+    #   @lockPaths: List with paths to locks of current user released afterwards (default = none).
+    # return:
+    #   None.
+    #####################################
+    def checkpointLog(self, tables = None, lockPaths = None):
+        tables = tables or {}
+        df = self.writeLog.lock()
+        try:
+            # Group committed changes by table
+            changes, checkpointed = self.writeLog.readCommitted(df)
+            tableChanges = collections.OrderedDict()
+            for change in changes:
+                tableChanges.setdefault(self.db_in_use + change[1] + ".bql", []).append(change)
+
+            # Write changed tables, or only their changed pages, into temporary tables
+            if not checkpointed:
+                for tpath in tableChanges:
+                    if not os.path.isfile(tpath):
+                        continue
+                    pages = self.getChangedPages(tpath, tableChanges[tpath])
+                    if pages is not None:
+                        bs.writePatch(tpath + "_", pages)
+                        continue
+                    table = tables.get(tpath)
+                    if table is None:
+                        table = Table(tpath).applyChanges(tableChanges[tpath])
+                    table.saveTemp()
+                if tableChanges:
+                    self.writeLog.markCheckpoint(df)
+
+            # Copy changed pages into original tables or replace them, then empty the log
+            for tpath in tableChanges:
+                if bs.isPatch(tpath + "_"):
+                    dpath = self.getLockPath(tableChanges[tpath][0][1], "data")
+                    self.lockManager.acquire(dpath, True, True)
+                    try:
+                        bs.applyPatch(tpath, tpath + "_")
+                    finally:
+                        self.lockManager.release(dpath)
+                    os.remove(tpath + "_")
+                elif os.path.isfile(tpath + "_"):
+                    os.replace(tpath + "_", tpath)
+                else:
+                    continue
+                if tpath in tables:
+                    stat = os.stat(tpath)
+                    self.committedTables[tpath] = ((stat.st_mtime_ns, stat.st_size), tables[tpath])
+            if tableChanges:
+                self.writeLog.syncDirectory()
+            self.writeLog.clear(df)
+        finally:
+            self.writeLog.unlock(df)
+
+        # Remove lock from committed tables, keeping locks taken since
+        for lpath in lockPaths or []:
+            self.lockManager.release(lpath)
+
+    #####################################
+    # getChangedPages():
+    #   Build the pages of a binary table changed by committed updates and inserts.
+    # args:
+    #   @tpath: String with path to table.
+    #   @changes: List with changes of the table, in commit order.
+    # return:
+    #   Dictionary with page number-bytes of page pairs, or None if the table is
+    #   not binary, records were deleted or an updated page no longer fits.
+    #####################################
+    def getChangedPages(self, tpath, changes):
+        # Only updates and inserts leave records in place
+        if not bs.isBinaryTable(tpath) or any([change[0] == "delete" for change in changes]):
+            return None
+
+        # Variables
+        binaryTable = bs.BinaryTable(tpath)
+        schema = Table()
+        schema.setSchema(binaryTable.types, binaryTable.names)
+        updates = [change[2:] for change in changes if change[0] == "update"]
+        records = [[schema.parseValue(colnum, text) for colnum, text in enumerate(record)] for change in changes if change[0] == "insert" for record in change[2]]
+
+        return binaryTable.changePages(updates, records)
+
+    #####################################
+    # syncLog():
+    #   Wait until committed changes are applied to the original tables a command
+    #   touches. Commands on other tables run while the changes are applied.
+    # args:
+    #   @tnames: List with names of tables touched by command (default = all tables).
+    # return:
+    #   None.
+    #####################################
+    def syncLog(self, tnames = None):
         # Variables
-        databaseLockFName = self.db_in_use + "_locks.tmp"
+        loggedTables = set() # Tables with committed changes not applied yet
+        if tnames is not None:
+            tnames = set(tnames)
+            if self.writeLog is not None:
+                loggedTables = self.writeLog.readTables()
+
+        # Wait for checkpointer of current user
+        thread = self.checkpointThread
+        if thread is not None and (tnames is None or not thread.is_alive() or tnames & (loggedTables | self.checkpointTables)):
+            self.checkpointThread.join()
+            self.checkpointThread = None
+            for tpath, (version, table) in self.committedTables.items():
+                self.cacheTable(tpath, table, version)
+                self.rebuildIndexes(tpath)
+            self.committedTables = {}
+
+        # Apply changes committed by other users
+        if self.writeLog is not None and not self.writeLog.isEmpty() and (tnames is None or tnames & loggedTables):
+            self.checkpointLog()
 
-        # Test if lock file exists
-        if not os.path.isfile(databaseLockFName):
+    #####################################
+    # getSchema():
+    #   Get datatypes and attribute names of a table, reading its header again only
+    #   after its file changed, possibly through another user.
+    # args:
+    #   @tpath: String with path to table.
+    # return:
+    #   Tuple with list of datatypes and list of attribute names.
+    #####################################
+    def getSchema(self, tpath):
+        # Variables
+        cached = self.schemaCache.get(tpath)
+        try:
+            stat = os.stat(tpath)
+        except OSError: # Tables dropped by another user keep their last schema
+            if cached is None:
+                raise
+            return cached[1]
+        version = (stat.st_mtime_ns, stat.st_size)
+
+        # Read header if file changed since it was cached
+        if cached is None or cached[0] != version:
+            if bs.isBinaryTable(tpath):
+                binaryTable = bs.BinaryTable(tpath)
+                types = binaryTable.types
+                names = binaryTable.names
+            else:
+                with open(tpath, "r") as df:
+                    types = df.readline().strip().split(",")
+                    names = df.readline().strip().split(",")
+            cached = (version, (types, names))
+            self.schemaCache[tpath] = cached
+        return cached[1]
+
+    #####################################
+    # forgetSchema():
+    #   Remove a table from the schema cache after its header changes.
+    # args:
+    #   @tpath: String with path to table.
+    # return:
+    #   None.
+    #####################################
+    def forgetSchema(self, tpath):
+        self.schemaCache.pop(tpath, None)
+
+    #####################################
+    # isValidRecord():
+    #   Test whether a record matches the datatypes of a table.
+    # args:
+    #   @types: List with datatypes of table.
+    #   @values: List with values of record.
+    # return:
+    #   True: If record has one valid value per datatype.
+    #   False: Otherwise.
+    #####################################
+    def isValidRecord(self, types, values):
+        if len(values) != len(types):
             return False
+        for dtype, value in zip(types, values):
+            if "," in value: # Quoted strings may hold commas, which separate values in table files
+                return False
+            try:
+                if dtype == "int":
+                    int(value)
+                elif dtype == "float":
+                    float(value)
+            except ValueError:
+                return False
+        return True
 
-        # Open file with locks
-        with open(databaseLockFName, "r") as df:
-            # Search for table name in lock file
-            for line in df.readlines():
-                line_split = line.strip().split(",", 1)
-                if line_split[1] == tname and self.lockKey != int(line_split[0]):
-                    return True
-                elif line_split[1] == tname:
-                    return None
+    #####################################
+    # appendRecords():
+    #   Append records to the end of a table without rewriting it, and add them
+    #   to the indexes of the table.
+    # args:
+    #   @tpath: String with path to table.
+    #   @records: List with records as lists of values.
+    # return:
+    #   None.
+    #####################################
+    def appendRecords(self, tpath, records):
+        # Load indexes before the table changes
+        indexes = [self.getIndex(tpath, ipath) for ipath in self.getIndexPaths(tpath)]
+
+        # Test whether cached table is up-to-date
+        cached = self.tableCache.get(tpath)
+        if cached is not None:
+            stat = os.stat(tpath)
+            if cached[0] != (stat.st_mtime_ns, stat.st_size):
+                self.forgetTable(tpath)
+                cached = None
+
+        # Append records, keeping their locations
+        if bs.isBinaryTable(tpath):
+            schema = Table()
+            schema.setSchema(*self.getSchema(tpath))
+            typedRecords = [[schema.parseValue(colnum, record[colnum]) for colnum in range(len(record))] for record in records]
+            offsets = bs.BinaryTable(tpath).appendRecords(typedRecords)
+        else:
+            lines = [(",".join(record) + "\n").encode() for record in records]
+            offsets = []
+            with open(tpath, "ab") as df:
+                offset = df.tell()
+                for line in lines:
+                    offsets.append(offset)
+                    offset += len(line)
+                df.write(b"".join(lines))
+
+        # Append records to cached table
+        if cached is not None:
+            stat = os.stat(tpath)
+            cached[1].appendRecords(records)
+            cached[0] = (stat.st_mtime_ns, stat.st_size)
+            cached[2] += sum([sys.getsizeof(value) + 8 for record in records for value in record])
+
+        # Add records to indexes
+        for index in indexes:
+            index.addEntries([(index.parse(record[index.colnum]), offset) for record, offset in zip(records, offsets)])
+            self.indexCache[index.ipath] = (os.stat(index.ipath).st_mtime_ns, index)
 
-        return False
+    #####################################
+    # readTable():
+    #   Get a table of current database while no other user appends to it.
+    # args:
+    #   @tname: String with name of table.
+    # return:
+    #   Table object, shared through the table cache.
+    #####################################
+    def readTable(self, tname):
+        dpath = self.getLockPath(tname, "data")
+        self.lockManager.acquire(dpath, False, True)
+        try:
+            return self.getTable(self.db_in_use + tname + ".bql")
+        finally:
+            self.lockManager.release(dpath)
+
+    #####################################
+    # getTable():
+    #   Get a table from the table cache, reading it only if its file changed since it
+    #   was cached. Cached tables are shared and must be copied before being modified.
+    # args:
+    #   @tpath: String with path to table.
+    # return:
+    #   Table object.
+    #####################################
+    def getTable(self, tpath):
+        # Variables
+        stat = os.stat(tpath)
+        version = (stat.st_mtime_ns, stat.st_size)
+        cached = self.tableCache.get(tpath)
+
+        # Use cached table if file is unchanged
+        if cached is not None and cached[0] == version:
+            self.tableCache.move_to_end(tpath)
+            return cached[1]
+
+        # Read table and cache it
+        if self.isParallel(tpath):
+            table = self.parallelLoad(tpath)[0]
+        else:
+            table = Table(tpath)
+        self.cacheTable(tpath, table, version)
+        return table
+
+    #####################################
+    # isCached():
+    #   Test whether the table cache holds the current contents of a table file.
+    # args:
+    #   @tpath: String with path to table.
+    # return:
+    #   True: If table is cached and its file is unchanged.
+    #   False: Otherwise.
+    #####################################
+    def isCached(self, tpath):
+        stat = os.stat(tpath)
+        cached = self.tableCache.get(tpath)
+        return cached is not None and cached[0] == (stat.st_mtime_ns, stat.st_size)
+
+    #####################################
+    # isParallel():
+    #   Test whether a table file should be scanned by worker processes.
+    # args:
+    #   @tpath: String with path to table.
+    # return:
+    #   True: If there are several workers and table is a text file over the parallel threshold.
+    #   False: Otherwise.
+    #####################################
+    def isParallel(self, tpath):
+        if self.scanWorkers < 2 or bs.isBinaryTable(tpath):
+            return False
+        return os.path.getsize(tpath) >= self.parallelThreshold
+
+    #####################################
+    # parallelScan():
+    #   Scan a text table file split into newline-aligned byte ranges, each range
+    #   read and filtered by a worker process.
+    # args:
+    #   @tpath: String with path to table.
+    #   @conds: List with (attribute position, operator, constant) tuples.
+    #   @colnums: List with positions of attributes of passing records to get,
+    #             or None to get typed columns of every record (default = None).
+    # return:
+    #   Generator with results of scanRange(), in file order.
+    #####################################
+    def parallelScan(self, tpath, conds, colnums = None):
+        # Variables
+        types, names = self.getSchema(tpath)
+        tasks = [(tpath, start, end, types, names, conds, colnums) for start, end in splitRanges(tpath, self.scanWorkers * 4)]
+        if not tasks:
+            return
+
+        # Ranges are handed out as workers free up, results come back in order
+        with multiprocessing.Pool(min(self.scanWorkers, len(tasks))) as pool:
+            for result in pool.imap(scanRange, tasks):
+                yield result
+
+    #####################################
+    # parallelLoad():
+    #   Read a text table file with worker processes, finding records passing
+    #   conditions along the way.
+    # args:
+    #   @tpath: String with path to table.
+    #   @conds: List with (attribute position, operator, constant) tuples (default = none).
+    # return:
+    #   Tuple with Table object and list with positions of passing records.
+    #####################################
+    def parallelLoad(self, tpath, conds = None):
+        # Variables
+        table = Table()
+        table.tpath = tpath
+        table.lpath = tpath + "_"
+        table.setSchema(*self.getSchema(tpath))
+        parts = [[] for colnum in range(len(table.names))] # Columns of each range
+        positions = []
+        offset = 0
+
+        # Gather ranges, turning positions within ranges into table positions
+        for count, found, columns in self.parallelScan(tpath, conds or []):
+            positions.extend([offset + pos for pos in found])
+            offset += count
+            for colnum, column in enumerate(columns):
+                parts[colnum].append(column)
+
+        # Join columns of ranges
+        for colnum, columns in enumerate(parts):
+            if columns and all([isinstance(column, array.array) for column in columns]):
+                table.columns[colnum] = array.array("q")
+                for column in columns:
+                    table.columns[colnum].extend(column)
+            elif columns:
+                table.columns[colnum] = table.makeColumn(colnum, list(itertools.chain.from_iterable(columns)))
+
+        return table, positions
+
+    #####################################
+    # findRecords():
+    #   Get a table of current database and the positions of records passing a
+    #   condition. Large tables that are not in memory are read and tested by
+    #   worker processes.
+    # args:
+    #   @tname: String with name of table.
+    #   @attrName: Name of attribute on the left side of the operator.
+    #   @condOp: Operator of condition.
+    #   @text: String with constant on the right side of the operator.
+    # return:
+    #   Tuple with Table object, shared unless pending, and list with positions of passing records.
+    #   (Table, None) if attribute does not exist.
+    #####################################
+    def findRecords(self, tname, attrName, condOp, text):
+        # Variables
+        tpath = self.db_in_use + tname + ".bql"
+        table = self.pendingTables.get(tpath)
+
+        # Read and test large tables in parallel
+        if table is None and self.isParallel(tpath) and not self.isCached(tpath):
+            colnum = self.getAttrPos(self.getSchema(tpath)[1], attrName)
+            if colnum == -1:
+                return self.readTable(tname), None
+            dpath = self.getLockPath(tname, "data")
+            self.lockManager.acquire(dpath, False, True)
+            try:
+                stat = os.stat(tpath)
+                table, positions = self.parallelLoad(tpath, [(colnum, condOp, text)])
+                self.cacheTable(tpath, table, (stat.st_mtime_ns, stat.st_size))
+            finally:
+                self.lockManager.release(dpath)
+            return table, positions
+
+        # Test tables in memory
+        if table is None:
+            table = self.readTable(tname)
+        testColnum, test = self.compileCondition(table, attrName, condOp, text)
+        if testColnum == -1:
+            return table, None
+        return table, self.filterPositions(table.columns[testColnum], test)
+
+    #####################################
+    # cacheTable():
+    #   Store a table in the table cache, evicting least recently used tables over budget.
+    # args:
+    #   @tpath: String with path to table.
+    #   @table: Table object with the current contents of the table file.
+    #   @version: Tuple with file mtime and size of contents (default = current file).
+    # return:
+    #   None.
+    #####################################
+    def cacheTable(self, tpath, table, version = None):
+        # Variables
+        self.forgetTable(tpath)
+        size = table.memorySize()
+        if version is None:
+            stat = os.stat(tpath)
+            version = (stat.st_mtime_ns, stat.st_size)
+
+        # Tables over budget are not cached
+        if size > self.cacheBudget:
+            return
+
+        # Cache table and evict least recently used tables
+        self.tableCache[tpath] = [version, table, size]
+        used = sum([entry[2] for entry in self.tableCache.values()])
+        while used > self.cacheBudget:
+            used -= self.tableCache.popitem(last = False)[1][2]
+
+    #####################################
+    # forgetTable():
+    #   Remove a table from the table cache.
+    # args:
+    #   @tpath: String with path to table.
+    # return:
+    #   None.
+    #####################################
+    def forgetTable(self, tpath):
+        self.tableCache.pop(tpath, None)
+
+    #####################################
+    # getIndexPaths():
+    #   Get paths of index files of a table, listing the database folder only when it changed.
+    # args:
+    #   @tpath: String with path to table.
+    # return:
+    #   List with paths to index files.
+    #####################################
+    def getIndexPaths(self, tpath):
+        dbTime = os.stat(os.path.dirname(tpath) or ".").st_mtime_ns
+        cached = self.indexPathCache.get(tpath)
+        if cached is None or cached[0] != dbTime:
+            cached = (dbTime, bi.listIndexPaths(tpath))
+            self.indexPathCache[tpath] = cached
+        return cached[1]
+
+    #####################################
+    # getIndex():
+    #   Get an index of a table, rebuilding it if the table was rewritten after it.
+    # args:
+    #   @tpath: String with path to table.
+    #   @ipath: String with path to index file.
+    # return:
+    #   Index object.
+    #####################################
+    def getIndex(self, tpath, ipath):
+        # Test for cached up-to-date index
+        tableTime = os.stat(tpath).st_mtime_ns
+        indexTime = os.stat(ipath).st_mtime_ns
+        cached = self.indexCache.get(ipath)
+        if cached and cached[0] == indexTime and indexTime >= tableTime:
+            return cached[1]
+
+        # Find indexed attribute
+        with open(ipath, "r") as df:
+            attrName = df.readline().strip()
+        schema = Table()
+        schema.setSchema(*self.getSchema(tpath))
+        colnum = self.getAttrPos(schema.names, attrName)
+
+        # Load or rebuild index
+        index = bi.Index(ipath, colnum, functools.partial(schema.parseValue, colnum), schema.isNumeric(colnum))
+        if indexTime < tableTime:
+            index.build(attrName, self.scanIndexEntries(tpath, index))
+        else:
+            index.load()
+        self.indexCache[ipath] = (os.stat(ipath).st_mtime_ns, index)
+        return index
+
+    #####################################
+    # rebuildIndexes():
+    #   Rebuild all indexes of a table after the table file was rewritten.
+    # args:
+    #   @tpath: String with path to table.
+    # return:
+    #   None.
+    #####################################
+    def rebuildIndexes(self, tpath):
+        for ipath in self.getIndexPaths(tpath):
+            index = self.getIndex(tpath, ipath)
+            if index.colnum == -1: # Indexed attribute no longer exists
+                continue
+            index.build(index.attrName, self.scanIndexEntries(tpath, index))
+            self.indexCache[ipath] = (os.stat(ipath).st_mtime_ns, index)
+
+    #####################################
+    # scanIndexEntries():
+    #   Lazily read indexed attribute value and location of each record of a table.
+    # args:
+    #   @tpath: String with path to table.
+    #   @index: Index object.
+    # return:
+    #   Generator with tuples of typed value and record location.
+    #####################################
+    def scanIndexEntries(self, tpath, index):
+        # Binary tables locate records by position
+        if bs.isBinaryTable(tpath):
+            for pos, record in enumerate(bs.BinaryTable(tpath).scanRecords()):
+                yield record[index.colnum], pos
+            return
+
+        # Text tables locate records by byte offset, skipping table header
+        with open(tpath, "rb") as df:
+            df.readline()
+            df.readline()
+            offset = df.tell()
+            for line in df:
+                values = line.decode().rstrip("\n").split(",")
+                if index.colnum < len(values):
+                    yield index.parse(values[index.colnum]), offset
+                offset += len(line)
+
+    #####################################
+    # indexScan():
+    #   Select records of a table with an index on the condition attribute.
+    # args:
+    #   @tpath: String with path to table.
+    #   @condTokens: List with attribute name, operator and constant.
+    # return:
+    #   Table with records that may match condition, or None if no index can be used.
+    #####################################
+    def indexScan(self, tpath, condTokens):
+        # Test for indexable condition
+        if len(condTokens) != 3 or condTokens[1] not in ["=", "<", ">"]:
+            return None
+        attrName, condOp, text = condTokens[0], condTokens[1], condTokens[2].replace('"', "'")
+
+        # Find index on condition attribute
+        for ipath in self.getIndexPaths(tpath):
+            index = self.getIndex(tpath, ipath)
+            if index.attrName != attrName or index.colnum == -1:
+                continue
+            offsets = index.lookup(condOp, index.parse(text))
+            if offsets is None:
+                return None
+
+            # Read matching records only
+            table = Table()
+            table.tpath = tpath
+            table.lpath = tpath + "_"
+            table.setSchema(*self.getSchema(tpath))
+            if bs.isBinaryTable(tpath):
+                table.storage = "binary"
+                records = bs.BinaryTable(tpath).readRecordsAt(offsets)
+                table.columns = [table.makeColumn(colnum, [record[colnum] for record in records]) for colnum in range(len(table.names))]
+                return table
+            records = []
+            with open(tpath, "rb") as df:
+                for offset in offsets:
+                    df.seek(offset)
+                    records.append(df.readline().decode().rstrip("\n").split(","))
+            table.loadColumns(records)
+            return table
+
+        return None
+
+    #####################################
+    # createIndexCommand():
+    #   Attempts to create a sorted index on an attribute of a table.
+    # args:
+    #   @commStruct: Command-argument pair dictionary.
+    # return:
+    #   1: If index was successfully created.
+    #   0: If index failed to be created.
+    #####################################
+    def createIndexCommand(self, commStruct):
+        # Variables
+        iname = commStruct["create index"][0]
+        onTokens = commStruct.get("on", [])
+
+        # Test for table and attribute
+        if len(onTokens) < 2:
+            print("!Failed to create index " + iname + " because no table attribute was given.")
+            return 0
+        tname = onTokens[0]
+        attrName = onTokens[1]
+        tpath = self.db_in_use + tname + ".bql"
+        ipath = bi.getIndexPath(tpath, iname)
+        if not os.path.isfile(tpath):
+            print("!Failed to create index " + iname + " because table " + tname + " does not exist.")
+            return 0
+        if os.path.isfile(ipath):
+            print("!Failed to create index " + iname + " because it already exists.")
+            return 0
+        names = self.getSchema(tpath)[1]
+        if self.getAttrPos(names, attrName) == -1:
+            print("!Failed to create index " + iname + " because attribute " + attrName + " does not exist.")
+            return 0
+
+        # Build index file
+        with open(ipath, "w") as df:
+            df.write(attrName + "\n")
+        self.rebuildIndexes(tpath)
+        print("Index " + iname + " created.")
+        return 1
+
+    #####################################
+    # createTableCommand():
+    #   Attemps to create a table as a file in current database in use.
+    # args:
+    #   tokens: Array with tokens passed to create table command.
+    # return:
+    #   1: If table was successfully created.
+    #   0: If table failed to be created.
+    #####################################
+    def createTableCommand(self, tokens):
+        # Test if table already exists
+        table_name = tokens[0]
+        table_path = self.db_in_use + table_name + ".bql"
+        if os.path.isfile(table_path):
+            print("!Could not create table because table " + table_name + " already exists.")
+            return 0
+
+        # Variables
+        table_types = []
+        table_names = []
+        col_type = []
+        syntax_switch = False
+        storage = "csv"
+
+        # Test for table file format
+        if len(tokens) >= 3 and tokens[-2] == "format":
+            storage = tokens[-1]
+            tokens = tokens[:-2]
+            if storage not in ["csv", "binary"]:
+                print("!Could not create table because format " + storage + " is not valid.")
+                return 0
+
+        # Organize tokens into a list of attribute names and associated data type
+        for token in tokens[1:]:
+            if token in self.valid_datatypes:
+                col_type.append(token)
+                if token != "varchar":
+                    syntax_switch = False
+                    table_types.append(col_type[0])
+                    col_type = []
+            else:
+                if syntax_switch:
+                    col_type.append(token)
+                    table_types.append(" ".join(col_type))
+                    col_type = []
+                    syntax_switch = False
+                else:
+                    table_names.append(token)
+                    syntax_switch = True
+
+        # Create table
+        self.forgetSchema(table_path)
+        table = Table()
+        table.setSchema(table_types, table_names)
+        table.storage = storage
+        table.writeTable(table_path)
+
+        # Print success
+        print("Table " + table_name + " created.")
+
+    #####################################
+    # dropTableCommand():
+    #   Deletes a table with the current working database.
+    # args:
+    #   @tname: String with name of table to delete.
+    # return:
+    #   1: If table successfully deleted.
+    #   0: If table failed to delete.
+    #####################################
+    def dropTableCommand(self, tname):
+        # Test if file exists
+        table_path = self.db_in_use + tname + ".bql"
+        if not os.path.isfile(table_path):
+            print("!Failed to delete " + tname + " because it does not exist.")
+            return 0
+
+        # Uncommitted changes would bring the table back at commit
+        if table_path in self.pendingTables:
+            print("!Failed to delete " + tname + " because it has uncommitted changes.")
+            return 0
+
+        # Test whether table is locked by another user, locking it otherwise
+        locked = self.isTableLocked(tname)
+        if locked or (locked is False and not self.lockTable(tname)):
+            print("Error: Table " + tname + " is locked!")
+            return 0
+
+        try:
+            # Apply committed changes of other users before the file goes
+            self.syncLog([tname])
+            for ipath in bi.listIndexPaths(table_path):
+                os.remove(ipath)
+            os.remove(table_path)
+            self.forgetSchema(table_path)
+            self.forgetTable(table_path)
+        finally:
+            if locked is False:
+                self.lockManager.release(self.getLockPath(tname))
+        print("Table " + tname + " deleted.")
+        return 1
+
+    #####################################
+    # alterTable():
+    #   Alter the structure of a table.
+    # args:
+    #   tokens: List of tokens with words passed to alter table command.
+    # return:
+    #   1: If table is successfully altered.
+    #   0: If table fails to be altered.
+    #####################################
+    def alterTableCommand(self, tokens):
+        # Variables
+        tname = tokens[0]
+        alterOp = tokens[1]
+        tpath = self.db_in_use + tname + ".bql"
+        
+        # Test if file exists
+        if not os.path.isfile(tpath):
+            print("!Failed to alter " + tname + " because it does not exist.")
+            return 1
+
+        # Uncommitted changes would be written over the altered table at commit
+        if tpath in self.pendingTables:
+            print("!Failed to alter " + tname + " because it has uncommitted changes.")
+            return 0
+
+        # Test whether table is locked by another user, locking it otherwise
+        locked = self.isTableLocked(tname)
+        if locked or (locked is False and not self.lockTable(tname)):
+            print("Error: Table " + tname + " is locked!")
+            return 0
+
+        # Keep other users from reading the table while it is rewritten
+        dpath = self.getLockPath(tname, "data")
+        self.lockManager.acquire(dpath, True, True)
+        try:
+            # Convert table file format
+            table = self.getTable(tpath).copy()
+            if alterOp == "format":
+                if len(tokens) < 3 or tokens[2] not in ["csv", "binary"]:
+                    print("!Failed to alter " + tname + " because the format is not valid.")
+                    return 0
+                table.storage = tokens[2]
+            # Alter table
+            else:
+                add_name = tokens[2]
+                add_type = " ".join(tokens[3:])
+                table.addAttribute(add_name, add_type)
+
+            # Save modified table
+            try:
+                table.saveContent()
+            except ValueError as error:
+                self.forgetTable(tpath)
+                print("!Failed to alter " + tname + " because " + str(error) + ".")
+                return 0
+            self.cacheTable(tpath, table)
+            self.forgetSchema(tpath)
+            self.rebuildIndexes(tpath)
+        finally:
+            self.lockManager.release(dpath)
+            if locked is False:
+                self.lockManager.release(self.getLockPath(tname))
+        print("Table " + tname + " modified.")
+
+        return 1
+
+    #####################################
+    # getAttrPos():
+    #   Get position where attribute is positioned.
+    # args:
+    #   @attrs: List of attributes.
+    #   @attrName: Attribute to find.
+    # return:
+    #   -1: If not found.
+    #   Positive otherwise.
+    #####################################
+    def getAttrPos(self, attrs, attrName):
+        # Loop through attributes
+        for i in range(0, len(attrs)):
+            if attrs[i] == attrName:
+                return i
+
+        return -1
+
+    #####################################
+    # getAliasStruct():
+    #   Build dictionary with alias-name pairs.
+    # args:
+    #   @aliasTokens: List with strings in form of "name alias".
+    # return:
+    #   Dictionary with alias as key and name as value.
+    #####################################
+    def getAliasStruct(self, aliasTokens):
+        # Variables
+        aliasStruct = {}
+
+        # Loop through aliases
+        for alias in aliasTokens:
+            alias_split = alias.split(" ")
+            if len(alias_split) == 1: # No alias found
+                aliasStruct[alias] = alias
+            else: # Alias found
+                aliasStruct[alias_split[1]] = alias_split[0]
+
+        return aliasStruct
+
+    #####################################
+    # getTablesStruct():
+    #   Build dictionary with alias-table path pairs.
+    # args:
+    #   @aliasStruct: Alias-name pairs.
+    # return:
+    #   Dictionary with alias as key and table path as value.
+    #####################################
+    def getTablesStruct(self, aliasStruct):
+        # Variables
+        tablesStruct = {}
+
+        # Loop through aliases
+        for apair in aliasStruct.items():
+            tablesStruct[apair[0]] = self.db_in_use + apair[1] + ".bql"
+
+        return tablesStruct
+
+    #####################################
+    # compileTest():
+    #   Build a function testing values against a constant with a BQL boolean operation.
+    #   The operation is resolved once, and guards against empty values and values of
+    #   other datatypes are only added when the values may contain them.
+    # args:
+    #   @condOp: Operator to test values with.
+    #   @value: Typed constant on the right side of the operator.
+    #   @column: Values that will be tested (default = None).
+    # return:
+    #   Function taking a value and returning whether <value condOp constant> is true.
+    #####################################
+    def compileTest(self, condOp, value, column = None):
+        # Variables
+        compare = self.reversedOps.get(condOp)
+
+        # Unknown operators and empty constants never match
+        if compare is None or value is None:
+            return self.neverTest
+        test = functools.partial(compare, value)
+
+        # Equality tests and numbers compared to integer arrays need no guards
+        if condOp == "=" or (isinstance(column, array.array) and isinstance(value, (int, float))):
+            return test
+
+        # Guard against empty values and values of other datatypes
+        def guardedTest(operand):
+            try:
+                return operand is not None and test(operand)
+            except TypeError:
+                return False
+        return guardedTest
+
+    #####################################
+    # neverTest():
+    #   Test that is never true.
+    # args:
+    #   @operand: Value to test.
+    # return:
+    #   False.
+    #####################################
+    def neverTest(self, operand):
+        return False
+
+    #####################################
+    # compileCondition():
+    #   Build a test for a condition on an attribute of a table. The constant is
+    #   converted to the attribute datatype once.
+    # args:
+    #   @table: Table to test.
+    #   @attrName: Name of attribute on the left side of the operator.
+    #   @condOp: Operator of condition.
+    #   @text: String with constant on the right side of the operator.
+    # return:
+    #   Tuple with attribute position and test function.
+    #   (-1, None) if attribute does not exist.
+    #####################################
+    def compileCondition(self, table, attrName, condOp, text):
+        colnum = self.getAttrPos(table.names, attrName)
+        if colnum == -1:
+            return -1, None
+        value = table.parseValue(colnum, text)
+        return colnum, self.compileTest(condOp, value, table.columns[colnum])
+
+    #####################################
+    # filterPositions():
+    #   Get positions of values that pass a test.
+    # args:
+    #   @column: Values to test.
+    #   @test: Test function.
+    # return:
+    #   List with positions of passing values.
+    #####################################
+    def filterPositions(self, column, test):
+        return list(itertools.compress(range(len(column)), map(test, column)))
+
+    #####################################
+    # getJoinKeys():
+    #   Get comparable values of join attributes of two tables. Attributes of
+    #   different kinds are compared as text for '=' and '!=', and as numbers otherwise.
+    # args:
+    #   @table_1: First Table.
+    #   @attrPos_1: Position of join attribute in first table.
+    #   @table_2: Second Table.
+    #   @attrPos_2: Position of join attribute in second table.
+    #   @condOp: Comparison operation of join.
+    # return:
+    #   Tuple with list of keys of first table and list of keys of second table.
+    #####################################
+    def getJoinKeys(self, table_1, attrPos_1, table_2, attrPos_2, condOp):
+        # Variables
+        keys_1 = table_1.columns[attrPos_1]
+        keys_2 = table_2.columns[attrPos_2]
+        numeric_1 = table_1.isNumeric(attrPos_1)
+        numeric_2 = table_2.isNumeric(attrPos_2)
+
+        # Same kinds are compared directly
+        if numeric_1 == numeric_2:
+            return keys_1, keys_2
+
+        # Different kinds are converted
+        if condOp == "=" or condOp == "!=":
+            return [table_1.formatValue(key) for key in keys_1], [table_2.formatValue(key) for key in keys_2]
+        if numeric_1:
+            return keys_1, [self.toNumber(key) for key in keys_2]
+        return [self.toNumber(key) for key in keys_1], keys_2
+
+    #####################################
+    # toNumber():
+    #   Convert a value into a float.
+    # args:
+    #   @value: Value to convert.
+    # return:
+    #   Float, or None if value is not a number.
+    #####################################
+    def toNumber(self, value):
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+
+    #####################################
+    # nestedLoopJoinOp():
+    #   Compare every pair of join attribute values of two tables.
+    # args:
+    #   @keys_1: List with join attribute values of first table.
+    #   @keys_2: List with join attribute values of second table.
+    #   @condOp: Comparison operation to perform on both values.
+    #   @outer: Whether unmatched first table records are kept (default = False).
+    # return:
+    #   Tuple with list of first table positions and list of second table positions,
+    #   None for unmatched records.
+    #####################################
+    def nestedLoopJoinOp(self, keys_1, keys_2, condOp, outer = False):
+        # Variables
+        positions_1 = []
+        positions_2 = []
+
+        # Loop through all records in first table
+        for pos_1, key_1 in enumerate(keys_1):
+            # Test all records in second table against first table record
+            test = self.compileTest(self.flippedOps.get(condOp), key_1, keys_2)
+            matches = self.filterPositions(keys_2, test)
+            if matches:
+                positions_1.extend([pos_1] * len(matches))
+                positions_2.extend(matches)
+            # If no comparison was true, add first table record with empty values
+            elif outer:
+                positions_1.append(pos_1)
+                positions_2.append(None)
+
+        return positions_1, positions_2
+
+    #####################################
+    # buildBuckets():
+    #   Build the hash table of the second table of an equality join. When the
+    #   first table is the smaller side, its keys are hashed instead, and only
+    #   second table records matching one of them are kept.
+    # args:
+    #   @keys_2: List with join attribute values of second table.
+    #   @keys_1: List with join attribute values of first table, if smaller (default = None).
+    # return:
+    #   Dictionary with join key-record positions pairs, positions in table order.
+    #####################################
+    def buildBuckets(self, keys_2, keys_1 = None):
+        # Variables
+        buckets = {}
+        keySet = None if keys_1 is None else set(keys_1) # Keys of smaller first table
+
+        # Group positions by key, skipping empty values
+        for pos_2, key in enumerate(keys_2):
+            if key is None or (keySet is not None and key not in keySet):
+                continue
+            if key in buckets:
+                buckets[key].append(pos_2)
+            else:
+                buckets[key] = [pos_2]
+
+        return buckets
+
+    #####################################
+    # hashJoinOp():
+    #   Probe the hash table of the second table of an equality join with join
+    #   attribute values of first table records. Pairs are returned in the same
+    #   order as the nested loop join: ordered by first table record, and the
+    #   matches of each first table record ordered by second table record.
+    # args:
+    #   @keys_1: List with join attribute values of first table.
+    #   @buckets: Hash table of second table built by buildBuckets().
+    #   @outer: Whether unmatched first table records are kept (default = False).
+    # return:
+    #   Tuple with list of first table positions and list of second table positions,
+    #   None for unmatched records.
+    #####################################
+    def hashJoinOp(self, keys_1, buckets, outer = False):
+        # Variables
+        positions_1 = []
+        positions_2 = []
+
+        # Loop through all records in first table
+        for pos_1, key in enumerate(keys_1):
+            matches = buckets.get(key)
+            if matches:
+                positions_1.extend([pos_1] * len(matches))
+                positions_2.extend(matches)
+            elif outer:
+                positions_1.append(pos_1)
+                positions_2.append(None)
+
+        return positions_1, positions_2
+
+    #####################################
+    # sortKeys():
+    #   Sort records of the second table of a '<' or '>' join on their join attribute.
+    #   Empty values and values of another kind than the attribute never match,
+    #   so they are left out.
+    # args:
+    #   @keys_2: List with join attribute values of second table.
+    #   @numeric: Whether keys are compared as numbers.
+    # return:
+    #   Tuple with sorted list of keys and list of record positions in the same order.
+    #####################################
+    def sortKeys(self, keys_2, numeric):
+        kinds = (int, float) if numeric else str
+        sortedPairs = [(key, pos_2) for pos_2, key in enumerate(keys_2) if isinstance(key, kinds)]
+        sortedPairs.sort()
+        return [pair[0] for pair in sortedPairs], [pair[1] for pair in sortedPairs]
+
+    #####################################
+    # rangeJoinOp():
+    #   Perform a '<' or '>' join on join attribute values of first table records
+    #   and the sorted second table. Each first table record takes its matching
+    #   range through a binary search. Pairs are returned ordered by first table
+    #   record, and the matches of each first table record ordered by join attribute.
+    # args:
+    #   @keys_1: List with join attribute values of first table.
+    #   @sortedKeys: List with sorted join attribute values of second table.
+    #   @sortedPositions: List with second table positions of sorted values.
+    #   @condOp: Either '<' or '>'.
+    #   @outer: Whether unmatched first table records are kept (default = False).
+    # return:
+    #   Tuple with list of first table positions and list of second table positions,
+    #   None for unmatched records.
+    #####################################
+    def rangeJoinOp(self, keys_1, sortedKeys, sortedPositions, condOp, outer = False):
+        # Variables
+        positions_1 = []
+        positions_2 = []
+
+        # Loop through all records in first table
+        for pos_1, key in enumerate(keys_1):
+            matches = ()
+            # Matches are every second table record above or below the key
+            try:
+                if key is not None and condOp == "<":
+                    matches = sortedPositions[bisect.bisect_right(sortedKeys, key):]
+                elif key is not None:
+                    matches = sortedPositions[:bisect.bisect_left(sortedKeys, key)]
+            except TypeError: # Keys of another kind never match
+                pass
+            if matches:
+                positions_1.extend([pos_1] * len(matches))
+                positions_2.extend(matches)
+            elif outer:
+                positions_1.append(pos_1)
+                positions_2.append(None)
+
+        return positions_1, positions_2
+
+    #####################################
+    # crossJoinOp():
+    #   Pair every first table record with every second table record.
+    # args:
+    #   @rows_1: Number of records of first table.
+    #   @rows_2: Number of records of second table.
+    #   @outer: Whether first table records are kept when second table is empty (default = False).
+    # return:
+    #   Tuple with list of first table positions and list of second table positions,
+    #   None for unmatched records.
+    #####################################
+    def crossJoinOp(self, rows_1, rows_2, outer = False):
+        if rows_2 == 0:
+            return (list(range(rows_1)), [None] * rows_1) if outer else ([], [])
+        return [pos_1 for pos_1 in range(rows_1) for _ in range(rows_2)], list(range(rows_2)) * rows_1
+
+    #####################################
+    # testKeys():
+    #   Compare two values of attributes, which never matches empty values.
+    # args:
+    #   @compare: Function of operator taking the second value first, or None.
+    #   @key_1: Value on the left side of the operator.
+    #   @key_2: Value on the right side of the operator.
+    # return:
+    #   True: If comparison is true.
+    #   False: Otherwise.
+    #####################################
+    def testKeys(self, compare, key_1, key_2):
+        if compare is None or key_1 is None or key_2 is None:
+            return False
+        try:
+            return compare(key_2, key_1)
+        except TypeError:
+            return False
+
+    #####################################
+    # filterTable():
+    #   Keep records of a table passing a condition.
+    # args:
+    #   @table: Table to test.
+    #   @cond: Condition tuple of a plan.
+    # return:
+    #   New Table.
+    #####################################
+    def filterTable(self, table, cond):
+        # Variables
+        colnum_1 = table.findAttr(cond[0] + "." + cond[1])
+
+        # Compare attribute with a constant
+        if cond[3] is None:
+            test = self.compileTest(cond[2], table.parseValue(colnum_1, cond[4]), table.columns[colnum_1])
+            return table.selectRecords(self.filterPositions(table.columns[colnum_1], test))
+
+        # Compare two attributes of each record
+        colnum_2 = table.findAttr(cond[3] + "." + cond[4])
+        keys_1, keys_2 = self.getJoinKeys(table, colnum_1, table, colnum_2, cond[2])
+        compare = self.reversedOps.get(cond[2])
+        return table.selectRecords([pos for pos, key_1, key_2 in zip(itertools.count(), keys_1, keys_2) if self.testKeys(compare, key_1, key_2)])
+
+    #####################################
+    # readBinaryTable():
+    #   Read needed attributes of a binary table through its memory map.
+    #   Attributes compared with constants by the scan are read first, and the
+    #   other needed attributes are only read from pages holding passing records.
+    # args:
+    #   @tpath: String with path to table.
+    #   @colnums: List with positions of needed attributes in table file.
+    #   @alias: String with alias of table.
+    #   @conds: List with condition tuples of the scan of table.
+    # return:
+    #   Table with needed attributes of records passing conditions with constants.
+    #####################################
+    def readBinaryTable(self, tpath, colnums, alias, conds):
+        # Variables
+        binaryTable = bs.BinaryTable(tpath)
+        table = Table()
+        table.tpath = tpath
+        table.lpath = tpath + "_"
+        table.storage = "binary"
+        table.setSchema(binaryTable.types, binaryTable.names)
+        table = table.view(colnums, alias)
+        tested = [] # Positions in table of attributes compared with constants
+        for cond in conds:
+            colnum = table.findAttr(cond[0] + "." + cond[1])
+            if cond[3] is None and colnum not in tested:
+                tested.append(colnum)
+
+        # Tables without conditions are read whole
+        if not tested:
+            table.columns = [table.makeColumn(colnum, column) for colnum, column in enumerate(binaryTable.readColumns(colnums))]
+            return table
+
+        # Find records passing conditions with constants
+        columns = dict(zip(tested, binaryTable.readColumns([colnums[colnum] for colnum in tested])))
+        positions = None
+        for cond in conds:
+            if cond[3] is not None:
+                continue
+            colnum = table.findAttr(cond[0] + "." + cond[1])
+            test = self.compileTest(cond[2], table.parseValue(colnum, cond[4]), columns[colnum])
+            if positions is None:
+                positions = self.filterPositions(columns[colnum], test)
+            else:
+                positions = [pos for pos in positions if test(columns[colnum][pos])]
+
+        # Read other attributes of passing records
+        others = [colnum for colnum in range(len(colnums)) if colnum not in columns]
+        columns.update(zip(others, binaryTable.readColumnsAt([colnums[colnum] for colnum in others], positions)))
+        table.columns = [table.makeColumn(colnum, [columns[colnum][pos] for pos in positions] if colnum in tested else columns[colnum]) for colnum in range(len(colnums))]
+        return table
+
+    #####################################
+    # scanChunks():
+    #   Read positions of the records of a scanned table in chunks.
+    # args:
+    #   @table: Table of scan.
+    # return:
+    #   Generator with chunks, each a list with one list of positions.
+    #####################################
+    def scanChunks(self, table):
+        rows = table.numRecords()
+        for start in range(0, rows, self.joinChunk):
+            yield [list(range(start, min(start + self.joinChunk, rows)))]
+
+    #####################################
+    # joinChunks():
+    #   Pair chunks of records with records of the table scanned by the second
+    #   child of a join node. The second table is hashed or sorted once, then
+    #   probed by each chunk.
+    # args:
+    #   @node: Join PlanNode.
+    #   @chunks: Iterable with chunks of first child.
+    #   @tables: Alias-Table pairs of scanned tables.
+    # return:
+    #   Generator with chunks holding positions of first child aliases, then of second table.
+    #####################################
+    def joinChunks(self, node, chunks, tables):
+        # Variables
+        outer = node.joinMode == "left outer join"
+        table_2 = tables[node.children[1].alias]
+        cond = node.conds[0] if node.conds else None
+
+        # Prepare second table once
+        if cond is not None:
+            chunkPos = node.children[0].aliases.index(cond[0])
+            table_1 = tables[cond[0]]
+            attrPos_1 = table_1.findAttr(cond[0] + "." + cond[1])
+            attrPos_2 = table_2.findAttr(cond[3] + "." + cond[4])
+            keys_1, keys_2 = self.getJoinKeys(table_1, attrPos_1, table_2, attrPos_2, cond[2])
+            # Large equality joins are split into partitions joined by worker processes
+            if cond[2] == "=" and self.scanWorkers > 1 and self.parallelJoinRows is not None and node.children[0].rows + len(keys_2) >= self.parallelJoinRows:
+                yield from self.partitionedJoinChunks(chunks, chunkPos, keys_1, keys_2, outer, node.children[0].kind == "scan")
+                return
+            if cond[2] == "=":
+                buckets = self.buildBuckets(keys_2, keys_1 if len(keys_1) < len(keys_2) else None)
+            elif cond[2] == "<" or cond[2] == ">":
+                sortedKeys, sortedPositions = self.sortKeys(keys_2, table_1.isNumeric(attrPos_1) or table_2.isNumeric(attrPos_2))
+
+        # Probe with each chunk
+        for chunk in chunks:
+            if cond is None:
+                positions_1, positions_2 = self.crossJoinOp(len(chunk[0]), table_2.numRecords(), outer)
+            else:
+                chunkKeys = [None if pos is None else keys_1[pos] for pos in chunk[chunkPos]]
+                if cond[2] == "=":
+                    positions_1, positions_2 = self.hashJoinOp(chunkKeys, buckets, outer)
+                elif cond[2] == "<" or cond[2] == ">":
+                    positions_1, positions_2 = self.rangeJoinOp(chunkKeys, sortedKeys, sortedPositions, cond[2], outer)
+                else:
+                    positions_1, positions_2 = self.nestedLoopJoinOp(chunkKeys, keys_2, cond[2], outer)
+            if positions_1:
+                yield [[positions[pos] for pos in positions_1] for positions in chunk] + [positions_2]
+
+    #####################################
+    # partitionedJoinChunks():
+    #   Pair chunks of records with records of the second table of an equality
+    #   join, split by join attribute hash into one partition per worker process.
+    #   Each worker builds the hash table of its partition of the second table,
+    #   then is handed each chunk whole and probes it with the records falling
+    #   in its partition, so the parent process never hashes keys. Pairs of the
+    #   partitions are concatenated: within each batch of chunks they are
+    #   grouped by partition, then ordered as in hashJoinOp().
+    # args:
+    #   @chunks: Iterable with chunks of first child.
+    #   @chunkPos: Position in chunks of the positions of the first table of the join.
+    #   @keys_1: List with join attribute values of first table.
+    #   @keys_2: List with join attribute values of second table.
+    #   @outer: Whether unmatched first table records are kept.
+    #   @contiguous: Whether chunks hold runs of consecutive first table positions.
+    # return:
+    #   Generator with chunks holding positions of first child aliases, then of second table.
+    #####################################
+    def partitionedJoinChunks(self, chunks, chunkPos, keys_1, keys_2, outer, contiguous):
+        # Start one worker per partition, building its hash table once
+        count = self.scanWorkers
+        pools = [multiprocessing.Pool(1, initializer = setPartition, initargs = (keys_1, keys_2, part, count)) for part in range(count)]
+        try:
+            for chunk in self.batchChunks(chunks, self.joinChunk * 16):
+                # Runs of positions are sent as ranges
+                positions = chunk[chunkPos]
+                if contiguous:
+                    positions = range(positions[0], positions[-1] + 1)
+                results = [pool.apply_async(probePartition, (positions, outer)) for pool in pools]
+
+                # Concatenate pairs of partitions
+                positions_1 = []
+                positions_2 = []
+                for result in results:
+                    part_1, part_2 = result.get()
+                    positions_1 += part_1
+                    positions_2 += part_2
+                if positions_1:
+                    yield [[positions[pos] for pos in positions_1] for positions in chunk] + [positions_2]
+        finally:
+            for pool in pools:
+                pool.terminate()
+
+    #####################################
+    # isGraceJoin():
+    #   Test whether a select should join its tables through partitions on disk
+    #   instead of loading them in memory.
+    # args:
+    #   @root: Root PlanNode built by buildPlan().
+    #   @tablePaths: Alias-table path pairs of selected tables.
+    # return:
+    #   True: If plan is an equality join of two tables whose uncached files are
+    #         together over the join memory budget.
+    #   False: Otherwise.
+    #####################################
+    def isGraceJoin(self, root, tablePaths):
+        # Variables
+        join = root.children[0] if root.kind == "filter" else root
+        size = 0
+
+        # Only equality joins of two tables are partitioned
+        if len(tablePaths) != 2 or join.kind != "join" or not join.conds or join.conds[0][2] != "=":
+            return False
+        for tpath in tablePaths.values():
+            if tpath in self.pendingTables or self.isCached(tpath):
+                return False
+            size += os.path.getsize(tpath)
+        return size > self.joinMemoryBudget
+
+    #####################################
+    # spillPartitions():
+    #   Stream records of a table file into partition files by join key hash,
+    #   testing the conditions of its scan on the way. Partition records are
+    #   lists with the position of the record among passing records, its join
+    #   key and its needed attribute values.
+    # args:
+    #   @tpath: String with path to table.
+    #   @colnums: List with positions of needed attributes in table file.
+    #   @conds: List with condition tuples of the scan of table.
+    #   @schema: Table with needed attributes of table and no records.
+    #   @keyPos: Position of join attribute in schema.
+    #   @convert: Whether join keys are compared as text.
+    #   @keepEmpty: Whether records with an empty join key are kept.
+    #   @count: Number of partitions.
+    # return:
+    #   Tuple with list of (SpillFile, bytes of records) pairs and number of passing records.
+    #####################################
+    def spillPartitions(self, tpath, colnums, conds, schema, keyPos, convert, keepEmpty, count):
+        # Variables
+        types, names = self.getSchema(tpath)
+        files = [bsp.SpillFile(self.db_in_use) for _ in range(count)]
+        sizes = [0] * count
+        rows = 0
+        records = self.scanRecords(tpath, colnums)
+
+        # Read table one batch at a time
+        batch = list(itertools.islice(records, self.loadChunk))
+        while batch:
+            table = Table()
+            table.setSchema(types, names)
+            table.loadColumns(batch)
+            table = table.view(colnums, schema.aliases[0])
+            for cond in conds:
+                table = self.filterTable(table, cond)
+
+            # Split passing records by join key
+            batches = [[] for _ in range(count)]
+            for seq, record in enumerate(zip(*table.columns), rows):
+                key = record[keyPos]
+                if key is None and not keepEmpty:
+                    continue
+                if key is not None and convert:
+                    key = table.formatValue(key)
+                batches[hash(key) % count].append([seq, key] + list(record))
+            for part, spilled in enumerate(batches):
+                files[part].write(spilled)
+                sizes[part] += sum([sys.getsizeof(record) + sum(map(sys.getsizeof, record)) for record in spilled])
+            rows += table.numRecords()
+            batch = list(itertools.islice(records, self.loadChunk))
+
+        return list(zip(files, sizes)), rows
+
+    #####################################
+    # splitPartition():
+    #   Split a partition of a grace join into smaller partitions, hashing join
+    #   keys with another seed. Records keep their order.
+    # args:
+    #   @part: Dictionary with alias-(SpillFile, bytes of records) pairs of partition.
+    #   @depth: Number of times records of partition were split before.
+    # return:
+    #   List with partitions, as dictionaries like part.
+    #####################################
+    def splitPartition(self, part, depth):
+        # Variables
+        count = min(sum([size for _, size in part.values()]) // self.joinMemoryBudget * 2 + 1, self.joinFanout)
+        parts = [{} for _ in range(count)]
+
+        # Split records of each table
+        for alias, (spillFile, _) in part.items():
+            files = [bsp.SpillFile(self.db_in_use) for _ in range(count)]
+            sizes = [0] * count
+            records = spillFile.records()
+            batch = list(itertools.islice(records, self.joinChunk))
+            while batch:
+                batches = [[] for _ in range(count)]
+                for record in batch:
+                    batches[hash((depth, record[1])) % count].append(record)
+                for number, spilled in enumerate(batches):
+                    files[number].write(spilled)
+                    sizes[number] += sum([sys.getsizeof(record) + sum(map(sys.getsizeof, record)) for record in spilled])
+                batch = list(itertools.islice(records, self.joinChunk))
+            spillFile.remove()
+            for number in range(count):
+                parts[number][alias] = (files[number], sizes[number])
+
+        return parts
+
+    #####################################
+    # joinPartition():
+    #   Join the records of a grace join partition through the plan, splitting
+    #   the partition again while it is over the join memory budget. Joined
+    #   records are written to a temporary file after the position of their
+    #   first table record.
+    # args:
+    #   @root: Root PlanNode, ordered by orderJoins().
+    #   @schemas: Alias-Table pairs with needed attributes of each table and no records.
+    #   @part: Dictionary with alias-(SpillFile, bytes of records) pairs of partition.
+    #   @sources: List with (alias, position in table) pairs of written attributes.
+    #   @outFiles: List with SpillFiles of joined records, appended to.
+    #   @depth: Number of times records of partition were split before (default = 0).
+    #   @splittable: Whether partition may be split again (default = True).
+    # return:
+    #   None.
+    #####################################
+    def joinPartition(self, root, schemas, part, sources, outFiles, depth = 0, splittable = True):
+        # Variables
+        size = sum([size for _, size in part.values()])
+
+        # Partitions over budget are split again, unless a split kept every record together
+        if size > self.joinMemoryBudget and splittable:
+            subparts = self.splitPartition(part, depth)
+            try:
+                for subpart in subparts:
+                    subsize = sum([subsize for _, subsize in subpart.values()])
+                    self.joinPartition(root, schemas, subpart, sources, outFiles, depth + 1, subsize < size)
+            finally:
+                for subpart in subparts:
+                    for spillFile, _ in subpart.values():
+                        spillFile.remove()
+            return
+
+        # Load records of partition into tables
+        tables = {}
+        seqs = {} # Alias-positions of records among passing records of table pairs
+        for alias, (spillFile, _) in part.items():
+            records = list(spillFile.records())
+            spillFile.remove()
+            table = schemas[alias].view(range(len(schemas[alias].names)), alias)
+            columns = list(zip(*[record[2:] for record in records])) or [[] for _ in table.names]
+            table.columns = [table.makeColumn(colnum, column) for colnum, column in enumerate(columns)]
+            tables[alias] = table
+            seqs[alias] = [record[0] for record in records]
+        leadSeqs = seqs[root.aliases[0]]
+        if not leadSeqs:
+            return
+
+        # Write joined records
+        columns = [(root.aliases.index(alias), tables[alias].columns[colnum]) for alias, colnum in sources]
+        outFile = bsp.SpillFile(self.db_in_use)
+        outFiles.append(outFile)
+        for chunk in self.executePlan(root, tables):
+            values = [[None if pos is None else column[pos] for pos in chunk[chunkPos]] for chunkPos, column in columns]
+            outFile.write([[leadSeqs[pos]] + list(record) for pos, record in zip(chunk[0], zip(*values))])
+
+    #####################################
+    # batchChunks():
+    #   Gather chunks of records into larger chunks.
+    # args:
+    #   @chunks: Iterable with chunks.
+    #   @size: Number of records above which a chunk is complete.
+    # return:
+    #   Generator with chunks.
+    #####################################
+    def batchChunks(self, chunks, size):
+        # Variables
+        batch = None
+
+        # Append chunks to batch until it is complete
+        for chunk in chunks:
+            if batch is None:
+                batch = [list(positions) for positions in chunk]
+            else:
+                for positions, added in zip(batch, chunk):
+                    positions.extend(added)
+            if len(batch[0]) >= size:
+                yield batch
+                batch = None
+
+        # Trailing records
+        if batch is not None:
+            yield batch
+
+    #####################################
+    # compileChunkTest():
+    #   Build a test for a condition on chunks of joined records.
+    # args:
+    #   @aliases: List with alias of each list of positions in chunks.
+    #   @tables: Alias-Table pairs of scanned tables.
+    #   @cond: Condition tuple of a plan.
+    # return:
+    #   Function taking a chunk and returning whether each record passes.
+    #####################################
+    def compileChunkTest(self, aliases, tables, cond):
+        # Variables
+        chunkPos_1 = aliases.index(cond[0])
+        table_1 = tables[cond[0]]
+        colnum_1 = table_1.findAttr(cond[0] + "." + cond[1])
+
+        # Compare attribute with a constant
+        if cond[3] is None:
+            column = table_1.columns[colnum_1]
+            test = self.compileTest(cond[2], table_1.parseValue(colnum_1, cond[4]), column)
+            return lambda chunk: [pos is not None and test(column[pos]) for pos in chunk[chunkPos_1]]
+
+        # Compare attributes of two tables
+        chunkPos_2 = aliases.index(cond[3])
+        table_2 = tables[cond[3]]
+        keys_1, keys_2 = self.getJoinKeys(table_1, colnum_1, table_2, table_2.findAttr(cond[3] + "." + cond[4]), cond[2])
+        compare = self.reversedOps.get(cond[2])
+        return lambda chunk: [pos_1 is not None and pos_2 is not None and self.testKeys(compare, keys_1[pos_1], keys_2[pos_2]) for pos_1, pos_2 in zip(chunk[chunkPos_1], chunk[chunkPos_2])]
+
+    #####################################
+    # filterChunks():
+    #   Keep records of chunks passing a test.
+    # args:
+    #   @chunks: Iterable with chunks.
+    #   @test: Function built by compileChunkTest().
+    # return:
+    #   Generator with chunks of passing records.
+    #####################################
+    def filterChunks(self, chunks, test):
+        for chunk in chunks:
+            passing = test(chunk)
+            chunk = [list(itertools.compress(positions, passing)) for positions in chunk]
+            if chunk[0]:
+                yield chunk
+
+    #####################################
+    # executePlan():
+    #   Run the joins and filters of a plan as a pipeline. Records of the first
+    #   table flow in chunks through every operator above its scan, so
+    #   intermediate results are never held whole. Chunks hold record positions
+    #   in the scanned tables instead of values, and joined records are only
+    #   built when printed.
+    # args:
+    #   @node: PlanNode to run.
+    #   @tables: Alias-Table pairs of scanned tables, already filtered by their scans.
+    # return:
+    #   Generator with chunks, each a list with the positions of records of every
+    #   alias of node, in the order of node.aliases. Positions are None for empty records.
+    #####################################
+    def executePlan(self, node, tables):
+        # Records of scans
+        if node.kind == "scan":
+            return self.scanChunks(tables[node.alias])
+
+        # Records of joins and filters
+        chunks = self.executePlan(node.children[0], tables)
+        conds = node.conds
+        if node.kind == "join":
+            chunks = self.joinChunks(node, chunks, tables)
+            conds = node.conds[1:]
+        for cond in conds:
+            chunks = self.filterChunks(chunks, self.compileChunkTest(node.aliases, tables, cond))
+
+        return chunks
+
+    #####################################
+    # chunkRecords():
+    #   Build selected attributes of joined records.
+    # args:
+    #   @chunks: Iterable with chunks of root of plan.
+    #   @sources: List with (position in chunks, column) pairs of selected attributes.
+    # return:
+    #   Generator with records as tuples of values.
+    #####################################
+    def chunkRecords(self, chunks, sources):
+        for chunk in chunks:
+            values = [[None if pos is None else column[pos] for pos in chunk[chunkPos]] for chunkPos, column in sources]
+            yield from zip(*values)
+
+    #####################################
+    # selectCommand()
+    #   Selects content wanted from a table. Conditions on a single table are
+    #   tested before the joins, and joins run as a pipeline in the order giving
+    #   the fewest estimated records.
+    # args:
+    #   args: Tokens with words passed to select command
+    #   plan: Dictionary with tables and attributes resolved for the command, filled
+    #         on first use and reused by later commands differing only in literals (default = None).
+    # return:
+    #   1: If content was successfully selected.
+    #   0: Otherwise.
+    #####################################
+    def selectCommand(self, commStruct, plan = None):
+        # Variables
+        selectTokens = commStruct["select"]
+        if plan is None:
+            plan = {}
+        aliasStruct = plan.get("aliasStruct") or self.getAliasStruct(commStruct["from"])
+        tablePaths = plan.get("tablePaths") or self.getTablesStruct(aliasStruct)
+
+        # Test for non-existent table
+        for table_path in tablePaths.values():
+            if not os.path.isfile(table_path):
+                print("!Could not select from " + table_path + " because it does not exist.")
+                return 0
+
+        # Find attributes needed from each table, again if another user changed a schema
+        tableSchemas = dict([(tpath, self.getSchema(tpath)) for tpath in tablePaths.values()])
+        if "neededAttrs" not in plan or plan["tableSchemas"] != tableSchemas:
+            plan["aliasStruct"] = aliasStruct
+            plan["tablePaths"] = tablePaths
+            plan["tableSchemas"] = tableSchemas
+            plan["neededAttrs"] = self.getNeededAttrs(commStruct, tablePaths)
+        neededAttrs = plan["neededAttrs"]
+
+        # Build tree of operators
+        aliases = list(tablePaths)
+        schemas = dict([(tname, self.getSchema(tablePaths[tname])[1]) for tname in aliases])
+        joinModes = {}
+        onConds = {}
+        whereConds, error = bp.parseConditions(commStruct.get("where"), aliases, schemas)
+        for joinTokens in commStruct.get("joins", []):
+            if error is not None or len(joinTokens) < 2:
+                continue
+            alias = list(self.getAliasStruct(joinTokens[1:2]))[0]
+            joinModes[alias] = "left outer join" if "left" in joinTokens[0] or "outer" in joinTokens[0] else "inner join"
+            onConds[alias], error = bp.parseConditions(joinTokens[2:], aliases, schemas)
+        if error is None:
+            root, error = bp.buildPlan(aliases, joinModes, onConds, whereConds)
+        if error is not None:
+            print("!Could not select because " + error + ".")
+            return 0
+        scans = dict([(scan.alias, scan) for scan in root.scans()])
+
+        # Keep other users from appending to tables while they are read
+        dataPaths = [self.getLockPath(aliasStruct[tname], "data") for tname in tablePaths]
+        for dpath in dataPaths:
+            self.lockManager.acquire(dpath, False, True)
+
+        # Create table objects
+        tables = {}
+        graceJoin = self.isGraceJoin(root, tablePaths)
+        try:
+            for tname in tablePaths:
+                tableName = tablePaths[tname]
+                scanConds = scans[tname].conds
+                print("Locked? " + tname)
+                if self.lockManager.isHeld(self.getLockPath(aliasStruct[tname])):
+                    print("Locked")
+                # Large equality joins of two tables are read from their files one partition at a time
+                if graceJoin:
+                    continue
+                # Tables changed by current user are read with their uncommitted changes
+                if tableName in self.pendingTables:
+                    tables[tname] = self.pendingTables[tableName].view(neededAttrs[tname], tname)
+                    continue
+                # Conditions pushed down to a table may read matching records through an index
+                indexedTable = None
+                for cond in scanConds:
+                    if cond[3] is None:
+                        indexedTable = self.indexScan(tableName, [cond[1], cond[2], cond[4]])
+                    if indexedTable is not None:
+                        break
+                if indexedTable is not None:
+                    tables[tname] = indexedTable.view(neededAttrs[tname], tname)
+                    continue
+                # Large single tables are streamed instead of loaded
+                if len(tablePaths) == 1 and all([cond[3] is None for cond in scanConds]) and self.isStreamable(tableName):
+                    return self.streamSelect(tableName, tname, selectTokens, scanConds, commStruct.get("group by"), commStruct.get("order by"), neededAttrs[tname])
+                # Uncached binary tables only read needed attributes from pages holding passing records
+                if not self.isCached(tableName) and bs.isBinaryTable(tableName):
+                    tables[tname] = self.readBinaryTable(tableName, neededAttrs[tname], tname, scanConds)
+                    continue
+                tables[tname] = self.getTable(tableName).view(neededAttrs[tname], tname)
+            if graceJoin:
+                return self.graceSelect(root, tablePaths, neededAttrs, selectTokens, commStruct.get("group by"), commStruct.get("order by"))
+        finally:
+            for dpath in dataPaths:
+                self.lockManager.release(dpath)
+
+        # Keep records of each table passing conditions of its scan
+        for tname in tables:
+            for cond in scans[tname].conds:
+                tables[tname] = self.filterTable(tables[tname], cond)
+
+        # Print single table
+        groupTokens = commStruct.get("group by")
+        orderTokens = commStruct.get("order by") or []
+        aggregated = groupTokens is not None or ba.hasAggregates(selectTokens)
+        if root.kind == "scan" and not aggregated:
+            selectedContent = tables[root.alias]
+            colnums = self.getSelectedAttrs(selectedContent, selectTokens)
+            keys = self.getOrderKeys(selectedContent, orderTokens)
+            if colnums is None or keys is None:
+                return 0
+            readColnums, sortKeys = self.appendOrderKeys(colnums, keys)
+            records = self.orderRecords(zip(*[selectedContent.columns[colnum] for colnum in readColnums]), sortKeys, len(colnums))
+            print()
+            self.printHeader([selectedContent.names[colnum] for colnum in colnums], [selectedContent.types[colnum] for colnum in colnums])
+            formatValue = selectedContent.formatValue
+            self.printRecords("|".join(map(formatValue, record)) for record in records)
+            return 1
+
+        # Find selected attributes among attributes of joined tables, in from order
+        root = bp.orderJoins(root, dict([(tname, tables[tname].numRecords()) for tname in tables]))
+        joined = Table()
+        sources = [] # (position in chunks, column) pair of each attribute
+        for tname in aliases:
+            joined.types += tables[tname].types
+            joined.names += tables[tname].names
+            joined.aliases += [tname] * len(tables[tname].names)
+            sources += [(root.aliases.index(tname), column) for column in tables[tname].columns]
+
+        # Aggregate records as they leave the pipeline
+        if aggregated:
+            aggregator = self.buildAggregator(joined, selectTokens, groupTokens)
+            if aggregator is None:
+                return 0
+            keys = self.getOrderKeys(joined, orderTokens, aggregator.items)
+            if keys is None:
+                return 0
+            for chunk in self.executePlan(root, tables):
+                aggregator.addChunk(len(chunk[0]), [[None if pos is None else column[pos] for pos in chunk[chunkPos]] for chunkPos, column in [sources[colnum] for colnum in aggregator.colnums]])
+            self.printAggregates(joined, aggregator, keys)
+            return 1
+
+        colnums = self.getSelectedAttrs(joined, selectTokens)
+        keys = self.getOrderKeys(joined, orderTokens)
+        if colnums is None or keys is None:
+            return 0
+        readColnums, sortKeys = self.appendOrderKeys(colnums, keys)
+
+        # Print joined records as they leave the pipeline, or once sorted
+        print()
+        self.printHeader([joined.names[colnum] for colnum in colnums], [joined.types[colnum] for colnum in colnums])
+        records = self.chunkRecords(self.executePlan(root, tables), [sources[colnum] for colnum in readColnums])
+        formatValue = joined.formatValue
+        self.printRecords("|".join(map(formatValue, record)) for record in self.orderRecords(records, sortKeys, len(colnums)))
+
+        return 1
 
     #####################################
-    # removeLock():
-    #   Removes a lock from a given table.
+    # getNeededAttrs():
+    #   Find attributes of each table used by a select command, so tables only
+    #   carry those attributes through joins.
     # args:
-    #   NA.
+    #   @commStruct: Command-argument pair dictionary.
+    #   @tablePaths: Alias-table path pair dictionary.
     # return:
-    #   NA.
+    #   Dictionary with alias as key and list of needed attribute positions as value.
     #####################################
-    def removeLock(self):
+    def getNeededAttrs(self, commStruct, tablePaths):
         # Variables
-        databaseLockFName = self.db_in_use + "_locks.tmp"
-        lockFound = False
+        neededAttrs = {}
+        names = set() # Attribute names without alias
+        aliasNames = set() # (alias, attribute name) pairs
+
+        # Collect attributes referenced by command
+        refs = list(commStruct["select"]) + list(commStruct.get("where") or []) + list(commStruct.get("group by") or []) + list(commStruct.get("order by") or []) + [token for joinTokens in commStruct.get("joins", []) for token in joinTokens[2:]]
+        for ref in refs:
+            alias, dot, name = ref.rpartition(".")
+            if dot:
+                aliasNames.add((alias, name))
+            else:
+                names.add(ref)
 
-        # Get lines in current lock file
-        with open(databaseLockFName, "r") as df:
-            lines = df.readlines()
-
-        # Open file with locks
-        with open(databaseLockFName, "w") as df:
-            # Search for table name in lock file
-            for line in lines:
-                line_split = line.split(",", 1)
-                if int(line_split[0]) == self.lockKey:
-                    lockFound = True
-                    continue
-                df.write(line)
+        # Keep every attribute for '*'
+        for tname in tablePaths:
+            attrs = self.getSchema(tablePaths[tname])[1]
+            if commStruct["select"][0] == "*":
+                neededAttrs[tname] = list(range(len(attrs)))
+            else:
+                neededAttrs[tname] = [colnum for colnum in range(len(attrs)) if attrs[colnum] in names or (tname, attrs[colnum]) in aliasNames]
+            # Tables keep an attribute to know their number of records
+            if not neededAttrs[tname] and attrs:
+                neededAttrs[tname] = [0]
 
-        return lockFound
+        return neededAttrs
 
     #####################################
-    # getLockedFiles():
-    #   Get names of tables locked by current user.
+    # getSelectedAttrs():
+    #   Find positions of selected attributes in a table.
     # args:
-    #   NA.
+    #   @table: Table with selected content.
+    #   @selectTokens: List with tokens passed to select command.
     # return:
-    #   List with strings of names of tables.
+    #   List with attribute positions, or None if an attribute does not exist.
     #####################################
-    def getLockedFiles(self):
-        # Variables
-        databaseLockFName = self.db_in_use + "_locks.tmp"
-        lockedFiles = []
-
-        # Open file with locks
-        with open(databaseLockFName, "r") as df:
-            # Loop through locks
-            for lock in df.readlines():
-                lock_data = lock.strip().split(",", 1)
-                # Test if lock is locked by current user
-                if int(lock_data[0]) == self.lockKey:
-                    lockedFiles.append(lock_data[1])
-
-        return lockedFiles
+    def getSelectedAttrs(self, table, selectTokens):
+        if selectTokens[0] == "*":
+            return list(range(len(table.names)))
+        colnums = []
+        for token in selectTokens:
+            colnum = table.findAttr(token)
+            if colnum == -1:
+                print("!Could not select " + token + " because it does not exist.")
+                return None
+            colnums.append(colnum)
+        return colnums
 
     #####################################
-    # transationCommand():
-    #   Start transaction for current user.
+    # buildAggregator():
+    #   Build the aggregation of a select command with aggregate functions or a
+    #   group by clause.
     # args:
-    #   NA.
+    #   @table: Table with attributes of selected records.
+    #   @selectTokens: List with tokens passed to select command.
+    #   @groupTokens: List with tokens passed to group by clause, or None.
     # return:
-    #   NA.
+    #   HashAggregator object, or None if selection is not valid.
     #####################################
-    def transactionCommand(self):
-        print("Transaction starts.")
+    def buildAggregator(self, table, selectTokens, groupTokens):
+        items, groupColnums, error = ba.parseSelection(selectTokens, groupTokens, table)
+        if error is not None:
+            print("!Could not select because " + error + ".")
+            return None
+        return ba.HashAggregator(items, groupColnums)
 
     #####################################
-    # commitCommand():
-    #   Save all intermediate data into original table.
+    # printAggregates():
+    #   Print selected items of each group of an aggregation.
     # args:
-    #   tpath: String with path to original table.
+    #   @table: Table with attributes of selected records.
+    #   @aggregator: HashAggregator with every record added.
+    #   @keys: List with (item position, descending) pairs to sort groups on (default = none).
     # return:
-    #   NA.
+    #   None.
     #####################################
-    def commitCommand(self):
-        # Get locked files
-        lockedFiles = self.getLockedFiles()
-
-        # Save all locked files
-        for lockedFile in lockedFiles:
-            table = Table(self.db_in_use + "/" + lockedFile + ".bql")
-            table.tempToOG()
+    def printAggregates(self, table, aggregator, keys = None):
+        # Variables
+        names = []
+        types = []
+
+        # Functions are named after their attribute, and count and avg give numbers
+        for function, colnum in aggregator.items:
+            if function is None:
+                names.append(table.names[colnum])
+                types.append(table.types[colnum])
+                continue
+            names.append(function + "(" + ("*" if colnum is None else table.names[colnum]) + ")")
+            if function == "count":
+                types.append("int")
+            elif function == "avg" or (function == "sum" and table.types[colnum] != "int"):
+                types.append("float")
+            else:
+                types.append(table.types[colnum])
 
-        # Remove lock from table
-        if self.removeLock():
-            print("Transaction commited.")
-        else:
-            print("Transaction abort.")
+        # Print groups
+        print()
+        self.printHeader(names, types)
+        self.printRecords("|".join(map(table.formatValue, values)) for values in self.orderRecords(aggregator.results(), keys or [], len(aggregator.items)))
 
     #####################################
-    # createTableCommand():
-    #   Attemps to create a table as a file in current database in use.
+    # getOrderKeys():
+    #   Find sort keys of an order by clause, each an attribute or an aggregate
+    #   function followed by 'asc' (default) or 'desc'.
     # args:
-    #   tokens: Array with tokens passed to create table command.
+    #   @table: Table with attributes of selected records.
+    #   @orderTokens: List with tokens passed to order by clause.
+    #   @items: List with (function, attribute position) pairs of aggregated items,
+    #           or None if records are not aggregated (default = None).
     # return:
-    #   1: If table was successfully created.
-    #   0: If table failed to be created.
+    #   List with (attribute position, descending) pairs, the position being that of
+    #   an item for aggregated records, or None if a key is not valid.
     #####################################
-    def createTableCommand(self, tokens):
-        # Test if table already exists
-        table_name = tokens[0]
-        table_path = self.db_in_use + table_name + ".bql"
-        if os.path.isfile(table_path):
-            print("!Could not create table because table " + table_name + " already exists.")
-            return 0
-
+    def getOrderKeys(self, table, orderTokens, items = None):
         # Variables
-        table_types = []
-        table_names = []
-        col_type = []
-        syntax_switch = False
-
-        # Organize tokens into a list of attribute names and associated data type
-        for token in tokens[1:]:
-            if token in self.valid_datatypes:
-                col_type.append(token)
-                if token != "varchar":
-                    syntax_switch = False
-                    table_types.append(col_type[0])
-                    col_type = []
-            else:
-                if syntax_switch:
-                    col_type.append(token)
-                    table_types.append(" ".join(col_type))
-                    col_type = []
-                    syntax_switch = False
-                else:
-                    table_names.append(token)
-                    syntax_switch = True
+        keys = []
+        pos = 0
+
+        # Loop through keys
+        while pos < len(orderTokens):
+            token = orderTokens[pos]
+            pos += 1
+            function = None
+            if token[-1:] == "(" and token[:-1] in ba.functionNames and pos < len(orderTokens):
+                function = token[:-1]
+                token = orderTokens[pos]
+                pos += 1
+            colnum = None if function == "count" and token == "*" else table.findAttr(token)
+            if colnum == -1:
+                print("!Could not order by " + token + " because it does not exist.")
+                return None
+            # Aggregated records are sorted on their items
+            if items is not None:
+                if (function, colnum) not in items:
+                    print("!Could not order by " + (token if function is None else function + "(" + token + ")") + " because it is not selected.")
+                    return None
+                colnum = items.index((function, colnum))
+            elif function is not None:
+                print("!Could not order by " + function + " because records are not aggregated.")
+                return None
+            descending = pos < len(orderTokens) and orderTokens[pos] == "desc"
+            if pos < len(orderTokens) and (orderTokens[pos] == "asc" or orderTokens[pos] == "desc"):
+                pos += 1
+            keys.append((colnum, descending))
 
-        # Create table
-        with open(table_path, "w") as df:
-            df.write(",".join(table_types))
-            df.write("\n")
-            df.write(",".join(table_names))
-            df.write("\n")
+        return keys
 
-        # Print success
-        print("Table " + table_name + " created.")
+    #####################################
+    # appendOrderKeys():
+    #   Add attributes of sort keys after selected attributes.
+    # args:
+    #   @colnums: List with positions of selected attributes.
+    #   @keys: List with (attribute position, descending) pairs.
+    # return:
+    #   Tuple with list of positions of attributes to read, and list with
+    #   (position in read records, descending) pairs.
+    #####################################
+    def appendOrderKeys(self, colnums, keys):
+        return colnums + [colnum for colnum, _ in keys], [(len(colnums) + num, descending) for num, (colnum, descending) in enumerate(keys)]
 
     #####################################
-    # dropTableCommand():
-    #   Deletes a table with the current working database.
+    # orderRecords():
+    #   Sort records on keys, spilling sorted runs to the database directory
+    #   when they go over the sort memory budget.
     # args:
-    #   @tname: String with name of table to delete.
+    #   @records: Iterable with records.
+    #   @keys: List with (position in records, descending) pairs, most significant first.
+    #   @width: Number of leading values of records to keep.
     # return:
-    #   1: If table successfully deleted.
-    #   0: If table failed to delete.
+    #   Iterable with sorted records, records unchanged if there are no keys.
     #####################################
-    def dropTableCommand(self, tname):
-        # Test if file exists
-        table_path = self.db_in_use + tname + ".bql"
-        if os.path.isfile(table_path):
-            os.remove(table_path)
-            print("Table " + tname + " deleted.")
-            return 1
-        print("!Failed to delete " + tname + " because it does not exist.")
-        return 0
+    def orderRecords(self, records, keys, width):
+        if not keys:
+            return records
+        return (record[:width] for record in bso.sortRecords(records, keys, self.sortMemoryBudget, self.db_in_use))
 
     #####################################
-    # alterTable():
-    #   Alter the structure of a table.
+    # printRecords():
+    #   Write result lines to output in large chunks.
     # args:
-    #   tokens: List of tokens with words passed to alter table command.
+    #   @lines: Iterable with strings to print, one per record.
     # return:
-    #   1: If table is successfully altered.
-    #   0: If table fails to be altered.
+    #   None.
     #####################################
-    def alterTableCommand(self, tokens):
+    def printRecords(self, lines):
         # Variables
-        tname = tokens[0]
-        alterOp = tokens[1]
-        tpath = self.db_in_use + tname + ".bql"
-        
-        # Test if file exists
-        if not os.path.isfile(tpath):
-            print("!Failed to alter " + tname + " because it does not exist.")
-            return 1
-
-        # Alter table
-        add_name = tokens[2]
-        add_type = " ".join(tokens[3:])
-        table = Table(tpath)
-        table.addAttribute(add_name, add_type)
+        chunk = []
 
-        # Save modified table
-        table.saveContent()
-        print("Table " + tname + " modified.")
+        # Write lines once a chunk is full
+        for line in lines:
+            chunk.append(line)
+            if len(chunk) == self.outputChunk:
+                chunk.append("")
+                sys.stdout.write("\n".join(chunk))
+                chunk = []
 
-        return 1
+        # Write trailing lines
+        if chunk:
+            chunk.append("")
+            sys.stdout.write("\n".join(chunk))
 
     #####################################
-    # getAttrPos():
-    #   Get position where attribute is positioned.
+    # printHeader():
+    #   Print attribute names and datatypes of a selection.
     # args:
-    #   @attrs: List of attributes.
-    #   @attrName: Attribute to find.
+    #   @names: List with attribute names.
+    #   @types: List with attribute datatypes.
     # return:
-    #   -1: If not found.
-    #   Positive otherwise.
+    #   None.
     #####################################
-    def getAttrPos(self, attrs, attrName):
-        # Loop through attributes
-        for i in range(0, len(attrs)):
-            if attrs[i] == attrName:
-                return i
-
-        return -1
+    def printHeader(self, names, types):
+        print("|".join([names[i].replace(" ", "") + " " + types[i] for i in range(len(types))]))
 
     #####################################
-    # getAliasStruct():
-    #   Build dictionary with alias-name pairs.
+    # isStreamable():
+    #   Test whether a table should be streamed from disk instead of loaded in memory.
     # args:
-    #   @aliasTokens: List with strings in form of "name alias".
+    #   @tpath: String with path to table.
     # return:
-    #   Dictionary with alias as key and name as value.
+    #   True: If table is not cached and its file is over the stream threshold.
+    #   False: Otherwise.
     #####################################
-    def getAliasStruct(self, aliasTokens):
-        # Variables
-        aliasStruct = {}
-
-        # Loop through aliases
-        for alias in aliasTokens:
-            alias_split = alias.split(" ")
-            if len(alias_split) == 1: # No alias found
-                aliasStruct[alias] = alias
-            else: # Alias found
-                aliasStruct[alias_split[1]] = alias_split[0]
-
-        return aliasStruct
+    def isStreamable(self, tpath):
+        if self.isCached(tpath):
+            return False
+        return os.path.getsize(tpath) > self.streamThreshold
 
     #####################################
-    # getTablesStruct():
-    #   Build dictionary with alias-table path pairs.
+    # scanRecords():
+    #   Lazily read records of a table file one line at a time.
     # args:
-    #   @aliasStruct: Alias-name pairs.
+    #   @tpath: String with path to table.
+    #   @colnums: List with positions of attributes used by caller (default = all attributes).
     # return:
-    #   Dictionary with alias as key and table path as value.
+    #   Generator with records as lists of strings. Attributes of binary tables
+    #   not used by caller are not read and left empty.
     #####################################
-    def getTablesStruct(self, aliasStruct):
-        # Variables
-        tablesStruct = {}
-
-        # Loop through aliases
-        for apair in aliasStruct.items():
-            tablesStruct[apair[0]] = self.db_in_use + apair[1] + ".bql"
-
-        return tablesStruct
+    def scanRecords(self, tpath, colnums = None):
+        # Binary tables are read one page at a time, decoding only used attributes
+        if bs.isBinaryTable(tpath):
+            formatValue = Table().formatValue
+            binaryTable = bs.BinaryTable(tpath)
+            if colnums is None:
+                for record in binaryTable.scanRecords():
+                    yield list(map(formatValue, record))
+                return
+            colnums = sorted(set(colnums))
+            width = len(binaryTable.types)
+            for values in binaryTable.scanRecords(colnums):
+                record = [""] * width
+                for colnum, value in zip(colnums, values):
+                    record[colnum] = formatValue(value)
+                yield record
+            return
+
+        with open(tpath, "r") as df:
+            df.readline()
+            df.readline()
+            for line in df:
+                yield line.rstrip("\n").split(",")
 
     #####################################
-    # condOpTest():
-    #   Test two values based on valid BQL boolean operations.
+    # filterRecords():
+    #   Lazily keep records whose attribute passes a test.
     # args:
-    #   @operand_1: First operand to test.
-    #   @operand_2: Second operand to test.
-    #   @condOp: Operator to test operands with.
+    #   @records: Iterable with records as lists of strings.
+    #   @colnum: Position of tested attribute.
+    #   @parse: Function converting a text value into the attribute datatype.
+    #   @test: Test function taking a typed value.
     # return:
-    #   True: If <operand_1 condOp operand_2> is true.
-    #   False: Otherwise.
+    #   Generator with passing records.
     #####################################
-    def condOpTest(self, operand_1, operand_2, condOp):
-        if condOp == "=" and str(operand_1) == str(operand_2):
-            return True
-        elif condOp == "!=" and str(operand_1) != str(operand_2):
-            return True
-        elif condOp == ">" and float(operand_1) > float(operand_2):
-            return True
-        elif condOp == "<" and float(operand_1) < float(operand_2):
-            return True
-        return False
+    def filterRecords(self, records, colnum, parse, test):
+        for record in records:
+            if colnum < len(record) and test(parse(record[colnum])):
+                yield record
 
     #####################################
-    # innerJoinOp():
-    #   Perform inner join on tables.
+    # projectRecords():
+    #   Lazily keep some attributes of records, filling missing values with empty strings.
     # args:
-    #   @tables: List with Table objects to join.
-    #   @operand_1: Attribute name for first table.
-    #   @operand_1: Attribute name for first table or constant.
-    #   @condOp: Comparison operation to perform on both operands.
+    #   @records: Iterable with records as lists of strings.
+    #   @colnums: List with positions of attributes to keep.
     # return:
-    #   New updated Table.
+    #   Generator with projected records.
     #####################################
-    def innerJoinOp(self, tables, operand_1, operand_2, condOp):
-        # Variables
-        newTable = Table()
-        table_1 = tables[0]
-
-        # Single table mode
-        if len(tables) == 1:
-            # Update new Table
-            newTable.metadata = table_1.metadata
-            newTable.attributes = table_1.attributes
-
-            # Variables
-            content = table_1.content
-            attrPos = self.getAttrPos(table_1.attributes.split(","), operand_1)
-
-            # Loop through all records in table
-            for line in content:
-                line_split = line.split(",")
-                # Add record to line if comparison is true
-                if self.condOpTest(line_split[attrPos], operand_2, condOp):
-                    newTable.content.append(line)
-        # Two table mode
-        else:
-            table_2 = tables[1]
-
-            # Update new Table
-            newTable.metadata = table_1.metadata.strip() + "," + table_2.metadata
-            newTable.attributes = table_1.attributes.strip() + "," + table_2.attributes
-
-            # Variables
-            content_1 = table_1.content
-            content_2 = table_2.content
-            attrPos_1 = self.getAttrPos(table_1.attributes.split(","), operand_1)
-            attrPos_2 = self.getAttrPos(table_2.attributes.split(","), operand_2)
-
-            # Loop through all records in first table
-            for line_1 in content_1:
-                line_1_split = line_1.split(",")
-                # Loop through all records in second table
-                for line_2 in content_2:
-                    line_2_split = line_2.split(",")
-                    # Ad record to line if comparison is true
-                    if self.condOpTest(line_1_split[attrPos_1], line_2_split[attrPos_2], condOp):
-                        newTable.content.append(line_1 + "," + line_2)
-
-        return newTable
+    def projectRecords(self, records, colnums):
+        width = max(colnums) + 1 if colnums else 0
+        for record in records:
+            if len(record) < width:
+                record = record + [""] * (width - len(record))
+            yield [record[colnum] for colnum in colnums]
 
     #####################################
-    # leftOuterJoinOp():
-    #   Perform left outer join on two tables with a given test operation.
+    # streamSelect():
+    #   Select records of a single table through a scan, filter, project and print
+    #   pipeline, holding one chunk of output in memory at a time. Values are
+    #   converted into their datatypes and printed as by selects of loaded tables.
     # args:
-    #   @tables: List with Table objects to join.
-    #   @operand_1: Attribute name for first table.
-    #   @operand_2: Attribute name for second table.
-    #   @condOp: Testing operation to perform on attributes.
+    #   @tpath: String with path to table.
+    #   @alias: String with alias of table.
+    #   @selectTokens: List with tokens passed to select command.
+    #   @conds: List with condition tuples of a plan comparing attributes with constants.
+    #   @groupTokens: List with tokens passed to group by clause, or None (default = None).
+    #   @orderTokens: List with tokens passed to order by clause, or None (default = None).
+    #   @neededColnums: List with positions of attributes used by command (default = all attributes).
     # return:
-    #   New updated Table.
+    #   1: If content was successfully selected.
+    #   0: Otherwise.
     #####################################
-    def leftOuterJoinOp(self, tables, operand_1, operand_2, condOp):
+    def streamSelect(self, tpath, alias, selectTokens, conds, groupTokens = None, orderTokens = None, neededColnums = None):
         # Variables
-        newTable = Table() # New filtered table
-        table_1 = tables[0] # First table
-        table_2 = tables[1] # Second table
-        content_1 = table_1.content # First table records
-        content_2 = table_2.content # Second table records
-        attrPos_1 = self.getAttrPos(table_1.attributes.split(","), operand_1) # Wanted attribute position in table 1
-        attrPos_2 = self.getAttrPos(table_2.attributes.split(","), operand_2) # Wanted attribute position in table 2
-        
-        # Update new table header values
-        newTable.metadata = table_1.metadata.strip() + "," + table_2.metadata
-        newTable.attributes = table_1.attributes.strip() + "," + table_2.attributes
+        schema = Table()
+        schema.setSchema(*self.getSchema(tpath))
+        schema.aliases = [alias] * len(schema.names)
+        aggregated = groupTokens is not None or ba.hasAggregates(selectTokens)
+        if aggregated:
+            aggregator = self.buildAggregator(schema, selectTokens, groupTokens)
+            if aggregator is None:
+                return 0
+            colnums = aggregator.colnums
+            keys = self.getOrderKeys(schema, orderTokens or [], aggregator.items)
+        else:
+            colnums = self.getSelectedAttrs(schema, selectTokens)
+            if colnums is None:
+                return 0
+            keys = self.getOrderKeys(schema, orderTokens or [])
+        if keys is None:
+            return 0
 
-        # Loop through all records in first table
-        for line_1 in content_1:
-            line_1_split = line_1.split(",")
-            noMatches = True
-            # Loop through all records in second table
-            for line_2 in content_2:
-                line_2_split = line_2.split(",")
-                # If comparison is true, add both
-                if self.condOpTest(line_1_split[attrPos_1], line_2_split[attrPos_2], condOp):
-                    noMatches = False
-                    newTable.content.append(line_1 + "," + line_2)
-                # If comparison is false, add first table record and empty spaces
-                #else:
-                #    newTable.content.append(line_1 + ("," * len(line_2_split)))
-            if noMatches:
-                newTable.content.append(line_1 + ("," * len(line_2_split)))
-        
-        return newTable
+        if aggregated:
+            readColnums = aggregator.colnums
+        else:
+            readColnums, sortKeys = self.appendOrderKeys(colnums, keys)
+
+        # Split large text tables across worker processes, each giving the typed passing records of its range
+        if self.isParallel(tpath):
+            conds = [(schema.findAttr(cond[0] + "." + cond[1]), cond[2], cond[4]) for cond in conds]
+            records = itertools.chain.from_iterable(found for _, _, found in self.parallelScan(tpath, conds, readColnums))
+
+        # Otherwise filter records, then convert read attributes into their datatypes
+        else:
+            records = self.scanRecords(tpath, neededColnums)
+            for cond in conds:
+                colnum = schema.findAttr(cond[0] + "." + cond[1])
+                test = self.compileTest(cond[2], schema.parseValue(colnum, cond[4]))
+                records = self.filterRecords(records, colnum, functools.partial(schema.parseValue, colnum), test)
+            parsers = [functools.partial(schema.parseValue, colnum) for colnum in readColnums]
+            records = ([parse(text) for parse, text in zip(parsers, record)] for record in self.projectRecords(records, readColnums))
+
+        # Aggregate records one chunk at a time
+        if aggregated:
+            chunk = list(itertools.islice(records, self.outputChunk))
+            while chunk:
+                aggregator.addChunk(len(chunk), [list(column) for column in zip(*chunk)] if readColnums else [])
+                chunk = list(itertools.islice(records, self.outputChunk))
+            self.printAggregates(schema, aggregator, keys)
+            return 1
+
+        # Print records, sorted on typed keys
+        print()
+        self.printHeader([schema.names[colnum] for colnum in colnums], [schema.types[colnum] for colnum in colnums])
+        self.printRecords("|".join(map(schema.formatValue, record)) for record in self.orderRecords(records, sortKeys, len(colnums)))
+
+        return 1
 
     #####################################
-    # selectCommand()
-    #   Selects content wanted from a table.
+    # graceSelect():
+    #   Select records of an equality join of two tables without loading them.
+    #   Records of both table files are streamed into partition files by join
+    #   key hash, then each partition is joined in memory on its own. Joined
+    #   records are merged back into the order of the first table of the plan,
+    #   giving the same order as joins of loaded tables.
     # args:
-    #   args: Tokens with words passed to select command
+    #   @root: Root PlanNode built by buildPlan().
+    #   @tablePaths: Alias-table path pairs of selected tables.
+    #   @neededAttrs: Alias-positions of needed attributes pairs, built by getNeededAttrs().
+    #   @selectTokens: List with tokens passed to select command.
+    #   @groupTokens: List with tokens passed to group by clause, or None (default = None).
+    #   @orderTokens: List with tokens passed to order by clause, or None (default = None).
     # return:
     #   1: If content was successfully selected.
     #   0: Otherwise.
     #####################################
-    def selectCommand(self, commStruct):
+    def graceSelect(self, root, tablePaths, neededAttrs, selectTokens, groupTokens = None, orderTokens = None):
         # Variables
-        selectTokens = commStruct["select"]
-        fromTokens = commStruct["from"]
-        whereTokens = commStruct.get("where")
-        aliasStruct = self.getAliasStruct(fromTokens)
-        tablePaths = self.getTablesStruct(aliasStruct)
-
-        # Test for non-existent table
-        for table_path in tablePaths.values():
-            if not os.path.isfile(table_path):
-                print("!Could not select from " + table_path + " because it does not exist.")
+        join = root.children[0] if root.kind == "filter" else root
+        cond = join.conds[0]
+        aliases = list(tablePaths)
+        scans = dict([(scan.alias, scan) for scan in root.scans()])
+        schemas = {} # Alias-Table with needed attributes and no records pairs
+        for alias in aliases:
+            schema = Table()
+            schema.setSchema(*self.getSchema(tablePaths[alias]))
+            schemas[alias] = schema.view(neededAttrs[alias], alias)
+        keyPositions = {cond[0]: schemas[cond[0]].findAttr(cond[0] + "." + cond[1]),
+                cond[3]: schemas[cond[3]].findAttr(cond[3] + "." + cond[4])}
+        convert = schemas[cond[0]].isNumeric(keyPositions[cond[0]]) != schemas[cond[3]].isNumeric(keyPositions[cond[3]])
+
+        # Find selected attributes among attributes of joined tables, in from order
+        joined = Table()
+        sources = [] # (alias, position in table) pair of each attribute
+        for alias in aliases:
+            joined.types += schemas[alias].types
+            joined.names += schemas[alias].names
+            joined.aliases += [alias] * len(schemas[alias].names)
+            sources += [(alias, colnum) for colnum in range(len(schemas[alias].names))]
+        aggregated = groupTokens is not None or ba.hasAggregates(selectTokens)
+        if aggregated:
+            aggregator = self.buildAggregator(joined, selectTokens, groupTokens)
+            if aggregator is None:
                 return 0
-        
-        # Create table objects
-        tables = {}
-        for tname in tablePaths:
-            tableName = tablePaths[tname]
-            print("Locked? " + tname)
-            if self.isTableLocked(tname) == None:
-                print("Locked")
-                tableName += "_"
-            tables[tname] = Table(tableName)
-
-        # Perform where condition, if exists
-        selectedContent = tables[list(tables.keys())[0]]
-        if whereTokens:
-            selectedContent = self.onCommand(tables, whereTokens)
-
-        # Perform on condition, if exists
-        if "on" in commStruct.keys():
-            onTokens = commStruct["on"]
-            if "inner join" in commStruct.keys():
-                selectedContent = self.onCommand(tables, onTokens)
-            elif "left outer join" in commStruct.keys():
-                selectedContent = self.onCommand(tables, onTokens, "left outer join")
-        tattr = selectedContent.attributes.strip().split(',')
-
-        # Select content
-        tmeta = selectedContent.metadata.strip().split(',')
-        print()
-        # Print all attributes 
-        if selectTokens[0] == "*":
-            # Print header
-            for i in range(len(tmeta)):
-                print(tattr[i].replace(" ", "") + " " + tmeta[i], end = "")
-                if i != len(tmeta) - 1:
-                    print("|", end = "")
-            print()
-            # Print content
-            for line in selectedContent.content:
-                line_split = line.split(",")
-                print("|".join(line_split))
-        # Print selected attributes
+            keys = self.getOrderKeys(joined, orderTokens or [], aggregator.items)
+            readColnums = aggregator.colnums
         else:
-            # Print Header
-            for col in colnum:
-                print(tattr[col].replace(" ", "") + " " + tmeta[col], end = "|")
-            print()
-            # Print content
-            for line in filteredContent:
-                for col in colnum:
-                    line_split = line.split(",")
-                    print(line_split[col], end = "|")
-                print()
+            colnums = self.getSelectedAttrs(joined, selectTokens)
+            keys = self.getOrderKeys(joined, orderTokens or [])
+            if colnums is None or keys is None:
+                return 0
+            readColnums, sortKeys = self.appendOrderKeys(colnums, keys)
+        if keys is None:
+            return 0
 
-        return 1
+        # Variables
+        count = min(sum([os.path.getsize(tpath) for tpath in tablePaths.values()]) // self.joinMemoryBudget * 2 + 1, self.joinFanout)
+        parts = [{} for _ in range(count)] # Alias-(SpillFile, bytes of records) pairs of each partition
+        cardinalities = {}
+        outFiles = []
+
+        try:
+            # Stream both tables into partitions, keeping empty keys of the table kept by outer joins
+            for alias in aliases:
+                keepEmpty = join.joinMode == "left outer join" and alias == cond[0]
+                spilled, cardinalities[alias] = self.spillPartitions(tablePaths[alias], neededAttrs[alias], scans[alias].conds, schemas[alias], keyPositions[alias], convert, keepEmpty, count)
+                for part, pair in zip(parts, spilled):
+                    part[alias] = pair
+
+            # Join each partition, led by the same table as joins of loaded tables
+            root = bp.orderJoins(root, cardinalities)
+            for part in parts:
+                self.joinPartition(root, schemas, part, [sources[colnum] for colnum in readColnums], outFiles)
+            records = (record[1:] for record in heapq.merge(*[outFile.records() for outFile in outFiles], key = operator.itemgetter(0)))
+
+            # Aggregate joined records one chunk at a time
+            if aggregated:
+                chunk = list(itertools.islice(records, self.outputChunk))
+                while chunk:
+                    aggregator.addChunk(len(chunk), [list(column) for column in zip(*chunk)] if readColnums else [])
+                    chunk = list(itertools.islice(records, self.outputChunk))
+                self.printAggregates(joined, aggregator, keys)
+                return 1
+
+            # Print joined records, sorting them if needed
+            print()
+            self.printHeader([joined.names[colnum] for colnum in colnums], [joined.types[colnum] for colnum in colnums])
+            formatValue = joined.formatValue
+            self.printRecords("|".join(map(formatValue, record)) for record in self.orderRecords(records, sortKeys, len(colnums)))
+            return 1
+        finally:
+            for part in parts:
+                for spillFile, _ in part.values():
+                    spillFile.remove()
+            for outFile in outFiles:
+                outFile.remove()
 
     #####################################
-    # onCommand():
-    #   Conditional statements for expclitly stated joins.
+    # insertCommand():
+    #   Inserts records into a table. Several insert commands into the same table
+    #   are validated one by one and appended together.
     # args:
-    #   @tables: Alias-table object pair dictionary.
-    #   @condTokens: List of tokens passed to on command.
-    #   @joinMode: Type of join to use (default = "inner join")
+    #   @commandStructs: Command-argument pair dictionaries of inserts into one table.
     # return:
-    #   Table object with filtered content.
+    #   1: If successfully inserted records of every command into table.
+    #   0: Otherwise.
     #####################################
-    def onCommand(self, tables, condTokens, joinMode = "inner join"):
-        # Varaibles
-        operand_1 = condTokens[0]
-        operand_2 = condTokens[2].replace('"', "'")
-        testOp = condTokens[1]
-        operand_1_access_test = False
-        operand_2_access_test = False
-        newContent = Table()
+    def insertCommand(self, *commandStructs):
+        tname = commandStructs[0].get("insert into")[0]
+        tpath = self.db_in_use + tname + ".bql"
+        toAdd = []
+        messages = [] # Message of each command, None for commands with valid records
+        # Test if file exists
+        if not os.path.isfile(tpath):
+            for commandStruct in commandStructs:
+                print("!Failed to insert into " + tname + " because it does not exist.")
+            return 0
 
-        # Test if first operand uses table access method
-        if "." in operand_1:
-            operand_1_access_test = True
+        # Test records against table datatypes
+        types = self.getSchema(tpath)[0]
+        counts = []
+        for commandStruct in commandStructs:
+            records = commandStruct.get("values")
+            if all([self.isValidRecord(types, record) for record in records]):
+                toAdd.extend(records)
+                counts.append(len(records))
+                messages.append(None)
+            else:
+                messages.append("!Failed to insert into " + tname + " because values do not match its attributes.")
+
+        # Test whether table is locked by another user, locking it otherwise
+        locked = None
+        if toAdd:
+            locked = self.isTableLocked(tname)
+            if locked or (locked is False and not self.lockTable(tname)):
+                messages = [message or "Error: Table " + tname + " is locked!" for message in messages]
+                toAdd = []
+                locked = None
+
+        # Append all records to table at once
+        if toAdd:
+            self.addRecords(tname, tpath, toAdd)
+
+        # Remove lock taken for the insert only
+        if locked is False:
+            self.lockManager.release(self.getLockPath(tname))
+
+        # Print outcome of each command
+        counts = iter(counts)
+        for message in messages:
+            if message is None:
+                count = next(counts)
+                message = "1 new record inserted" if count == 1 else str(count) + " new records inserted"
+            print(message)
+
+        return int(all([message is None for message in messages]))
 
-        # Test if second operand uses table access method
-        if "." in operand_2:
-            operand_2_access_test = True
+    #####################################
+    # addRecords():
+    #   Add validated records to a locked table. Tables changed by current user
+    #   keep added records until commit, others are appended while no one reads them.
+    # args:
+    #   @tname: String with name of table.
+    #   @tpath: String with path to table.
+    #   @records: List with records as lists of values.
+    # return:
+    #   None.
+    #####################################
+    def addRecords(self, tname, tpath, records):
+        if not records:
+            return
+        if tpath in self.pendingTables:
+            self.pendingTables[tpath].appendRecords(records)
+            self.pendingChanges.append(["insert", tname, records])
+            return
+        dpath = self.getLockPath(tname, "data")
+        self.lockManager.acquire(dpath, True, True)
+        try:
+            self.appendRecords(tpath, records)
+        finally:
+            self.lockManager.release(dpath)
 
-        # Switch between 
-        if not operand_1_access_test and not operand_2_access_test: # No table accessing
-            if joinMode == "inner join":
-                return self.innerJoinOp([tables[list(tables.keys())[0]]], operand_1, operand_2, testOp)
-        elif operand_1_access_test and operand_2_access_test:
-            tname_1, aname_1 = operand_1.split(".")
-            tname_2, aname_2 = operand_2.split(".")
-            if joinMode == "inner join":
-                return self.innerJoinOp([tables[tname_1], tables[tname_2]], aname_1, aname_2, testOp)
-            elif joinMode == "left outer join":
-                return self.leftOuterJoinOp([tables[tname_1], tables[tname_2]], aname_1, aname_2, testOp)
+    #####################################
+    # loadRecord():
+    #   Test a record read from a csv file against the datatypes of a table,
+    #   quoting its non-numeric values.
+    # args:
+    #   @parsers: List with function parsing each numeric attribute, None for others.
+    #   @values: List with values of record.
+    # return:
+    #   List with values of record to store, or None if record does not match.
+    #####################################
+    def loadRecord(self, parsers, values):
+        if len(values) != len(parsers):
+            return None
+        record = []
+        for parse, value in zip(parsers, values):
+            if "," in value: # Commas separate values in table files
+                return None
+            if parse is not None:
+                try:
+                    parse(value)
+                except ValueError:
+                    return None
+            else: # Text is stored in lowercase like inserted values
+                value = value.lower()
+                if value[:1] not in ("'", '"'):
+                    value = "'" + value + "'"
+            record.append(value)
+        return record
 
     #####################################
-    # insertCommand():
-    #   Inserts record into a table.
+    # loadCommand():
+    #   Append records of a csv file to a table. The file is read in chunks, each
+    #   appended with a single write, and lines not matching the table are
+    #   reported and skipped. A first line holding the attribute names is skipped.
     # args:
-    #   @commandStruct: Command-argument pair dictionary.
+    #   @commandStruct: Dictionary with command-arguments pairs.
     # return:
-    #   1: If successfully inserted record into table.
+    #   1: If every line of file was loaded into table.
     #   0: Otherwise.
     #####################################
-    def insertCommand(self, commandStruct):
-        tname = commandStruct.get("insert into")[0]
+    def loadCommand(self, commandStruct):
+        # Variables
+        args = commandStruct.get("load")
+        target = commandStruct.get("into table") or [None]
+        if len(args) != 2 or args[0] != "data" or args[1][:1] not in ("'", '"') or target[0] is None:
+            print("!Failed to load data because command is not of the form: load data 'file' into table t.")
+            return 0
+        fpath = args[1][1:-1]
+        tname = target[0]
         tpath = self.db_in_use + tname + ".bql"
-        toAdd = commandStruct.get("values")
-        # Test if file exists
+        loaded = 0
+        records = []
+        rejected = [] # Line numbers of skipped lines
+
+        # Test if table and file exist
         if not os.path.isfile(tpath):
-            print("!Failed to insert into " + tname + " because it does not exist.")
+            print("!Failed to load data into " + tname + " because it does not exist.")
+            return 0
+        if not os.path.isfile(fpath):
+            print("!Failed to load data into " + tname + " because " + fpath + " does not exist.")
             return 0
 
-        # Insert record
-        table = Table(tpath)
-        table.content.append(",".join(toAdd))
-        
-        # Save modified table
-        table.saveContent()
-        print("1 new record inserted")
+        # Test whether table is locked by another user, locking it otherwise
+        locked = self.isTableLocked(tname)
+        if locked or (locked is False and not self.lockTable(tname)):
+            print("Error: Table " + tname + " is locked!")
+            return 0
 
-        return 1
+        # Numeric values are tested by parsing them, others are stored quoted like inserted ones
+        types, names = self.getSchema(tpath)
+        parsers = [int if dtype == "int" else float if dtype == "float" else None for dtype in types]
+
+        # Read file in chunks of records
+        try:
+            with open(fpath, "r", newline = "", buffering = 1024 * 1024) as df:
+                lines = csv.reader(df)
+                for values in lines:
+                    values = [value.strip() for value in values]
+                    if lines.line_num == 1 and values == names: # Header line
+                        continue
+                    record = self.loadRecord(parsers, values)
+                    if record is None:
+                        rejected.append(lines.line_num)
+                    else:
+                        records.append(record)
+                    if len(records) == self.loadChunk:
+                        self.addRecords(tname, tpath, records)
+                        loaded += len(records)
+                        records = []
+            self.addRecords(tname, tpath, records)
+            loaded += len(records)
+        except (csv.Error, UnicodeDecodeError) as error:
+            print("!Stopped loading data into " + tname + " because " + fpath + " could not be read past line " + str(lines.line_num) + " (" + str(error) + ").")
+        finally:
+            if locked is False:
+                self.lockManager.release(self.getLockPath(tname))
+
+        # Report skipped lines
+        for lineNum in rejected[:self.loadErrorLimit]:
+            print("!Skipped line " + str(lineNum) + " of " + fpath + " because values do not match attributes of " + tname + ".")
+        if len(rejected) > self.loadErrorLimit:
+            print("!Skipped " + str(len(rejected) - self.loadErrorLimit) + " more lines of " + fpath + ".")
+        print(str(loaded) + " new records loaded")
+        return int(not rejected)
 
     #####################################
     # updateCommand():
@@ -719,52 +3153,36 @@ class TableHandler:
         condAttr = condTokens[0]
         condOp = condTokens[1]
         condVal = condTokens[2]
+        if "," in setVal:
+            print("!Failed to update " + tname + " because values may not contain commas.")
+            return 0
 
-        # Get to-update attribute column
-        table = Table(tpath)
-        setColnum = 0
-        for attr in table.attributes.replace("\n", "").split(","):
-            if attr == setAttr:
-                break
-            setColnum += 1
-
-        # Get to-test attribute column
-        testColnum = 0
-        for attr in table.attributes.replace("\n", "").split(","):
-            if attr == condAttr:
-                break
-            testColnum += 1
+        # Get to-update attribute column and records passing condition
+        table, positions = self.findRecords(tname, condAttr, condOp, condVal)
+        setColnum = self.getAttrPos(table.names, setAttr)
+        if setColnum == -1 or positions is None:
+            print("!Failed to update " + tname + " because an attribute does not exist.")
+            return 0
+        if not self.isValidRecord([table.types[setColnum]], [setVal]):
+            print("!Failed to update " + tname + " because value " + setVal + " does not match attribute " + setAttr + ".")
+            return 0
+        if tpath not in self.pendingTables:
+            table = table.shareColumns()
+        setValue = table.parseValue(setColnum, setVal)
 
         # Update content
-        newContent = []
-        numModified = 0
-        for line in table.content:
-            line = line.replace("\n", "").split(",")
-            if condOp == ">" and float(line[testColnum]) > float(condVal):
-                line[setColnum] = setVal
-                numModified += 1
-            elif condOp == "<" and float(line[testColnum]) < float(condVal):
-                line[setColnum] = setVal
-                numModified += 1
-            elif condOp == "=" and line[testColnum] == condVal:
-                line[setColnum] = setVal
-                numModified += 1
-            elif condOp == "!=" and line[testColnum] != condVal:
-                line[setColnum] = setVal
-                numModified += 1
-            newContent.append(",".join(line))
-
-        # Save modified content
-        table.content = newContent
-        # Test whether table is already locked by another user.
-        if self.isTableLocked(tname):
+        for pos in positions:
+            table.setValue(setColnum, pos, setValue)
+        numModified = len(positions)
+
+        # Lock table for current user, unless another user locked it.
+        if not self.lockTable(tname):
             print("Error: Table " + tname + " is locked!")
         # Table is not locked by another user.
         else:
-            # Lock table for current user.
-            self.lockTable(tname)
-            # Save modification to intermediate table.
-            table.saveTemp()
+            # Keep modification until commit.
+            self.pendingTables[tpath] = table
+            self.pendingChanges.append(["update", tname, setColnum, setValue, positions])
             # Print modifications
             print(str(numModified) + " records modified.")
 
@@ -780,7 +3198,7 @@ class TableHandler:
     #   0: Otherwise.
     #####################################
     def deleteCommand(self, tokens):
-        tname = tokens["from"][0]
+        tname = tokens["delete from"][0]
         tpath = self.db_in_use + tname + ".bql"
         # Test if file exists
         if not os.path.isfile(tpath):
@@ -792,51 +3210,159 @@ class TableHandler:
         condAttr = condTokens[0]
         condOp = condTokens[1]
         condVal = condTokens[2]
-        table = Table(tpath)
-        newContent = []
-        testColnum = 0
-        recModified = 0
-
-        # Get attribute column
-        for attr in table.attributes.replace("\n", "").split(","):
-            if attr == condAttr:
-                break
-            testColnum += 1
-
-        # Scan through records
-        for line in table.content:
-            line = line.replace("\n", "").split(",")
-            if condOp == ">" and float(line[testColnum]) > float(condVal):
-                recModified += 1
-                continue
-            elif condOp == "<" and float(line[testColnum]) < float(condVal):
-                recModified += 1
-                continue
-            elif condOp == "=" and line[testColnum] == condVal:
-                recModified += 1
-                continue
-            elif condOp == "!=" and line[testColnum] != condVal:
-                recModified += 1
-                continue
-            newContent.append(",".join(line))
+        table, positions = self.findRecords(tname, condAttr, condOp, condVal)
+        if positions is None:
+            print("!Failed to delete from " + tname + " because attribute " + condAttr + " does not exist.")
+            return 0
 
-        # Test if file is locked
+        # Keep records that do not match condition
+        deletedPositions = set(positions)
+        recModified = len(deletedPositions)
+        table = table.selectRecords([pos for pos in range(table.numRecords()) if pos not in deletedPositions])
 
-        # Save content
-        table.content = newContent
-        # Test whether table is already locked by another user.
-        if self.isTableLocked(tname):
+        # Lock table for current user, unless another user locked it.
+        if not self.lockTable(tname):
             print("Error: Table " + tname + " is locked!")
             print("Transaction abort.")
         # Table is not locked by another user.
         else:
-            # Lock table for current user.
-            self.lockTable(tname)
-            # Save modification to intermediate table.
-            table.saveTemp()
+            # Keep modification until commit.
+            self.pendingTables[tpath] = table
+            self.pendingChanges.append(["delete", tname, sorted(deletedPositions)])
             # Print modifications
-            print(str(numModified) + " records deleted.")
+            print(str(recModified) + " records deleted.")
 
         #table.saveContent()
         #print(str(recModified) + " records deleted.")
         return 1
+
+joinBuckets = {} # Join key-second table positions pairs of the partition held by a join worker process
+joinWorker = {} # Join attribute values of first table, partition and number of partitions of a join worker process
+
+#####################################
+# setPartition():
+#   Build the hash table of a partition of the second table of an equality join.
+#   Run once by each join worker process.
+# args:
+#   @keys_1: List with join attribute values of first table.
+#   @keys_2: List with join attribute values of second table.
+#   @part: Number of partition of worker.
+#   @count: Number of partitions.
+# return:
+#   None.
+#####################################
+def setPartition(keys_1, keys_2, part, count):
+    # Variables
+    joinBuckets.clear()
+    joinWorker["keys"] = keys_1
+    joinWorker["part"] = part
+    joinWorker["count"] = count
+
+    # Keep second table records of partition, skipping empty values
+    for pos_2, key in enumerate(keys_2):
+        if key is not None and hash(key) % count == part:
+            if key in joinBuckets:
+                joinBuckets[key].append(pos_2)
+            else:
+                joinBuckets[key] = [pos_2]
+
+#####################################
+# probePartition():
+#   Probe the hash table of the partition held by a join worker process with
+#   the records of a chunk falling in the partition.
+# args:
+#   @positions: List or range with first table positions of chunk, None for empty records.
+#   @outer: Whether unmatched first table records are kept.
+# return:
+#   Tuple with list of positions in chunk and list of second table positions,
+#   None for unmatched records.
+#####################################
+def probePartition(positions, outer):
+    # Variables
+    keys_1 = joinWorker["keys"]
+    part = joinWorker["part"]
+    count = joinWorker["count"]
+    indexes = [] # Chunk positions of records of partition
+    keys = []
+
+    # Keep records of partition
+    for index, pos in enumerate(positions):
+        key = None if pos is None else keys_1[pos]
+        if hash(key) % count == part:
+            indexes.append(index)
+            keys.append(key)
+
+    positions_1, positions_2 = TableHandler().hashJoinOp(keys, joinBuckets, outer)
+    return [indexes[pos] for pos in positions_1], positions_2
+
+#####################################
+# splitRanges():
+#   Split the records of a text table file into byte ranges ending at line ends.
+# args:
+#   @tpath: String with path to table.
+#   @count: Number of ranges wanted.
+# return:
+#   List with (first byte, end byte) tuples, in file order.
+#####################################
+def splitRanges(tpath, count):
+    # Variables
+    size = os.path.getsize(tpath)
+    bounds = []
+
+    # Move each evenly spaced bound past the end of its line
+    with open(tpath, "rb") as df:
+        df.readline()
+        df.readline()
+        start = df.tell()
+        for part in range(count):
+            df.seek(max(start + (size - start) * part // count - 1, start - 1))
+            df.readline()
+            if not bounds or df.tell() > bounds[-1]:
+                bounds.append(df.tell())
+    bounds.append(size)
+
+    return [(bounds[pos], bounds[pos + 1]) for pos in range(len(bounds) - 1) if bounds[pos] < bounds[pos + 1]]
+
+#####################################
+# scanRange():
+#   Read the records in a byte range of a text table file and test them against
+#   conditions. Run by worker processes of parallel scans.
+# args:
+#   @task: Tuple with path to table, first and end byte of range, datatypes and
+#          names of attributes, list with (attribute position, operator, constant)
+#          tuples, and list with positions of attributes to keep or None.
+# return:
+#   Tuple with number of records in range, list with positions of passing records
+#   within range, and either typed columns of every record or typed values of
+#   passing records.
+#####################################
+def scanRange(task):
+    # Variables
+    tpath, start, end, types, names, conds, colnums = task
+    table = Table()
+    table.setSchema(types, names)
+    handler = TableHandler()
+    width = len(types)
+
+    # Read records of range, padded or cut to the table attributes
+    with open(tpath, "rb") as df:
+        df.seek(start)
+        lines = df.read(end - start).decode().split("\n")
+    if lines[-1] == "":
+        lines.pop()
+    records = [line.split(",") for line in lines]
+    for pos in range(len(records)):
+        if len(records[pos]) != width:
+            records[pos] = (records[pos] + [""] * width)[:width]
+
+    # Keep records passing every condition
+    positions = range(len(records))
+    for colnum, condOp, text in conds:
+        test = handler.compileTest(condOp, table.parseValue(colnum, text))
+        positions = [pos for pos in positions if test(table.parseValue(colnum, records[pos][colnum]))]
+
+    # Convert passing records, or every record
+    if colnums is not None:
+        return len(records), list(positions), [[table.parseValue(colnum, records[pos][colnum]) for colnum in colnums] for pos in positions]
+    table.loadColumns(records)
+    return len(records), list(positions), table.columns
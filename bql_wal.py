@@ -0,0 +1,194 @@
+#####################################
+# bql_wal:
+#   Class file for the write-ahead log of a database.
+# authors:
+#   @Froilan Luna-Lopez
+#       University of Nevada, Reno
+#####################################
+
+# Libraries
+import fcntl
+import json
+import os
+
+#####################################
+# WriteAheadLog:
+#   Log of committed changes of a database, kept until they are applied to the
+#   table files. Each line is a JSON list:
+#       [txid, "update", tname, colnum, value, positions]
+#       [txid, "delete", tname, positions]
+#       [txid, "insert", tname, records]
+#       [txid, "commit"]
+#       ["checkpoint"]
+#   Changes of a transaction are written together with its commit record, so
+#   records without a commit belong to a write cut short and are ignored. A
+#   checkpoint record marks that the changed tables are fully written to their
+#   temporary files and only have to be moved over the originals.
+#####################################
+class WriteAheadLog:
+    #####################################
+    # Constructor
+    #
+    # args:
+    #   @dbPath: Path of database folder, ending in '/'.
+    #####################################
+    def __init__(self, dbPath):
+        self.dbPath = dbPath
+        self.path = dbPath + "_wal.log"
+
+    #####################################
+    # isEmpty():
+    #   Test whether the log holds no records.
+    # args:
+    #   None.
+    # return:
+    #   True: If log file does not exist or is empty.
+    #   False: Otherwise.
+    #####################################
+    def isEmpty(self):
+        try:
+            return os.path.getsize(self.path) == 0
+        except OSError:
+            return True
+
+    #####################################
+    # lock():
+    #   Open the log and wait for exclusive access to it.
+    # args:
+    #   None.
+    # return:
+    #   File object of log, to be passed to unlock().
+    #####################################
+    def lock(self):
+        created = not os.path.isfile(self.path)
+        df = open(self.path, "a+")
+        fcntl.flock(df.fileno(), fcntl.LOCK_EX)
+        if created:
+            self.syncDirectory()
+        return df
+
+    #####################################
+    # unlock():
+    #   Release exclusive access to the log and close it.
+    # args:
+    #   @df: File object returned by lock().
+    # return:
+    #   None.
+    #####################################
+    def unlock(self, df):
+        fcntl.flock(df.fileno(), fcntl.LOCK_UN)
+        df.close()
+
+    #####################################
+    # sync():
+    #   Force written records of the log to disk.
+    # args:
+    #   @df: File object returned by lock().
+    # return:
+    #   None.
+    #####################################
+    def sync(self, df):
+        df.flush()
+        os.fsync(df.fileno())
+
+    #####################################
+    # syncDirectory():
+    #   Force created, renamed and removed files of the database to disk.
+    # args:
+    #   None.
+    # return:
+    #   None.
+    #####################################
+    def syncDirectory(self):
+        fd = os.open(self.dbPath, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    #####################################
+    # commit():
+    #   Append the changes of a transaction and its commit record, syncing once.
+    # args:
+    #   @df: File object returned by lock().
+    #   @txid: String identifying the transaction.
+    #   @changes: List with changes, each a list starting with its kind.
+    # return:
+    #   None.
+    #####################################
+    def commit(self, df, txid, changes):
+        lines = [json.dumps([txid] + change) + "\n" for change in changes]
+        lines.append(json.dumps([txid, "commit"]) + "\n")
+        df.write("".join(lines))
+        self.sync(df)
+
+    #####################################
+    # markCheckpoint():
+    #   Append a checkpoint record once all changed tables are written.
+    # args:
+    #   @df: File object returned by lock().
+    # return:
+    #   None.
+    #####################################
+    def markCheckpoint(self, df):
+        df.write(json.dumps(["checkpoint"]) + "\n")
+        self.sync(df)
+
+    #####################################
+    # clear():
+    #   Remove all records from the log once they are applied.
+    # args:
+    #   @df: File object returned by lock().
+    # return:
+    #   None.
+    #####################################
+    def clear(self, df):
+        df.truncate(0)
+        self.sync(df)
+
+    #####################################
+    # readCommitted():
+    #   Read changes of committed transactions, in commit order.
+    # args:
+    #   @df: File object returned by lock().
+    # return:
+    #   Tuple with list of changes and whether a checkpoint record was found.
+    #####################################
+    def readCommitted(self, df):
+        # Variables
+        pending = {} # Transaction-changes pairs of uncommitted transactions
+        changes = []
+        checkpointed = False
+
+        # Read records until the end or a partial record
+        df.seek(0)
+        for line in df:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            if record[0] == "checkpoint":
+                checkpointed = True
+            elif record[1] == "commit":
+                changes.extend(pending.pop(record[0], []))
+            else:
+                pending.setdefault(record[0], []).append(record[1:])
+
+        return changes, checkpointed
+
+    #####################################
+    # readTables():
+    #   Read names of tables with committed changes, without waiting for access
+    #   to the log. Records being written are not complete yet and are ignored.
+    # args:
+    #   None.
+    # return:
+    #   Set with strings of names of tables.
+    #####################################
+    def readTables(self):
+        try:
+            with open(self.path, "r") as df:
+                changes = self.readCommitted(df)[0]
+        except OSError:
+            return set()
+        return set([change[1] for change in changes])